@@ -0,0 +1,323 @@
+"""
+Activity file parsers for bulk import — GPX, TCX and FIT (optionally gzipped,
+as in Strava's bulk export), stdlib only.
+Each parser returns a track: per-sample columns (absolute epoch seconds,
+lat/lng, altitude, distance, heart rate, cadence — None where a sample lacks
+the value) plus the sport if the file names one. to_streams() and
+to_summary() turn a track into what stream_store and activity_store keep.
+"""
+
+import gzip
+import struct
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+from geo_utils import encode_polyline, haversine_m
+
+COLUMNS = ("time", "lat", "lng", "altitude", "distance", "heartrate", "cadence")
+SUFFIXES = (".gpx", ".tcx", ".fit")
+
+MOVING_SPEED = 0.5      # m/s — slower than this between samples counts as stopped
+ELEVATION_NOISE = 2.0   # m — climbs smaller than this between turning points are ignored
+ROUTE_POINTS = 300      # max points in an imported route's summary polyline
+
+
+def _track(sport=None):
+    track = {c: [] for c in COLUMNS}
+    track["sport"] = sport
+    return track
+
+
+def _append(track, **values):
+    for c in COLUMNS:
+        track[c].append(values.get(c))
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _epoch(text):
+    return datetime.fromisoformat(text.strip().replace("Z", "+00:00")).timestamp()
+
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+# ---------------------------------------------------------------------------
+# GPX / TCX (XML)
+# ---------------------------------------------------------------------------
+# Sport names used by Strava/Garmin exports → Strava activity type
+SPORTS = {
+    "running": "Run", "run": "Run", "9": "Run", "trail_running": "Run",
+    "biking": "Ride", "cycling": "Ride", "ride": "Ride", "1": "Ride",
+    "walking": "Walk", "walk": "Walk", "10": "Walk",
+    "hiking": "Hike", "hike": "Hike", "4": "Hike",
+    "swimming": "Swim", "swim": "Swim",
+}
+
+
+def parse_gpx(data):
+    root = ET.fromstring(data)
+    track = _track()
+    for el in root.iter():
+        name = _local(el.tag)
+        if name == "type" and track["sport"] is None and el.text:
+            track["sport"] = SPORTS.get(el.text.strip().lower())
+        elif name == "trkpt":
+            values = {"lat": _float(el.get("lat")), "lng": _float(el.get("lon"))}
+            for child in el.iter():
+                field = _local(child.tag)
+                if field == "time":
+                    values["time"] = _epoch(child.text)
+                elif field == "ele":
+                    values["altitude"] = _float(child.text)
+                elif field == "hr":
+                    values["heartrate"] = _float(child.text)
+                elif field == "cad":
+                    values["cadence"] = _float(child.text)
+            if values.get("time") is not None:
+                _append(track, **values)
+    return track
+
+
+def parse_tcx(data):
+    root = ET.fromstring(data)
+    track = _track()
+    for el in root.iter():
+        name = _local(el.tag)
+        if name == "Activity" and track["sport"] is None:
+            track["sport"] = SPORTS.get((el.get("Sport") or "").lower())
+        elif name == "Trackpoint":
+            values = {}
+            for child in el.iter():
+                field = _local(child.tag)
+                if field == "Time":
+                    values["time"] = _epoch(child.text)
+                elif field == "LatitudeDegrees":
+                    values["lat"] = _float(child.text)
+                elif field == "LongitudeDegrees":
+                    values["lng"] = _float(child.text)
+                elif field == "AltitudeMeters":
+                    values["altitude"] = _float(child.text)
+                elif field == "DistanceMeters":
+                    values["distance"] = _float(child.text)
+                elif field == "HeartRateBpm":
+                    values["heartrate"] = _float(child.findtext("./*", default=None))
+                elif field in ("Cadence", "RunCadence"):
+                    values["cadence"] = _float(child.text)
+            if values.get("time") is not None:
+                _append(track, **values)
+    return track
+
+
+# ---------------------------------------------------------------------------
+# FIT (binary) — just enough of the protocol for record and session messages
+# ---------------------------------------------------------------------------
+FIT_EPOCH = 631065600            # 1989-12-31T00:00:00Z
+SEMICIRCLES = 180 / 2 ** 31
+FIT_RECORD, FIT_SESSION = 20, 18
+FIT_SPORTS = {1: "Run", 2: "Ride", 5: "Swim", 11: "Walk", 17: "Hike"}
+
+# base type number → (struct code, invalid value); z-types are invalid at 0
+_FIT_TYPES = {
+    0x00: ("B", 0xFF), 0x01: ("b", 0x7F), 0x02: ("B", 0xFF),
+    0x03: ("h", 0x7FFF), 0x04: ("H", 0xFFFF), 0x05: ("i", 0x7FFFFFFF),
+    0x06: ("I", 0xFFFFFFFF), 0x08: ("f", None), 0x09: ("d", None),
+    0x0A: ("B", 0), 0x0B: ("H", 0), 0x0C: ("I", 0),
+    0x0E: ("q", 0x7FFFFFFFFFFFFFFF), 0x0F: ("Q", 0xFFFFFFFFFFFFFFFF), 0x10: ("Q", 0),
+}
+
+
+def parse_fit(data):
+    header_size = data[0]
+    if data[8:12] != b".FIT":
+        raise ValueError("Not a FIT file")
+    end = header_size + struct.unpack_from("<I", data, 4)[0]
+    track = _track()
+    definitions = {}
+    last_ts = 0
+    pos = header_size
+    while pos < end:
+        header = data[pos]
+        pos += 1
+        if header & 0x80:  # compressed timestamp data message
+            local, offset = (header >> 5) & 0x03, header & 0x1F
+            last_ts = (last_ts & ~0x1F) + offset + (0x20 if offset < (last_ts & 0x1F) else 0)
+            definition = definitions[local]
+            fields, pos = _fit_fields(data, pos, definition)
+            fields.setdefault(253, last_ts)
+        elif header & 0x40:  # definition message
+            endian = "<" if data[pos + 1] == 0 else ">"
+            global_num, count = struct.unpack_from(endian + "HB", data, pos + 2)
+            pos += 5
+            fields = [tuple(data[pos + 3 * i:pos + 3 * i + 3]) for i in range(count)]
+            pos += 3 * count
+            dev_size = 0
+            if header & 0x20:
+                dev_count = data[pos]
+                dev_size = sum(data[pos + 1 + 3 * i + 1] for i in range(dev_count))
+                pos += 1 + 3 * dev_count
+            definitions[header & 0x0F] = (global_num, endian, fields, dev_size)
+            continue
+        else:
+            definition = definitions[header & 0x0F]
+            fields, pos = _fit_fields(data, pos, definition)
+        if 253 in fields:
+            last_ts = fields[253]
+        global_num = definition[0]
+        if global_num == FIT_RECORD and 253 in fields:
+            altitude = fields.get(78, fields.get(2))
+            _append(
+                track,
+                time=float(fields[253] + FIT_EPOCH),
+                lat=fields[0] * SEMICIRCLES if 0 in fields else None,
+                lng=fields[1] * SEMICIRCLES if 1 in fields else None,
+                altitude=altitude / 5 - 500 if altitude is not None else None,
+                distance=fields[5] / 100 if 5 in fields else None,
+                heartrate=fields.get(3),
+                cadence=fields.get(4),
+            )
+        elif global_num == FIT_SESSION and track["sport"] is None:
+            track["sport"] = FIT_SPORTS.get(fields.get(5))
+    return track
+
+
+def _fit_fields(data, pos, definition):
+    """Decode one data message's single-value fields → ({field number: value}, next pos)."""
+    _, endian, fields, dev_size = definition
+    values = {}
+    for number, size, base_type in fields:
+        code, invalid = _FIT_TYPES.get(base_type & 0x1F, (None, None))
+        if code and struct.calcsize(code) == size:
+            value = struct.unpack_from(endian + code, data, pos)[0]
+            if value != invalid and value == value:  # value == value drops NaN floats
+                values[number] = value
+        pos += size
+    return values, pos + dev_size
+
+
+# ---------------------------------------------------------------------------
+# Dispatch + conversion
+# ---------------------------------------------------------------------------
+PARSERS = {".gpx": parse_gpx, ".tcx": parse_tcx, ".fit": parse_fit}
+
+
+def file_kind(name):
+    """'.gpx' / '.tcx' / '.fit' for a (possibly .gz) activity file name, else None."""
+    name = name.lower()
+    if name.endswith(".gz"):
+        name = name[:-3]
+    for suffix in SUFFIXES:
+        if name.endswith(suffix):
+            return suffix
+    return None
+
+
+def parse_file(name, data):
+    """Parse raw file bytes by extension (gunzipping .gz). Raises ValueError if unsupported."""
+    kind = file_kind(name)
+    if kind is None:
+        raise ValueError(f"Unsupported activity file: {name}")
+    if name.lower().endswith(".gz"):
+        data = gzip.decompress(data)
+    if kind != ".fit":
+        data = data.lstrip()  # some exporters pad XML with whitespace before the prolog
+    return PARSERS[kind](data)
+
+
+def _filled(values):
+    """Forward-fill gaps (leading gaps from the first value); None if never present."""
+    first = next((v for v in values if v is not None), None)
+    if first is None:
+        return None
+    out, last = [], first
+    for v in values:
+        last = v if v is not None else last
+        out.append(last)
+    return out
+
+
+def to_streams(track):
+    """Track → Strava key_by_type streams JSON (what stream_store.write_streams takes)."""
+    start = track["time"][0]
+    streams = {"time": {"data": [round(t - start) for t in track["time"]]}}
+    lat, lng = _filled(track["lat"]), _filled(track["lng"])
+    if lat and lng:
+        streams["latlng"] = {"data": [[a, b] for a, b in zip(lat, lng)]}
+    distance = _filled(track["distance"])
+    if distance is None and lat and lng:
+        distance, total = [0.0], 0.0
+        for i in range(1, len(lat)):
+            total += haversine_m(lat[i - 1], lng[i - 1], lat[i], lng[i])
+            distance.append(round(total, 1))
+    if distance:
+        streams["distance"] = {"data": distance}
+    for name in ("altitude", "heartrate", "cadence"):
+        values = _filled(track[name])
+        if values:
+            streams[name] = {"data": values}
+    return streams
+
+
+def _elevation_gain(altitude):
+    """Total climb, ignoring wiggles under ELEVATION_NOISE between turning points."""
+    gain, anchor = 0.0, altitude[0]
+    for a in altitude[1:]:
+        if a - anchor >= ELEVATION_NOISE:
+            gain += a - anchor
+            anchor = a
+        elif a < anchor:
+            anchor = a
+    return round(gain, 1)
+
+
+def to_summary(track, streams, tz):
+    """
+    Track + its streams → a Strava-shaped activity summary (no id/name —
+    the importer fills those, from activities.csv where it can).
+    `tz` is the zone used for start_date_local.
+    """
+    start = datetime.fromtimestamp(track["time"][0], timezone.utc)
+    time = streams["time"]["data"]
+    distance = (streams.get("distance") or {}).get("data")
+    moving = 0
+    if distance:
+        for i in range(1, len(time)):
+            dt = time[i] - time[i - 1]
+            if dt > 0 and (distance[i] - distance[i - 1]) / dt >= MOVING_SPEED:
+                moving += dt
+    else:
+        moving = time[-1]
+    sport = track["sport"] or "Workout"
+    local = start.astimezone(tz)
+    offset = local.strftime("%z")
+    summary = {
+        "type": sport,
+        "sport_type": sport,
+        "start_date": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        # Strava's start_date_local is local wall time with a Z suffix
+        "start_date_local": local.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "timezone": f"(GMT{offset[:3]}:{offset[3:]}) {tz.key}",
+        "distance": round(distance[-1], 1) if distance else 0,
+        "moving_time": moving,
+        "elapsed_time": time[-1],
+        "average_speed": round(distance[-1] / moving, 3) if distance and moving else 0,
+    }
+    altitude = (streams.get("altitude") or {}).get("data")
+    if altitude:
+        summary["total_elevation_gain"] = _elevation_gain(altitude)
+    hr = [v for v in (streams.get("heartrate") or {}).get("data", []) if v]
+    if hr:
+        summary.update(has_heartrate=True, average_heartrate=round(sum(hr) / len(hr), 1),
+                       max_heartrate=max(hr))
+    latlng = (streams.get("latlng") or {}).get("data")
+    if latlng:
+        summary["start_latlng"] = latlng[0]
+        step = max(1, len(latlng) // ROUTE_POINTS)
+        summary["map"] = {"summary_polyline": encode_polyline(latlng[::step] + [latlng[-1]])}
+    return summary
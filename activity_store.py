@@ -0,0 +1,195 @@
+"""
+Local activity store — slim Strava activity summaries persisted to disk.
+Synced incrementally (see sync.py) so analytics can run over the full
+history without re-listing activities from Strava on every request.
+"""
+
+import base64
+import json
+import os
+from bisect import bisect_left, insort
+from datetime import datetime
+
+import tenancy
+
+STORE_FILE = "activities.json"
+
+# Summary fields worth keeping from /athlete/activities (all raw SI units)
+SUMMARY_FIELDS = (
+    "id", "name", "type", "sport_type", "workout_type",
+    "start_date", "start_date_local", "timezone",
+    "distance", "moving_time", "elapsed_time", "total_elevation_gain",
+    "average_speed", "max_speed", "has_heartrate", "average_heartrate",
+    "max_heartrate", "suffer_score", "gear_id", "start_latlng",
+)
+
+_stores = {}  # tenancy key -> (file mtime, {str(id) -> summary dict})
+# tenancy key -> runs as sorted [(int start epoch, id)] — pages of the feed are slices
+_run_index = {}
+
+
+def _load():
+    """The current athlete's activities — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(STORE_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _stores.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        activities = {}
+        if mtime is not None:
+            with open(path, "r") as f:
+                activities = json.load(f)
+        _stores[key] = cached = (mtime, activities)
+        _run_index.pop(key, None)  # rebuilt from the new contents on next use
+    return cached[1]
+
+
+def _save():
+    path = tenancy.path(STORE_FILE)
+    activities = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(activities, f)
+    os.replace(tmp, path)
+    _stores[tenancy.key()] = (os.stat(path).st_mtime, activities)
+
+
+def is_run(a):
+    return a.get("type") == "Run" or a.get("sport_type") == "Run"
+
+
+def summarize(a):
+    """Reduce a Strava activity (summary or detail) to the stored fields."""
+    s = {k: a.get(k) for k in SUMMARY_FIELDS if a.get(k) is not None}
+    s["polyline"] = (a.get("map") or {}).get("summary_polyline") or a.get("polyline")
+    return s
+
+
+def start_ts(a):
+    """Activity start as a UTC epoch (0 if unparseable)."""
+    try:
+        return datetime.fromisoformat(a.get("start_date", "").replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return 0
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def get(activity_id):
+    return _load().get(str(activity_id))
+
+
+def all_activities():
+    """All stored activities, newest first."""
+    return sorted(_load().values(), key=start_ts, reverse=True)
+
+
+def by_id():
+    """All stored activities as {str(id): summary}, unsorted — the store itself, so read only."""
+    return _load()
+
+
+def runs():
+    """All stored runs, newest first."""
+    return [a for a in all_activities() if is_run(a)]
+
+
+def count():
+    return len(_load())
+
+
+def latest_start_ts():
+    """Start epoch of the newest stored activity (0 if the store is empty)."""
+    return max((start_ts(a) for a in _load().values()), default=0)
+
+
+# ---------------------------------------------------------------------------
+# Start-time index + cursors
+# ---------------------------------------------------------------------------
+def _index_key(a):
+    return int(start_ts(a)), int(a["id"])
+
+
+def _runs_index():
+    key = tenancy.key()
+    if key not in _run_index:
+        _run_index[key] = sorted(_index_key(a) for a in _load().values() if is_run(a))
+    return _run_index[key]
+
+
+def _index_update(old, new):
+    """Keep the run index in step with one stored summary changing from `old` to `new`."""
+    index = _runs_index()
+    if old and is_run(old):
+        entry = _index_key(old)
+        i = bisect_left(index, entry)
+        if i < len(index) and index[i] == entry:
+            del index[i]
+    if new and is_run(new):
+        insort(index, _index_key(new))
+
+
+def runs_before(count, cursor=None):
+    """
+    Up to `count` runs older than `cursor` (newest first; None = from the
+    newest run). A bisect plus a slice, so every page costs the same however
+    deep into the history it is.
+    """
+    index = _runs_index()
+    end = len(index) if cursor is None else bisect_left(index, cursor)
+    activities = _load()
+    return [activities[str(i)] for _, i in reversed(index[max(0, end - count):end])]
+
+
+def encode_cursor(a):
+    """Opaque cursor pointing just after activity `a` in the feed."""
+    ts, activity_id = _index_key(a)
+    return base64.urlsafe_b64encode(f"{ts}:{activity_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(start epoch, id) from encode_cursor(). Raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, activity_id = raw.split(":")
+        return int(ts), int(activity_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+# ---------------------------------------------------------------------------
+# Write
+# ---------------------------------------------------------------------------
+def upsert(raw_activities):
+    """
+    Insert or update activities from Strava JSON.
+    Returns ids (ints) of activities that were new or changed.
+    """
+    activities = _load()
+    _runs_index()  # build it before the changes below, which it then takes one by one
+    changed = []
+    for a in raw_activities:
+        if "id" not in a:
+            continue
+        key = str(a["id"])
+        summary = summarize(a)
+        old = activities.get(key)
+        if old != summary:
+            activities[key] = summary
+            _index_update(old, summary)
+            changed.append(a["id"])
+    if changed:
+        _save()
+    return changed
+
+
+def delete(activity_id):
+    """Remove an activity. Returns True if it was stored."""
+    _runs_index()
+    old = _load().pop(str(activity_id), None)
+    if old is None:
+        return False
+    _index_update(old, None)
+    _save()
+    return True
@@ -5,39 +5,197 @@ Handles Strava OAuth, API proxy, and user settings.
 
 import json
 import os
-import requests
-from flask import Flask, redirect, request, jsonify, session, send_from_directory, render_template
+from datetime import date, timedelta
+from operator import gt, lt
+import time
+from flask import (
+    Flask, Response, g, redirect, request, jsonify, session, send_from_directory, render_template,
+    send_file, stream_with_context,
+)
 from config import (
     STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_AUTH_URL,
     STRAVA_TOKEN_URL, STRAVA_SCOPES, REDIRECT_URI, FLASK_SECRET_KEY,
-    DEFAULT_WEEKLY_GOAL, DEFAULT_SHOE_MAX_MILES, APP_MODE, ANTHROPIC_API_KEY,
+    DEFAULT_WEEKLY_GOAL, APP_MODE, ANTHROPIC_API_KEY,
+    SNAPSHOT_FILE, HTTP_RECORD, DEFAULT_ROUTE_BUDGET, ROUTE_BUDGETS,
+    BACKGROUND_WORKER, WORKER_INTERVAL, STRAVA_WEBHOOK_VERIFY_TOKEN,
+)
+from payloads import (
+    SETTINGS_FILE, FEED_PAGE_SIZE, MAX_FEED_PAGE_SIZE, load_settings, save_settings, zone_bounds,
+    apply_run_types, apply_run_types_json, build_profile, refresh_store, build_feed, feed_payload_name,
+    build_week, home_cells, build_weeks, coaching_context, assistant_weather,
 )
+import deadlines
+import http_client
+import metrics
+import profiler
+import tenancy
+import tracing
 import strava_client
 import weather_client
 import assistant_client
+import activity_store
+import athlete_profile
+import export
+import heatmap
+import mileage
+import records
+import rollups
+import routes
+import run_types
+import shared_cache
+import stream_store
+import sync
+import training_load
+import weather_history
+import zones
+from models import Activity
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 app.secret_key = FLASK_SECRET_KEY
 app.config["SEND_FILE_MAX_AGE_DEFAULT"] = 0
 
-# User settings file (single-user personal app)
-SETTINGS_FILE = "user_settings.json"
+# Demo serves every upstream call from a recorded snapshot — no outbound traffic
+if APP_MODE == "demo":
+    http_client.start_replay(SNAPSHOT_FILE)
+elif HTTP_RECORD:
+    http_client.start_recording(SNAPSHOT_FILE)
 
 
-def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r") as f:
-            return json.load(f)
-    return {
-        "goalMi": DEFAULT_WEEKLY_GOAL,
-        "shoeMaxMiles": DEFAULT_SHOE_MAX_MILES,
-        "vo2": 52,
-    }
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+def _profiling_enabled():
+    """Profiling runs on /api/* outside demo mode (never on the profile viewer itself)."""
+    return (APP_MODE != "demo" and request.path.startswith("/api/")
+            and not request.path.startswith("/api/profiles"))
+
+
+def _tracing_enabled():
+    return not request.path.startswith(("/static/", "/metrics", "/api/traces"))
+
+
+@app.before_request
+def _start_timer():
+    g.request_start = time.perf_counter()
+    # Everything below reads and writes the signed-in athlete's files and caches
+    tenancy.set_current(session.get("athlete_id"))
+    if _tracing_enabled():
+        incoming = request.headers.get("X-Trace-Id", "")
+        tracing.begin(incoming if incoming.isalnum() and len(incoming) <= 32 else None)
+    if _profiling_enabled():
+        g.profile = profiler.start()
+    if request.path.startswith("/api/") and request.url_rule:
+        budget = ROUTE_BUDGETS.get(request.url_rule.rule, DEFAULT_ROUTE_BUDGET)
+        if budget is not None:
+            deadlines.start(budget)
+
+
+@app.after_request
+def _record_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    if route not in ("/metrics", "/static/<path:path>") and "request_start" in g:
+        elapsed = time.perf_counter() - g.request_start
+        metrics.observe("http_request_duration_seconds", elapsed, route=route, method=request.method)
+        metrics.inc("http_requests_total", route=route, method=request.method, status=response.status_code)
+
+    rec = g.pop("profile", None)
+    if rec is not None:
+        requested = bool(request.args.get("__profile") or request.headers.get("X-Profile"))
+        profile_id = profiler.keep(rec, profiler.stop(rec), route, request.full_path, requested=requested)
+        if profile_id and requested:
+            response.headers["X-Profile-Id"] = profile_id
+
+    stale_age = deadlines.stale_age()
+    if stale_age is not None:
+        response.headers["X-Stale-Age"] = str(int(stale_age))
+
+    trace_id = tracing.current_id()
+    if trace_id:
+        response.headers["X-Trace-Id"] = trace_id
+        tracing.end(route=route, method=request.method, path=request.full_path, status=response.status_code)
+    return response
+
+
+@app.teardown_request
+def _stop_profile(exc):
+    # after_request is skipped when a view raises — don't leave the thread sampled
+    rec = g.pop("profile", None)
+    if rec is not None:
+        profiler.stop(rec)
+    if tracing.current_id():
+        tracing.end(path=request.full_path, status=500, error=str(exc)[:200] if exc else None)
+    deadlines.clear()
+    tenancy.set_current(None)
 
 
-def save_settings(settings):
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(settings, f, indent=2)
+# ---------------------------------------------------------------------------
+# Read-only web (BACKGROUND_WORKER=1) — the worker owns every upstream call
+# ---------------------------------------------------------------------------
+# Demo replays a local snapshot in-process, so it never needs the worker
+READ_ONLY = BACKGROUND_WORKER and APP_MODE != "demo"
+shared_cache.read_only = READ_ONLY
+PUBLISHED_STALE_AFTER = 3 * WORKER_INTERVAL
+
+
+def _published(name, default, shared=False, cursor=None):
+    """
+    The worker's latest payload for `name`, as (data, partial).
+    Not published yet → `default`, partial, and the worker is asked for it.
+    Older than a few worker passes → partial, with X-Stale-Age.
+    """
+    if not shared:
+        shared_cache.mark_seen()
+    entry = shared_cache.read(name, shared=shared)
+    if entry is None:
+        shared_cache.request_refresh(cursors=[cursor] if cursor else ())
+        return default, True
+    data, age = entry
+    if age > PUBLISHED_STALE_AFTER:
+        shared_cache.request_refresh(cursors=[cursor] if cursor else ())
+        deadlines.mark_stale(age)
+        return data, True
+    return data, False
+
+
+@app.route("/api/traces")
+@app.route("/api/traces/<trace_id>")
+def api_traces(trace_id=None):
+    """Development only: recent traces, or one trace's spans (?format=text for a waterfall)."""
+    if APP_MODE != "development":
+        return jsonify({"error": "Trace viewer is only available in development mode"}), 404
+    if trace_id is None:
+        return jsonify({"traces": tracing.recent(limit=request.args.get("limit", 50, type=int))})
+    trace = tracing.get_trace(trace_id)
+    if trace is None:
+        return jsonify({"error": "Trace not found"}), 404
+    if request.args.get("format") == "text":
+        return Response(tracing.waterfall(trace), mimetype="text/plain; charset=utf-8")
+    return jsonify(trace)
+
+
+@app.route("/api/profiles")
+def api_profiles():
+    """Slowest recent requests + explicitly profiled ones (?__profile=1)."""
+    if APP_MODE == "demo":
+        return jsonify({"error": "Profiling disabled in demo mode"}), 404
+    return jsonify(profiler.list_profiles())
+
+
+@app.route("/api/profiles/<profile_id>")
+def api_profile_stacks(profile_id):
+    """Collapsed stacks for flamegraph.pl / speedscope."""
+    if APP_MODE == "demo":
+        return jsonify({"error": "Profiling disabled in demo mode"}), 404
+    stacks = profiler.get_profile(profile_id)
+    if stacks is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return Response(stacks, mimetype="text/plain")
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Prometheus text format, summed across gunicorn workers."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 # ---------------------------------------------------------------------------
@@ -71,7 +229,7 @@ def auth_callback():
 
     # Exchange code for tokens
     try:
-        resp = requests.post(STRAVA_TOKEN_URL, data={
+        resp = http_client.post(http_client.STRAVA, STRAVA_TOKEN_URL, data={
             "client_id": STRAVA_CLIENT_ID,
             "client_secret": STRAVA_CLIENT_SECRET,
             "code": code,
@@ -80,11 +238,21 @@ def auth_callback():
         resp.raise_for_status()
         token_data = resp.json()
 
+        # From here on this browser is this athlete
+        athlete_id = (token_data.get("athlete") or {}).get("id")
+        if athlete_id:
+            _adopt_legacy_files(athlete_id)
+            session["athlete_id"] = athlete_id
+            tenancy.set_current(athlete_id)
+
         # Save tokens (includes access_token, refresh_token, expires_at, athlete)
         strava_client.save_tokens(token_data)
 
         # Clear cache so fresh data loads
         strava_client.cache_clear()
+        athlete_profile.reset()
+        if READ_ONLY:
+            shared_cache.request_refresh(force=True)
 
         return redirect("/")
     except Exception as e:
@@ -93,13 +261,86 @@ def auth_callback():
 
 @app.route("/auth/disconnect")
 def auth_disconnect():
-    """Remove stored tokens (disconnect from Strava)."""
-    if os.path.exists(strava_client.TOKEN_FILE):
-        os.remove(strava_client.TOKEN_FILE)
+    """Remove the athlete's stored tokens (disconnect from Strava) and sign out."""
+    strava_client.delete_tokens()
     strava_client.cache_clear()
+    athlete_profile.reset()
+    session.pop("athlete_id", None)
     return redirect("/")
 
 
+def _adopt_legacy_files(athlete_id):
+    """
+    Before multi-athlete support everything lived in the working directory.
+    The first time the athlete who owns those tokens signs in, move their
+    files into their own directory.
+    """
+    with tenancy.use(None):
+        legacy = strava_client.load_tokens()
+    if not legacy or str((legacy.get("athlete") or {}).get("id")) != str(athlete_id):
+        return
+    moved = tenancy.adopt_legacy(athlete_id, [
+        strava_client.TOKEN_FILE, SETTINGS_FILE, run_types.RUN_TYPES_FILE,
+        activity_store.STORE_FILE, records.RECORDS_FILE, training_load.LOAD_FILE,
+        zones.ZONES_FILE, athlete_profile.ATHLETE_FILE, athlete_profile.GEAR_FILE, mileage.MILEAGE_FILE,
+        rollups.ROLLUPS_FILE, heatmap.HEAT_INDEX_FILE, heatmap.HEATMAP_DIR, routes.ROUTES_FILE,
+        weather_history.ACTIVITY_WEATHER_FILE, sync.GAPS_FILE,
+        assistant_client.CACHE_FILE, stream_store.STREAMS_DIR,
+    ])
+    if moved:
+        print(f"Moved single-athlete data to {tenancy.athlete_dir(athlete_id)}: {', '.join(moved)}")
+
+
+# ---------------------------------------------------------------------------
+# Strava webhook (push subscription — see README)
+# ---------------------------------------------------------------------------
+def _event_athlete(owner_id):
+    """
+    Whose store a webhook event is for: (connected, athlete_id). The owner's
+    own directory, else the legacy single-athlete install if it's theirs.
+    """
+    owner = str(owner_id)
+    connected = tenancy.athletes(strava_client.TOKEN_FILE)
+    if owner in connected:
+        return True, owner
+    if None in connected:
+        with tenancy.use(None):
+            legacy = strava_client.load_tokens() or {}
+        if str((legacy.get("athlete") or {}).get("id")) == owner:
+            return True, None
+    return False, None
+
+
+@app.route("/api/webhooks/strava", methods=["GET", "POST"])
+def strava_webhook():
+    """
+    GET answers Strava's subscription handshake. POST receives activity
+    create/update/delete events and applies them to the owner's store (or
+    queues them for the worker). A non-200 makes Strava retry the event.
+    """
+    if request.method == "GET":
+        if (request.args.get("hub.mode") != "subscribe" or not STRAVA_WEBHOOK_VERIFY_TOKEN
+                or request.args.get("hub.verify_token") != STRAVA_WEBHOOK_VERIFY_TOKEN):
+            return jsonify({"error": "Webhook verification failed"}), 403
+        return jsonify({"hub.challenge": request.args.get("hub.challenge", "")})
+
+    event = request.get_json(silent=True) or {}
+    if event.get("object_type") != "activity" or not str(event.get("object_id", "")).isdigit():
+        return jsonify({"ignored": True})
+    connected, athlete_id = _event_athlete(event.get("owner_id"))
+    if not connected:
+        return jsonify({"ignored": True})
+    try:
+        with tenancy.use(athlete_id):
+            if READ_ONLY:
+                shared_cache.request_refresh(activities=[int(event["object_id"])])
+                return jsonify({"queued": True})
+            changed = sync.apply_event(int(event["object_id"]))
+        return jsonify({"changed": changed})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # ---------------------------------------------------------------------------
 # API Routes
 # ---------------------------------------------------------------------------
@@ -111,56 +352,69 @@ def api_status():
     return jsonify({
         "connected": connected,
         "settings": load_settings(),
+        "upstreams": http_client.breaker_states(),
+        "stravaQuota": http_client.strava_quota(),
     })
 
 
 @app.route("/api/profile")
 def api_profile():
-    """Athlete profile + shoes + YTD stats."""
+    """Athlete profile + shoes (with retirement projections) + YTD stats."""
     try:
-        profile = strava_client.get_profile()
-
-        # Apply user shoe max settings
         settings = load_settings()
-        shoe_maxes = settings.get("shoeMaxMiles", {})
-        if isinstance(shoe_maxes, dict):
-            for shoe in profile["shoes"]:
-                shoe["max"] = shoe_maxes.get(shoe["id"], DEFAULT_SHOE_MAX_MILES)
-
-        return jsonify(profile)
+        if READ_ONLY:
+            profile, partial = _published("profile", None)
+        else:
+            profile, partial = deadlines.run_section(lambda: build_profile(settings), None)
+        if profile is None:
+            return jsonify({"error": "Strava did not respond in time", "partial": {"profile": True}}), 504
+        return jsonify({**profile, "partial": {"profile": partial}})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @app.route("/api/activities")
 def api_activities():
-    """Recent activities with details + current week summary."""
+    """
+    Recent runs with details + current week summary.
+    Older pages: ?before=<nextCursor from the previous page>. The read-only
+    web serves the published pages, so ?count is fixed at FEED_PAGE_SIZE there.
+    """
     try:
         settings = load_settings()
 
         # Recent runs (always has content)
-        count = request.args.get("count", 10, type=int)
-        page = request.args.get("page", 1, type=int)
-        activities = strava_client.get_recent_activities(count=count, page=page)
-
-        # Merge user-assigned run types from run_types.json
-        saved_types = load_run_types()
-        for act in activities:
-            key = str(act.get("id", ""))
-            if key in saved_types:
-                act["runType"] = saved_types[key]
-
-        # Current week summary (day bubbles, total, goal)
-        week = strava_client.get_current_week_summary(
-            goal_miles=settings.get("goalMi", DEFAULT_WEEKLY_GOAL)
-        )
+        count = max(1, min(request.args.get("count", FEED_PAGE_SIZE, type=int), MAX_FEED_PAGE_SIZE))
+        before = request.args.get("before") or None
+        if before:
+            try:
+                activity_store.decode_cursor(before)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+        goal = settings.get("goalMi", DEFAULT_WEEKLY_GOAL)
+        empty_feed = {"activities": [], "nextCursor": None}
+        empty_week = {"weekDays": [], "totalMi": 0, "goalMi": goal}
+        if READ_ONLY:
+            feed, acts_partial = _published(feed_payload_name(before), empty_feed, cursor=before)
+            week, week_partial = _published("week", empty_week)
+            week = {**week, "goalMi": goal}
+        else:
+            feed, acts_partial = deadlines.run_section(lambda: build_feed(count=count, before=before), empty_feed)
+            # Current week summary (day bubbles, total, goal)
+            week, week_partial = deadlines.run_section(lambda: build_week(goal), empty_week)
+        apply_run_types_json(feed["activities"])
+        for act in feed["activities"]:
+            act["routeId"] = routes.route_of(act["id"])
+            act["startWeather"] = weather_history.at_start(act["id"])
 
         return jsonify({
-            "activities": activities,
+            "activities": feed["activities"],
+            "nextCursor": feed["nextCursor"],
             "weekDays": week["weekDays"],
             "totalMi": week["totalMi"],
             "goalMi": week["goalMi"],
             "vo2": settings.get("vo2", 52),
+            "partial": {"activities": acts_partial, "week": week_partial},
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -168,11 +422,265 @@ def api_activities():
 
 @app.route("/api/weeks")
 def api_weeks():
-    """Past weeks summaries."""
+    """
+    Past weeks summaries. ?zones=1 adds HR/pace time-in-zone per week.
+    The read-only web serves the published PUBLISHED_WEEKS at most.
+    """
     try:
         count = request.args.get("count", 3, type=int)
-        data = strava_client.get_past_weeks(count=count)
-        return jsonify(data)
+        if READ_ONLY:
+            data, partial = _published("weeks", {"weeks": []})
+            data = {"weeks": data["weeks"][:count]}
+        else:
+            data, partial = deadlines.run_section(lambda: build_weeks(count=count), {"weeks": []})
+        if request.args.get("zones"):
+            update_zones(load_settings())
+            starts = _past_week_starts(len(data["weeks"]))
+            data = {"weeks": [
+                {**w, "zones": zones.range_zones(start.isoformat(), (start + timedelta(days=6)).isoformat())}
+                for w, start in zip(data["weeks"], starts)
+            ]}
+        return jsonify({**data, "partial": {"weeks": partial}})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def update_zones(settings):
+    """
+    Bring the zones index up to date with the athlete's zone settings.
+    The read-only web leaves that to the worker (which owns the index) and
+    only asks for it when the settings' bounds haven't been applied yet.
+    """
+    hr_bounds, pace_bounds = zone_bounds(settings)
+    if not READ_ONLY:
+        zones.update(hr_bounds=hr_bounds, pace_bounds=pace_bounds)
+    elif zones.bounds() != {"hr": list(hr_bounds), "pace": list(pace_bounds)}:
+        shared_cache.request_refresh()
+
+
+def _past_week_starts(count, offset=1):
+    """Monday dates of the `count` weeks before the current one, newest first."""
+    today = date.today()
+    monday = today - timedelta(days=today.weekday())
+    return [monday - timedelta(weeks=w) for w in range(offset, count + offset)]
+
+
+@app.route("/api/zones")
+def api_zones():
+    """Weekly HR/pace time-in-zone histograms (?weeks=52), newest first."""
+    try:
+        update_zones(load_settings())
+        weeks = request.args.get("weeks", 12, type=int)
+        result = []
+        for start in _past_week_starts(weeks, offset=0):
+            end = start + timedelta(days=6)
+            result.append({
+                "start": start.isoformat(),
+                "label": f"{start.strftime('%b %-d')} – {end.strftime('%b %-d')}",
+                **zones.range_zones(start.isoformat(), end.isoformat()),
+            })
+        return jsonify({"bounds": zones.bounds(), "weeks": result})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/activities/<int:activity_id>/zones")
+def api_activity_zones(activity_id):
+    """HR/pace time-in-zone for one run (needs its streams)."""
+    try:
+        hr_bounds, pace_bounds = zone_bounds(load_settings())
+        data = zones.get_activity_zones(activity_id, hr_bounds, pace_bounds)
+        if data is None:
+            return jsonify({"error": "No streams for this activity yet"}), 404
+        return jsonify({"bounds": {"hr": hr_bounds, "pace": pace_bounds}, **data})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _athlete_units():
+    """The athlete's measurement_preference ("feet" or "meters")."""
+    if READ_ONLY:
+        # Never /athlete from the web — feet until the worker has published a profile
+        profile, _ = _published("profile", {})
+        return (profile or {}).get("measurement_preference") or "feet"
+    return athlete_profile.get_units()
+
+
+@app.route("/api/records")
+def api_records():
+    """Best-effort leaderboards (400m → marathon) from activity streams, paces in the athlete's units."""
+    try:
+        if not READ_ONLY:
+            try:
+                sync.sync_if_stale()
+            except Exception as e:
+                print(f"Sync before records failed: {e}")
+        limit = request.args.get("limit", 5, type=int)
+        return jsonify(records.get_records(limit=limit, units=_athlete_units()))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/load")
+def api_load():
+    """Training load: daily load, fatigue (ATL), fitness (CTL), form (TSB)."""
+    try:
+        if not READ_ONLY:
+            try:
+                sync.sync_if_stale()
+            except Exception as e:
+                print(f"Sync before load failed: {e}")
+        days = request.args.get("days", 42, type=int)
+        return jsonify(training_load.get_load(days=days))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _shoe_names():
+    """gear id → shoe name, from the profile snapshot (never fetched just for this)."""
+    if READ_ONLY:
+        profile, _ = _published("profile", None)
+        shoes = (profile or {}).get("shoes", [])
+    else:
+        try:
+            shoes = athlete_profile.get_identity()["shoes"]
+        except Exception:
+            shoes = []
+    return {s["id"]: s["name"] for s in shoes}
+
+
+def _named_shoes(shoes, names):
+    return [{"id": gear_id, "name": names.get(gear_id, "Unknown"), "meters": meters}
+            for gear_id, meters in shoes.items()]
+
+
+@app.route("/api/rollups")
+def api_rollups():
+    """
+    Materialized totals per ?grain=week|month|year, oldest first, optionally
+    limited to period keys ?from=…&to= (e.g. 2024-01 … 2025-12). Raw SI units.
+    """
+    try:
+        grain = request.args.get("grain", "month")
+        if grain not in rollups.GRAINS:
+            return jsonify({"error": f"Unknown grain: {grain} (week, month or year)"}), 400
+        partial = False
+        if not READ_ONLY:
+            _, partial = deadlines.run_section(refresh_store, None)
+        names = _shoe_names()
+        periods = rollups.get_rollups(grain, request.args.get("from"), request.args.get("to"))
+        for p in periods:
+            p["shoes"] = _named_shoes(p["shoes"], names)
+        return jsonify({"grain": grain, "periods": periods, "partial": {"rollups": partial}})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/year-in-review")
+def api_year_in_review():
+    """One year's totals, change on the year before, highlights. ?year= (default this year)."""
+    try:
+        year = request.args.get("year", date.today().year, type=int)
+        if not READ_ONLY:
+            deadlines.run_section(refresh_store, None)
+        review = rollups.year_in_review(year)
+        if review is None:
+            return jsonify({"error": f"No runs in {year}"}), 404
+        review["shoes"] = _named_shoes(review["shoes"], _shoe_names())
+        return jsonify(review)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/routes")
+def api_routes():
+    """Repeated routes (run at least ?min=2 times), most-run first. Raw SI units."""
+    try:
+        min_runs = max(1, request.args.get("min", 2, type=int))
+        partial = False
+        if not READ_ONLY:
+            _, partial = deadlines.run_section(refresh_store, None)
+        return jsonify({"routes": routes.list_routes(min_runs), "partial": {"routes": partial}})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/routes/<route_id>")
+def api_route_history(route_id):
+    """One route's runs oldest first, best time and pace trend (s/km per 30 days)."""
+    try:
+        if not READ_ONLY:
+            deadlines.run_section(refresh_store, None)
+        history = routes.route_history(route_id)
+        if history is None:
+            return jsonify({"error": f"Unknown route: {route_id}"}), 404
+        return jsonify(history)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/export")
+def api_export():
+    """
+    Full activity history from the local store, streamed.
+    ?format=ndjson|csv (default ndjson), ?include=run_types,splits,routes,weather,
+    ?units=feet|meters for split length (default: the athlete's preference).
+    """
+    try:
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in export.FORMATS:
+            return jsonify({"error": f"Unknown format: {fmt} (ndjson or csv)"}), 400
+        try:
+            include = export.parse_include(request.args.get("include"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        units = request.args.get("units") or _athlete_units()
+        saved_types = run_types.load() if "run_types" in include else {}
+        athlete_id = tenancy.current()
+
+        def generate():
+            # Runs while the response is sent — keep reading this athlete's files
+            with tenancy.use(athlete_id):
+                rows = export.csv_rows if fmt == "csv" else export.ndjson
+                yield from rows(include=include, run_types=saved_types, units=units)
+
+        mimetype, filename = export.FORMATS[fmt]
+        return Response(stream_with_context(generate()), mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "X-Accel-Buffering": "no",  # let proxies pass rows through as they're generated
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/tiles/heat/<int:z>/<int:x>/<int:y>.png")
+def heat_tile(z, x, y):
+    """Personal heatmap tile (see heatmap.py) — transparent where no run has been."""
+    try:
+        if not heatmap.valid_tile(z, x, y):
+            return jsonify({"error": f"No heatmap tile {z}/{x}/{y}"}), 404
+        path = heatmap.tile_file(z, x, y)
+        if path is None:
+            response = Response(heatmap.EMPTY_TILE, mimetype="image/png")
+        else:
+            response = send_file(os.path.abspath(path), mimetype="image/png", conditional=True)
+        # Revalidate every time: the worker rewrites a tile when a new run crosses it
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/sync", methods=["POST"])
+def api_sync():
+    """Pull new activities + a batch of streams into the local store."""
+    try:
+        if READ_ONLY:
+            shared_cache.request_refresh(force=True)
+            return jsonify({"queued": True}), 202
+        return jsonify(sync.sync_activities(streams_limit=sync.fair_share()))
+    except sync.StoreBusy as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -180,17 +688,37 @@ def api_weeks():
 @app.route("/api/refresh")
 def api_refresh():
     """Force cache clear and refetch."""
+    if READ_ONLY:
+        shared_cache.request_refresh(force=True)
+        return jsonify({"status": "refresh queued"})
     strava_client.cache_clear()
     return jsonify({"status": "cache cleared"})
 
 
 @app.route("/api/weather")
 def api_weather():
-    """Hourly weather forecast for running hours."""
+    """
+    Hourly weather forecast for running hours: ?lat=&lon= (any point — served
+    for its grid cell), ?location=home (the athlete's most frequent run start)
+    or a preset ?location=concord|danville.
+    """
     try:
         location = request.args.get("location", "concord")
-        data = weather_client.get_hourly_forecast(location=location)
-        return jsonify(data)
+        try:
+            if location.lower() == "home" and "lat" not in request.args:
+                home = home_cells()
+                cell = home[0] if home else weather_client.resolve()  # no GPS runs yet
+            else:
+                cell = weather_client.resolve(location, request.args.get("lat"), request.args.get("lon"))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        lat, lon = cell.split(",")
+        if READ_ONLY:
+            shared_cache.want_weather(cell)
+            data, partial = _published(f"weather_{cell}", {"hours": []}, shared=True)
+        else:
+            data, partial = deadlines.run_section(lambda: weather_client.get_hourly_forecast(lat=lat, lon=lon), {"hours": []})
+        return jsonify({**data, "cell": {"lat": float(lat), "lon": float(lon)}, "partial": {"weather": partial}})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -201,21 +729,25 @@ def api_assistant():
     try:
         # If refresh=1, clear cached assistant message
         if request.args.get("refresh"):
-            import assistant_client as ac
-            if os.path.exists(ac.CACHE_FILE):
-                os.remove(ac.CACHE_FILE)
+            if os.path.exists(assistant_client.cache_path()):
+                os.remove(assistant_client.cache_path())
+            if READ_ONLY:
+                shared_cache.request_refresh()
 
         is_demo = request.args.get("demo")
+        if is_demo and READ_ONLY and not http_client.snapshot_available():
+            # The hardcoded demo context still calls OpenWeather and Claude inline
+            return jsonify({"error": "Demo coaching needs APP_MODE=demo with BACKGROUND_WORKER=1"}), 400
 
-        if is_demo:
+        if is_demo and not http_client.snapshot_available():
             # Demo mode — use hardcoded context, skip Strava calls
             activities = [
-                {"id": 1, "title": "Morning Long Run", "start_date_local": "2026-02-11T07:24:00",
-                 "distance": "13.3 mi", "time": "1h 42m", "pace": "7:42 /mi", "runType": "Easy Long Run"},
-                {"id": 2, "title": "Easy Recovery Run", "start_date_local": "2026-02-10T06:15:00",
-                 "distance": "8.1 mi", "time": "1h 8m", "pace": "8:24 /mi"},
-                {"id": 3, "title": "Tempo Run", "start_date_local": "2026-02-09T05:45:00",
-                 "distance": "4.8 mi", "time": "35m", "pace": "7:18 /mi", "runType": "Tempo Run"},
+                Activity(id=1, name="Morning Long Run", start_date_local="2026-02-11T07:24:00",
+                         distance=21404, moving_time=6145, average_speed=3.483, run_type="Easy Long Run"),
+                Activity(id=2, name="Easy Recovery Run", start_date_local="2026-02-10T06:15:00",
+                         distance=13036, moving_time=4082, average_speed=3.194),
+                Activity(id=3, name="Tempo Run", start_date_local="2026-02-09T05:45:00",
+                         distance=7725, moving_time=2102, average_speed=3.675, run_type="Tempo Run"),
             ]
             week = {"totalMi": 26.2, "goalMi": 50}
             goal = 50
@@ -226,46 +758,27 @@ def api_assistant():
                 {"type": "Tempo Run", "count": 0},
             ]
             profile = {"name": "DJ Run", "city": "Concord", "state": "CA"}
+            context = {
+                "activities": activities,
+                "week_summary": week,
+                "weather": assistant_weather(),
+                "plan": plan,
+                "profile": profile,
+                "goal_mi": goal,
+                "load": None,
+            }
+        elif READ_ONLY:
+            # The worker regenerates it (and a refresh=1 above dropped the cached one)
+            result, partial = _published("assistant", {"message": None, "mode": "pending"})
+            return jsonify({**result, "partial": {"message": partial}})
         else:
             # Live mode — gather context from Strava
-            settings = load_settings()
-            goal = settings.get("goalMi", DEFAULT_WEEKLY_GOAL)
-
-            activities = strava_client.get_recent_activities(count=10)
-            saved_types = load_run_types()
-            for act in activities:
-                key = str(act.get("id", ""))
-                if key in saved_types:
-                    act["runType"] = saved_types[key]
-
-            week = strava_client.get_current_week_summary(goal_miles=goal)
+            context = coaching_context(load_settings())
 
-            # Profile — best effort
-            profile = None
-            try:
-                profile = strava_client.get_profile()
-            except Exception:
-                pass
-
-            # Plan — read from settings if saved, else use None
-            plan = settings.get("plan")
-
-        # Weather — 48h forecast for assistant context (works in both modes)
-        weather = None
-        try:
-            weather = weather_client.get_48h_forecast(location="concord")
-        except Exception:
-            pass
-
-        result = assistant_client.get_coaching_message(
-            activities=activities,
-            week_summary=week,
-            weather=weather,
-            plan=plan,
-            profile=profile,
-            goal_mi=goal,
+        result, partial = deadlines.run_section(
+            lambda: assistant_client.get_coaching_message(**context), {"message": None, "mode": "error"}
         )
-        return jsonify(result)
+        return jsonify({**result, "partial": {"message": partial}})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -277,15 +790,11 @@ def api_assistant_debug():
         settings = load_settings()
         goal = settings.get("goalMi", DEFAULT_WEEKLY_GOAL)
         activities = strava_client.get_recent_activities(count=10)
-        saved_types = load_run_types()
-        for act in activities:
-            key = str(act.get("id", ""))
-            if key in saved_types:
-                act["runType"] = saved_types[key]
-        week = strava_client.get_current_week_summary(goal_miles=goal)
+        apply_run_types(activities)
+        week = build_week(goal)
         profile = None
         try:
-            profile = strava_client.get_profile()
+            profile = athlete_profile.get_profile()
         except Exception:
             pass
         plan = settings.get("plan")
@@ -294,20 +803,45 @@ def api_assistant_debug():
             weather = weather_client.get_48h_forecast(location="concord")
         except Exception:
             pass
+        load = None
+        try:
+            load = training_load.current()
+        except Exception:
+            pass
         mode = assistant_client.detect_mode(activities, plan)
-        context = assistant_client.build_context(activities, week, weather, plan, profile, goal_mi=goal)
+        context = assistant_client.build_context(activities, week, weather, plan, profile, goal_mi=goal, load=load)
         return jsonify({
             "mode": mode,
             "context": context,
-            "raw_activities": activities[:5],
+            "raw_activities": [a.to_json() for a in activities[:5]],
             "week_summary": week,
             "goal": goal,
             "plan": plan,
+            "load": load,
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def _zone_bounds_error(data):
+    """
+    Why posted zone bounds are unusable, or None. Each is 4 strictly ordered
+    numbers — HR ascending (bpm), pace descending (seconds per mile, slowest
+    first); null or [] goes back to the defaults.
+    """
+    for key, name, ordered in (("hrZones", "HR", lt), ("paceZones", "pace", gt)):
+        bounds = data.get(key)
+        if not bounds:
+            continue
+        if (not isinstance(bounds, list) or len(bounds) != 4
+                or not all(isinstance(b, (int, float)) and not isinstance(b, bool) and b > 0 for b in bounds)):
+            return f"{key} must be a list of 4 positive numbers"
+        if not all(map(ordered, bounds[:-1], bounds[1:])):
+            order = "ascending" if ordered is lt else "descending (slowest first)"
+            return f"{name} zone bounds must be strictly {order}"
+    return None
+
+
 @app.route("/api/settings", methods=["GET", "POST"])
 def api_settings():
     """Read/write user preferences."""
@@ -315,42 +849,36 @@ def api_settings():
         return jsonify(load_settings())
 
     data = request.get_json()
+    error = _zone_bounds_error(data)
+    if error:
+        return jsonify({"error": error}), 400
     settings = load_settings()
     # Merge incoming with existing
-    for key in ["goalMi", "vo2", "shoeMaxMiles", "favoriteShoes"]:
+    for key in ["goalMi", "vo2", "shoeMaxMiles", "favoriteShoes", "hrZones", "paceZones"]:
         if key in data:
             settings[key] = data[key]
     save_settings(settings)
+    if READ_ONLY:
+        shared_cache.request_refresh()  # shoe maxes/goal feed into published payloads
     return jsonify(settings)
 
 
 # ---------------------------------------------------------------------------
-# Run type tagging (persisted per activity)
+# Run type tagging (persisted per activity, per athlete)
 # ---------------------------------------------------------------------------
-RUN_TYPES_FILE = "run_types.json"
-
-
-def load_run_types():
-    if os.path.exists(RUN_TYPES_FILE):
-        with open(RUN_TYPES_FILE, "r") as f:
-            return json.load(f)
-    return {}
-
-
-def save_run_types(data):
-    with open(RUN_TYPES_FILE, "w") as f:
-        json.dump(data, f, indent=2)
-
-
 @app.route("/api/activities/<int:activity_id>/runtype", methods=["POST"])
 def set_run_type(activity_id):
     """Save user-assigned run type for an activity."""
     data = request.get_json()
     run_type = data.get("runType")
 
-    types = load_run_types()
+    types = run_types.load()
     types[str(activity_id)] = run_type
-    save_run_types(types)
+    run_types.save(types)
+    if READ_ONLY:
+        shared_cache.request_refresh(retyped=[activity_id])  # the worker owns the rollups
+    else:
+        rollups.update([activity_id])
 
     # Clear activity cache so it picks up the new type
     strava_client.cache_clear()
@@ -361,9 +889,10 @@ def set_run_type(activity_id):
 # ---------------------------------------------------------------------------
 # AI Test Debug Route
 # ---------------------------------------------------------------------------
+# Activity fields, raw Strava units: distance m, moving_time s, average_speed m/s
 AI_TEST_DEFAULT_RUNS = json.dumps([
-    {"title": "Morning Long Run", "start_date_local": "2026-02-11T07:24:00", "distance": "13.3 mi", "time": "1h 42m", "pace": "7:42 /mi"},
-    {"title": "Easy Recovery Run", "start_date_local": "2026-02-10T06:15:00", "distance": "8.1 mi", "time": "1h 8m", "pace": "8:24 /mi"},
+    {"name": "Morning Long Run", "start_date_local": "2026-02-11T07:24:00", "distance": 21404, "moving_time": 6145, "average_speed": 3.483},
+    {"name": "Easy Recovery Run", "start_date_local": "2026-02-10T06:15:00", "distance": 13036, "moving_time": 4082, "average_speed": 3.194},
 ], indent=2)
 
 AI_TEST_DEFAULT_PLAN = json.dumps([
@@ -399,8 +928,8 @@ def ai_test():
     force_mode = request.form.get("force_mode", "auto")
 
     try:
-        activities = json.loads(runs_json)
-    except json.JSONDecodeError as e:
+        activities = [Activity(**run) for run in json.loads(runs_json)]
+    except (json.JSONDecodeError, TypeError) as e:
         return _ai_test_form(
             goal_mi=goal_mi, miles_done=miles_done, runs_json=runs_json,
             plan_json=plan_json, weather_override=weather_override,
@@ -445,34 +974,14 @@ def ai_test():
     user_msg = f"Mode: {mode}\n\nContext:\n{context}"
     claude_response = ""
     api_error = ""
+    usage = None
 
     if not ANTHROPIC_API_KEY:
         api_error = "ANTHROPIC_API_KEY not set"
     else:
         try:
-            resp = requests.post(
-                "https://api.anthropic.com/v1/messages",
-                headers={
-                    "x-api-key": ANTHROPIC_API_KEY,
-                    "anthropic-version": "2023-06-01",
-                    "content-type": "application/json",
-                },
-                json={
-                    "model": assistant_client.CLAUDE_MODEL,
-                    "max_tokens": assistant_client.MAX_TOKENS,
-                    "temperature": assistant_client.TEMPERATURE,
-                    "system": assistant_client.SYSTEM_PROMPT,
-                    "messages": [{"role": "user", "content": user_msg}],
-                },
-                timeout=15,
-            )
-            resp.raise_for_status()
-            data = resp.json()
-            for block in data.get("content", []):
-                if block.get("type") == "text":
-                    claude_response += block["text"]
-            if not claude_response:
-                api_error = "Empty response from Claude"
+            claude_response, usage = assistant_client.call_claude(user_msg)
+            usage = assistant_client.usage_report(usage)
         except Exception as e:
             api_error = str(e)
 
@@ -480,13 +989,13 @@ def ai_test():
         goal_mi=goal_mi, miles_done=miles_done, runs_json=runs_json,
         plan_json=plan_json, weather_override=weather_override,
         force_mode=force_mode, context=context, mode=mode,
-        claude_response=claude_response, api_error=api_error,
+        claude_response=claude_response, api_error=api_error, usage=usage,
     )
 
 
 def _ai_test_form(goal_mi=50, miles_done=0, runs_json="[]", plan_json="[]",
                    weather_override="", force_mode="auto", context=None,
-                   mode=None, claude_response=None, api_error=None, error=None):
+                   mode=None, claude_response=None, api_error=None, usage=None, error=None):
     """Render the AI test debug form with optional results."""
     def _esc(s):
         """Escape HTML entities."""
@@ -514,6 +1023,10 @@ def _ai_test_form(goal_mi=50, miles_done=0, runs_json="[]", plan_json="[]",
         <div style="margin-top:16px;margin-bottom:12px"><strong>Claude response:</strong></div>
         <div style="background:#f0f7f0;padding:16px;border-radius:8px;border-left:4px solid #4a9;font-size:15px;line-height:1.6">{_esc(claude_response)}</div>
         """
+            if usage:
+                results_html += f"""
+        <div style="margin-top:12px;font-size:13px;color:#555"><strong>Tokens:</strong> {usage['input']} input, {usage['output']} output</div>
+        """
 
     return f"""<!DOCTYPE html>
 <html><head><title>AI Test — AI Run Partner</title>
@@ -538,7 +1051,7 @@ def _ai_test_form(goal_mi=50, miles_done=0, runs_json="[]", plan_json="[]",
   <label>Miles completed this week</label>
   <input type="number" name="miles_done" value="{miles_done}" step="0.1">
 
-  <label>Recent runs (JSON array)</label>
+  <label>Recent runs (JSON array of activity fields: distance in m, moving_time in s, average_speed in m/s)</label>
   <textarea name="runs_json">{_esc(runs_json)}</textarea>
 
   <label>Remaining plan types (JSON array)</label>
@@ -562,7 +1075,7 @@ def _ai_test_form(goal_mi=50, miles_done=0, runs_json="[]", plan_json="[]",
 # ---------------------------------------------------------------------------
 @app.route("/")
 def index():
-    return render_template("index.html", app_mode=APP_MODE)
+    return render_template("index.html", app_mode=APP_MODE, replay=http_client.snapshot_available())
 
 
 @app.route("/static/<path:path>")
@@ -7,15 +7,21 @@ gathers context, and returns cached or fresh coaching insights.
 import json
 import os
 import time
-import requests
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
-from config import ANTHROPIC_API_KEY
+import deadlines
+import http_client
+import metrics
+import tenancy
+import tracing
+from config import ANTHROPIC_API_KEY, ANTHROPIC_API_URL
+from units import format_distance, format_duration, format_pace, meters_to_miles
 
 _TZ = ZoneInfo("America/Los_Angeles")
 
 CACHE_FILE = "assistant_cache.json"
 CLAUDE_MODEL = "claude-sonnet-4-20250514"
+ANTHROPIC_VERSION = "2023-06-01"
 MAX_TOKENS = 200
 TEMPERATURE = 0.7
 
@@ -30,51 +36,52 @@ CACHE_TTL = {
 SYSTEM_PROMPT = """You are a casual running buddy giving a quick check-in on a personal running dashboard.
 
 FORMAT:
-- One opening sentence about the day and week. If multiple runs logged today, reference total daily mileage only — don't list individually or call any a "warm-up." Don't sound like they just finished.
-- Then 1-3 bullets using "- " prefix. Every bullet must be actionable and non-obvious. Nothing after the bullets.
-- No emojis.
-- Never say "X% rain chance" — say "X% chance of rain." For 100%, just say "rain all day" or "rain expected all day."
+- One opening sentence about the day and week. For several runs today, mention only the day's total mileage — don't list them or call any a "warm-up." Don't sound like they just finished.
+- Then 1-3 bullets with a "- " prefix, each actionable and non-obvious. Nothing after the bullets. No emojis.
+- Say "X% chance of rain," never "X% rain chance." For 100%, "rain expected all day."
 
-DAY AWARENESS:
-- The context tells you what day it is (e.g. "Today is Saturday"). Use it. If you say "tomorrow" and today is Saturday, tomorrow is Sunday. Never contradict yourself — don't say "rest tomorrow" then suggest running on the same day.
+DAYS: The context says what day it is — use it (if today is Saturday, tomorrow is Sunday). Never contradict yourself, e.g. "rest tomorrow" and then a run tomorrow.
 
 NEVER MENTION:
 - Sleep, hydration, refueling, stretching, foam rolling, "listen to your body"
 - Generic encouragement ("great job", "keep it up", "you're on track")
 - Pace analysis or fitness commentary — the user can see their own numbers
-- NEVER reference any specific past run by distance or name if it was more than 3 days ago. No exceptions. No "your 20-miler last week", no "that long run is still in your legs." Only reference runs from the last 3 days. If there are no runs in the last 3 days, don't reference any past runs or efforts at all — no "recent long efforts", no "after your recent training."
+- Any run from more than 3 days ago, by distance, name or allusion ("your 20-miler last week", "recent long efforts"). No exceptions. With no runs in the last 3 days, reference no past runs at all.
 
-ONE RUN PER DAY:
-- The context includes a "RAN TODAY" field. If it says "Yes", the user has already run today. NEVER suggest running more today — no "consider a longer run today", no "get miles in today if you're feeling good", no splits, no shakeouts. Today is done. This overrides everything else.
+RAN TODAY: If the context says "RAN TODAY: Yes", today is done — never suggest more running today (no longer run, extra miles, splits or shakeouts). This overrides everything else.
 
-WEEK BOUNDARIES:
-- "This week's runs" = current Mon-Sun. "Previous-week run" = last week. Never mix them up.
+WEEK: "This week's runs" are the current Mon-Sun; the "previous-week run" is from last week. Never mix them up.
 
 WEATHER:
-- Reference specific temps, rain chance, wind when relevant.
-- Rain tomorrow = rest day. Don't push running in bad weather to hit mileage.
-- Only suggest "get miles in today" if no run logged today AND tomorrow is bad.
-- Don't write off an entire day as rainy. Check the hourly forecast — if part of the day is dry, suggest running during that window. For example, if morning is dry but afternoon has rain, say "get out this morning before the rain arrives" rather than treating it as a rest day.
+- Reference specific temps, rain chance and wind when relevant.
+- Rain tomorrow = rest day; don't push running in bad weather to hit mileage. Suggest "get miles in today" only if no run is logged today AND tomorrow is bad.
+- Don't write off a whole day as rainy: if the hourly forecast has a dry window, suggest it ("get out this morning before the rain arrives").
 
 MILEAGE — BE HONEST:
-- If the user already ran today and remaining days have bad weather, do NOT mention how many miles are left. The dashboard already shows that. Just suggest rest and move on.
-- If the weekly goal is clearly out of reach, say "lighter week, that's fine" and move on. Don't manufacture a plan to squeeze in miles.
-- Never frame remaining mileage as something to "tackle", "make up", or "salvage." Missing weekly mileage is not a failure.
-- Never guilt-trip about missed miles. It's fine.
+- If they already ran today and the remaining days look bad, don't mention miles left (the dashboard shows them) — suggest rest and move on.
+- If the goal is clearly out of reach, say "lighter week, that's fine" and move on; don't plan to squeeze miles in.
+- Missing weekly mileage is not a failure: never "tackle", "make up" or "salvage" it, never guilt-trip.
 - Never suggest more than 15 miles in one day unless they've recently done that distance.
 
-WEIGH-IN REMINDER:
-- If today is Monday, Thursday, or Sunday and there are fewer than 3 bullets, add one: "Good day to step on the scale and check in."
+TRAINING LOAD: If form is below -20, lean toward easy running or rest. Never quote the load numbers.
+
+WEIGH-IN: On Monday, Thursday or Sunday with fewer than 3 bullets, add "Good day to step on the scale and check in."
 
 GOAL COMPLETE:
-- Weekly goal hit + all run types done: note briefly, suggest strength or cycling (Zwift). No more running.
-- Goal hit but some types remain: mention what's left without pressure."""
+- Goal hit and all run types done: note it briefly, suggest strength or cycling (Zwift), no more running.
+- Goal hit with run types left: mention what's left without pressure."""
+
+
+def cache_path():
+    """The current athlete's coaching cache file."""
+    return tenancy.path(CACHE_FILE)
 
 
 def _load_cache():
-    if os.path.exists(CACHE_FILE):
+    path = cache_path()
+    if os.path.exists(path):
         try:
-            with open(CACHE_FILE, "r") as f:
+            with open(path, "r") as f:
                 return json.load(f)
         except (json.JSONDecodeError, IOError):
             pass
@@ -82,23 +89,23 @@ def _load_cache():
 
 
 def _save_cache(data):
-    with open(CACHE_FILE, "w") as f:
+    with open(cache_path(), "w") as f:
         json.dump(data, f, indent=2)
 
 
 def detect_mode(activities, plan=None):
     """
     Determine coaching mode based on today's activities and plan.
-    activities: list of activity dicts with start_date_local
+    activities: list of Activity records
     plan: list of plan items with type and count (optional)
     """
     now = datetime.now(_TZ)
     today_str = now.strftime("%Y-%m-%d")
 
     has_run_today = False
-    for a in (activities or []):
-        sdl = a.get("start_date_local", "")
-        if sdl and sdl[:10] == today_str:
+    for a in activities or []:
+        sdl = a.start_date_local or ""
+        if sdl[:10] == today_str:
             has_run_today = True
             break
 
@@ -148,8 +155,9 @@ def _is_cache_valid(cache, mode, activities):
     return (now - cached_ts) < ttl
 
 
-def build_context(activities, week_summary, weather, plan, profile, goal_mi=None):
-    """Build context string for the Claude prompt."""
+def build_context(activities, week_summary, weather, plan, profile, goal_mi=None, load=None):
+    """Build context string for the Claude prompt from Activity records (raw meters/seconds)."""
+    activities = activities or []
     now = datetime.now(_TZ)
     day_name = now.strftime("%A")
     time_str = now.strftime("%-I:%M %p")
@@ -173,6 +181,13 @@ def build_context(activities, week_summary, weather, plan, profile, goal_mi=None
         remaining_mi = round(max(goal - total, 0), 1)
         parts.append(f"Weekly mileage: {total} of {goal} mi goal ({remaining_mi} mi remaining)")
 
+    # Training load (from training_load.current()) — fatigue vs fitness
+    if load:
+        parts.append(
+            f"Training load: fatigue (7-day) {load['atl']}, fitness (42-day) {load['ctl']}, "
+            f"form {load['tsb']} (negative = carrying fatigue)"
+        )
+
     # Plan items remaining
     if plan:
         remaining = []
@@ -188,7 +203,7 @@ def build_context(activities, week_summary, weather, plan, profile, goal_mi=None
         this_week_acts = []
         prev_acts = []
         for a in activities:
-            sdl = a.get("start_date_local", "")
+            sdl = a.start_date_local or ""
             if sdl:
                 try:
                     act_date = datetime.strptime(sdl[:10], "%Y-%m-%d").date()
@@ -203,16 +218,16 @@ def build_context(activities, week_summary, weather, plan, profile, goal_mi=None
 
         # Flag today's runs explicitly
         today_str = now.strftime("%Y-%m-%d")
-        today_acts = [a for a in this_week_acts if a.get("start_date_local", "")[:10] == today_str]
+        today_acts = [a for a in this_week_acts if a.start_date_local[:10] == today_str]
         if today_acts:
-            today_mi = sum(float(a.get("distance", "0").replace(" mi", "")) for a in today_acts)
-            parts.append(f"RAN TODAY: Yes — {round(today_mi, 1)} mi already logged today. Today's running is DONE. Do not suggest more running today.")
+            today_mi = meters_to_miles(sum(a.distance or 0 for a in today_acts))
+            parts.append(f"RAN TODAY: Yes — {today_mi} mi already logged today. Today's running is DONE. Do not suggest more running today.")
         else:
             parts.append("RAN TODAY: No — no run logged yet today.")
 
         if this_week_acts:
             runs_desc = "; ".join(
-                f"{a.get('title', 'Run')} ({a.get('distance', '?')}, {a.get('pace', '?')})"
+                f"{a.name or 'Run'} ({format_distance(a.distance)}, {format_pace(a.average_speed)})"
                 for a in this_week_acts[:5]
             )
             parts.append(f"This week's runs: {runs_desc}")
@@ -221,7 +236,7 @@ def build_context(activities, week_summary, weather, plan, profile, goal_mi=None
 
         if prev_acts:
             a = prev_acts[0]
-            sdl = a.get("start_date_local", "")
+            sdl = a.start_date_local or ""
             date_label = ""
             if sdl:
                 try:
@@ -229,9 +244,9 @@ def build_context(activities, week_summary, weather, plan, profile, goal_mi=None
                 except ValueError:
                     pass
             parts.append(
-                f"Most recent previous-week run: {a.get('title', 'Run')} — "
-                f"{a.get('distance', '?')} in {a.get('time', '?')} "
-                f"at {a.get('pace', '?')} pace{date_label}"
+                f"Most recent previous-week run: {a.name or 'Run'} — "
+                f"{format_distance(a.distance)} in {format_duration(a.moving_time)} "
+                f"at {format_pace(a.average_speed)} pace{date_label}"
             )
 
     # Weather summary — split into today (dayOffset=0) and tomorrow (dayOffset=1)
@@ -271,10 +286,55 @@ def build_context(activities, week_summary, weather, plan, profile, goal_mi=None
     return "\n".join(parts)
 
 
-def get_coaching_message(activities, week_summary, weather, plan, profile, goal_mi=None):
+def call_claude(user_msg):
+    """
+    One Messages API call with the coaching system prompt.
+    Returns (text, usage); raises on HTTP errors or an empty reply.
+    """
+    resp = http_client.post(
+        http_client.ANTHROPIC,
+        f"{ANTHROPIC_API_URL}/v1/messages",
+        headers={
+            "x-api-key": ANTHROPIC_API_KEY,
+            "anthropic-version": ANTHROPIC_VERSION,
+            "content-type": "application/json",
+        },
+        json={
+            "model": CLAUDE_MODEL,
+            "max_tokens": MAX_TOKENS,
+            "temperature": TEMPERATURE,
+            "system": SYSTEM_PROMPT,
+            "messages": [{"role": "user", "content": user_msg}],
+        },
+        timeout=15,
+    )
+    resp.raise_for_status()
+    data = resp.json()
+
+    message = ""
+    for block in data.get("content", []):
+        if block.get("type") == "text":
+            message += block["text"]
+
+    if not message:
+        raise Exception("Empty response from Claude")
+    return message, data.get("usage") or {}
+
+
+def usage_report(usage):
+    """Token counts from a response's `usage`: input and output."""
+    usage = usage or {}
+    return {
+        "input": usage.get("input_tokens", 0),
+        "output": usage.get("output_tokens", 0),
+    }
+
+
+def get_coaching_message(activities, week_summary, weather, plan, profile, goal_mi=None, load=None):
     """
     Get or generate a coaching message.
-    Returns dict: { "message": str, "mode": str }
+    Returns dict: { "message": str, "mode": str }, plus "usage" (see usage_report)
+    when the message was freshly generated.
     """
     if not ANTHROPIC_API_KEY:
         return {
@@ -286,40 +346,18 @@ def get_coaching_message(activities, week_summary, weather, plan, profile, goal_
     cache = _load_cache()
 
     # Check cache validity
-    if _is_cache_valid(cache, mode, activities):
+    valid = _is_cache_valid(cache, mode, activities)
+    metrics.cache_lookup("assistant", valid)
+    tracing.event("cache", cache="assistant", key=mode, outcome="hit" if valid else "miss")
+    if valid:
         return {"message": cache["message"], "mode": cache["mode"]}
 
     # Build context and call Claude
-    context = build_context(activities, week_summary, weather, plan, profile, goal_mi=goal_mi)
+    context = build_context(activities, week_summary, weather, plan, profile, goal_mi=goal_mi, load=load)
     user_msg = f"Mode: {mode}\n\nContext:\n{context}"
 
     try:
-        resp = requests.post(
-            "https://api.anthropic.com/v1/messages",
-            headers={
-                "x-api-key": ANTHROPIC_API_KEY,
-                "anthropic-version": "2023-06-01",
-                "content-type": "application/json",
-            },
-            json={
-                "model": CLAUDE_MODEL,
-                "max_tokens": MAX_TOKENS,
-                "temperature": TEMPERATURE,
-                "system": SYSTEM_PROMPT,
-                "messages": [{"role": "user", "content": user_msg}],
-            },
-            timeout=15,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-
-        message = ""
-        for block in data.get("content", []):
-            if block.get("type") == "text":
-                message += block["text"]
-
-        if not message:
-            raise Exception("Empty response from Claude")
+        message, usage = call_claude(user_msg)
 
         # Cache the result
         cache_data = {
@@ -329,12 +367,13 @@ def get_coaching_message(activities, week_summary, weather, plan, profile, goal_
         }
         _save_cache(cache_data)
 
-        return {"message": message, "mode": mode}
+        return {"message": message, "mode": mode, "usage": usage_report(usage)}
 
     except Exception as e:
         print(f"Assistant API error: {e}")
         # Return a fallback if cache exists (even if expired)
         if cache and "message" in cache:
+            deadlines.mark_partial()
             return {"message": cache["message"], "mode": cache.get("mode", mode)}
         return {
             "message": "Unable to generate coaching insight right now. Check back soon.",
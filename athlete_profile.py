@@ -0,0 +1,261 @@
+"""
+Athlete profile, shoe mileage and YTD totals — derived locally.
+Identity (name, avatar, shoe list, Strava's shoe/YTD distances) is fetched at
+most once a day and used as a baseline; activities synced after that snapshot
+are added from the local store, indexed by gear id. Shoe retirement
+projections use a precomputed miles-per-week rate per gear.
+"""
+
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import activity_store
+import deadlines
+import strava_client
+import tenancy
+from config import DEFAULT_SHOE_MAX_MILES
+from units import meters_to_miles
+
+ATHLETE_FILE = "athlete.json"
+GEAR_FILE = "gear_index.json"
+IDENTITY_TTL = 86400     # refresh /athlete + stats once a day
+RATE_WINDOW_DAYS = 28    # miles/week rate for retirement projections
+
+_identities = {}  # tenancy key -> (file mtime, identity snapshot)
+# since:  identity fetched_at — baseline cut-off
+# acts:   str(activity_id) -> [gear_id, meters, year, is_run]  (activities after baseline)
+# gear:   gear_id -> meters since baseline
+# ytd:    {year: run meters since baseline}
+# rates:  gear_id -> meters per week over the last RATE_WINDOW_DAYS
+_indexes = {}  # tenancy key -> (file mtime, index)
+
+
+# ---------------------------------------------------------------------------
+# Identity snapshot (daily)
+# ---------------------------------------------------------------------------
+def _fetch_identity():
+    athlete = strava_client._api_get("/athlete")
+    stats = strava_client._api_get(f"/athletes/{athlete['id']}/stats")
+    return {
+        "fetched_at": time.time(),
+        "name": f"{athlete.get('firstname', '')} {athlete.get('lastname', '')}".strip(),
+        "city": athlete.get("city", ""),
+        "state": athlete.get("state", ""),
+        "avatar": athlete.get("profile_medium", ""),
+        "measurement_preference": athlete.get("measurement_preference", "feet"),
+        "shoes": [
+            {"id": s["id"], "name": s["name"], "meters": s.get("distance", 0)}
+            for s in athlete.get("shoes", [])
+        ],
+        "ytd_year": date.today().year,
+        "ytd_meters": (stats.get("ytd_run_totals") or {}).get("distance", 0),
+    }
+
+
+def _load_identity():
+    """The current athlete's snapshot (None before the first fetch), re-read if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(ATHLETE_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _identities.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        snapshot = None
+        if mtime is not None:
+            with open(path, "r") as f:
+                snapshot = json.load(f)
+        _identities[key] = cached = (mtime, snapshot)
+    return cached[1]
+
+
+def get_identity(force=False):
+    """Daily identity snapshot. Falls back to a stale one if Strava is unreachable."""
+    snapshot = _load_identity()
+
+    fresh = snapshot and time.time() - snapshot.get("fetched_at", 0) < IDENTITY_TTL
+    if fresh and not force:
+        return snapshot
+
+    try:
+        identity = _fetch_identity()
+    except Exception as e:
+        if snapshot:
+            print(f"Athlete refresh failed, using snapshot: {e}")
+            deadlines.mark_partial()
+            return snapshot
+        raise
+
+    path = tenancy.path(ATHLETE_FILE)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(identity, f, indent=2)
+    os.replace(tmp, path)
+    _identities[tenancy.key()] = (os.stat(path).st_mtime, identity)
+    _reset_index(identity["fetched_at"])
+    return identity
+
+
+def reset():
+    """Forget the current athlete's snapshot and index (connected or disconnected)."""
+    _identities.pop(tenancy.key(), None)
+    _indexes.pop(tenancy.key(), None)
+    for path in (tenancy.path(ATHLETE_FILE), tenancy.path(GEAR_FILE)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# ---------------------------------------------------------------------------
+# Gear index (incremental)
+# ---------------------------------------------------------------------------
+def _load_index():
+    """The current athlete's gear index — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(GEAR_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _indexes.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        index = {"since": 0, "acts": {}, "gear": {}, "ytd": {}, "rates": {}}
+        if mtime is not None:
+            with open(path, "r") as f:
+                index = json.load(f)
+        _indexes[key] = cached = (mtime, index)
+    return cached[1]
+
+
+def _save_index(index=None):
+    path = tenancy.path(GEAR_FILE)
+    index = _load_index() if index is None else index
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+    _indexes[tenancy.key()] = (os.stat(path).st_mtime, index)
+
+
+def _reset_index(since):
+    _save_index({"since": since, "acts": {}, "gear": {}, "ytd": {}, "rates": {}})
+    update()
+
+
+def _contribution(a, since):
+    if not a or activity_store.start_ts(a) <= since:
+        return None
+    year = (a.get("start_date_local") or "")[:4]
+    return [a.get("gear_id"), a.get("distance", 0) or 0, year, activity_store.is_run(a)]
+
+
+def _apply(index, entry, sign):
+    gear_id, meters, year, is_run = entry
+    if gear_id:
+        index["gear"][gear_id] = index["gear"].get(gear_id, 0) + sign * meters
+    if is_run and year:
+        index["ytd"][year] = index["ytd"].get(year, 0) + sign * meters
+
+
+def _compute_rates():
+    """Meters per week per gear over the last RATE_WINDOW_DAYS (all stored activities)."""
+    cutoff = time.time() - RATE_WINDOW_DAYS * 86400
+    totals = {}
+    for a in activity_store.all_activities():  # newest first
+        if activity_store.start_ts(a) < cutoff:
+            break
+        if a.get("gear_id"):
+            totals[a["gear_id"]] = totals.get(a["gear_id"], 0) + (a.get("distance") or 0)
+    weeks = RATE_WINDOW_DAYS / 7
+    return {g: round(m / weeks, 1) for g, m in totals.items()}
+
+
+def update(activity_ids=None):
+    """
+    Apply new/changed/deleted activities to the gear index.
+    With no ids, reconciles every stored activity after the baseline.
+    """
+    index = _load_index()
+    acts = index["acts"]
+    if activity_ids is None:
+        keys = {str(a["id"]) for a in activity_store.all_activities()
+                if activity_store.start_ts(a) > index["since"]} | set(acts)
+    else:
+        keys = {str(i) for i in activity_ids}
+
+    changed = False
+    for key in keys:
+        new = _contribution(activity_store.get(key), index["since"])
+        old = acts.get(key)
+        if old == new:
+            continue
+        if old:
+            _apply(index, old, -1)
+        if new:
+            _apply(index, new, 1)
+            acts[key] = new
+        else:
+            acts.pop(key, None)
+        changed = True
+
+    rates = _compute_rates()
+    if changed or rates != index["rates"]:
+        index["rates"] = rates
+        _save_index()
+
+
+# ---------------------------------------------------------------------------
+# Profile
+# ---------------------------------------------------------------------------
+def _retire_date(miles, max_miles, meters_per_week):
+    """Projected date the shoe hits max_miles at its current weekly rate."""
+    miles_per_week = meters_to_miles(meters_per_week or 0)
+    if not miles_per_week or miles >= max_miles:
+        return None
+    weeks = (max_miles - miles) / miles_per_week
+    return (date.today() + timedelta(weeks=weeks)).isoformat()
+
+
+def get_profile(shoe_maxes=None):
+    """
+    Athlete profile + shoes + YTD stats (wireframe Profile card + ALL_SHOES shape).
+    `shoe_maxes` maps gear id → max miles (user setting).
+    """
+    identity = get_identity()
+    index = _load_index()
+
+    shoe_maxes = shoe_maxes if isinstance(shoe_maxes, dict) else {}
+    shoes = []
+    for s in identity["shoes"]:
+        meters = s["meters"] + index["gear"].get(s["id"], 0)
+        miles = meters_to_miles(meters)
+        max_miles = shoe_maxes.get(s["id"], DEFAULT_SHOE_MAX_MILES)
+        rate = index["rates"].get(s["id"], 0)
+        shoes.append({
+            "id": s["id"],
+            "name": s["name"],
+            "miles": miles,
+            "max": max_miles,
+            "milesPerWeek": meters_to_miles(rate),
+            "retireDate": _retire_date(miles, max_miles, rate),
+        })
+    # Sort by miles descending (most used first)
+    shoes.sort(key=lambda x: x["miles"], reverse=True)
+
+    year = str(date.today().year)
+    baseline = identity["ytd_meters"] if str(identity.get("ytd_year")) == year else 0
+    ytd_miles = meters_to_miles(baseline + index["ytd"].get(year, 0))
+
+    return {
+        "name": identity["name"],
+        "city": identity["city"],
+        "state": identity["state"],
+        "avatar": identity["avatar"],
+        "ytd_miles": ytd_miles,
+        "shoes": shoes,
+        "measurement_preference": identity["measurement_preference"],
+    }
+
+
+def get_units():
+    """Athlete's measurement_preference ("feet" or "meters") — defaults to feet."""
+    try:
+        return get_identity().get("measurement_preference") or "feet"
+    except Exception:
+        return "feet"
@@ -0,0 +1,225 @@
+"""
+Offline benchmark: drives the Flask app against local upstream stand-ins.
+
+    python -m benchmarks [--requests 20] [--latency-ms 40] [--rate-limit 100]
+
+Runs each route in three scenarios — cold (empty caches), warm (repeat) and
+expired (every cache entry aged past its TTL) — and reports p50/p95/p99
+latency, upstream calls per request and cache hit ratio per route.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks import stubs
+
+DEFAULT_ROUTES = ["/api/activities", "/api/weeks", "/api/profile", "/api/weather", "/api/assistant"]
+UPSTREAMS = ["strava", "openweather", "nominatim", "anthropic"]
+EXPIRE_BY = 7 * 86400   # seconds every cached timestamp is pushed into the past
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+def _configure_env(servers):
+    """Point every upstream at its stand-in — must run before the app is imported."""
+    os.environ.update({
+        "STRAVA_API_BASE": servers["strava"].url + "/api/v3",
+        "STRAVA_TOKEN_URL": servers["strava"].url + "/oauth/token",
+        "OPENWEATHER_API_BASE": servers["openweather"].url,
+        "NOMINATIM_URL": servers["nominatim"].url,
+        "ANTHROPIC_API_URL": servers["anthropic"].url,
+        "STRAVA_CLIENT_ID": "bench",
+        "STRAVA_CLIENT_SECRET": "bench",
+        "OPENWEATHER_API_KEY": "bench",
+        "ANTHROPIC_API_KEY": "bench",
+        "APP_MODE": "development",
+    })
+
+
+class CacheCounter:
+    """Wraps each module's cache lookup and tallies hits/misses."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self):
+        self.hits = self.misses = 0
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def install(self, strava_client, weather_client, assistant_client):
+        def wrap_pair(fn):
+            def wrapper(*args, **kwargs):
+                result = fn(*args, **kwargs)
+                self._record(result[0])
+                return result
+            return wrapper
+
+        def wrap_bool(fn):
+            def wrapper(*args, **kwargs):
+                result = fn(*args, **kwargs)
+                self._record(result)
+                return result
+            return wrapper
+
+        strava_client.cached = wrap_pair(strava_client.cached)
+        weather_client._cached = wrap_pair(weather_client._cached)
+        assistant_client._is_cache_valid = wrap_bool(assistant_client._is_cache_valid)
+
+
+def _expire_caches(strava_client, weather_client, assistant_client, athlete_profile):
+    """Age every cached entry so the next request sees them as expired."""
+    for cache in (strava_client._cache, weather_client._cache):
+        for entry in cache.values():
+            entry["ts"] -= EXPIRE_BY
+    for _, identity in athlete_profile._identities.values():
+        if identity:
+            identity["fetched_at"] -= EXPIRE_BY
+    if os.path.exists(assistant_client.CACHE_FILE):
+        with open(assistant_client.CACHE_FILE, "r") as f:
+            data = json.load(f)
+        if "timestamp" in data:
+            data["timestamp"] -= EXPIRE_BY
+        with open(assistant_client.CACHE_FILE, "w") as f:
+            json.dump(data, f)
+
+
+def _measure(client, route, servers, counter, http_client, n):
+    """Issue `n` requests to `route`; upstream calls and cache lookups are counted from zero."""
+    for server in servers.values():
+        server.reset_counts()
+    http_client.call_counts.clear()
+    counter.reset()
+    timings = []
+    errors = 0
+    for _ in range(n):
+        start = time.perf_counter()
+        resp = client.get(route)
+        timings.append((time.perf_counter() - start) * 1000)
+        if resp.status_code >= 400:
+            errors += 1
+    lookups = counter.hits + counter.misses
+    return {
+        "route": route,
+        "requests": n,
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "upstream_calls": {u: servers[u].calls for u in UPSTREAMS},
+        "throttled": sum(s.throttled for s in servers.values()),
+        "cache_hit_ratio": round(counter.hits / lookups, 3) if lookups else None,
+        "errors": errors,
+    }
+
+
+def run(routes, n, latency_ms, jitter_ms, rate_limit):
+    servers = stubs.start_all(latency_ms=latency_ms, jitter_ms=jitter_ms, strava_rate_limit=rate_limit)
+    _configure_env(servers)
+
+    workdir = tempfile.mkdtemp(prefix="bench-")
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, repo)
+    os.chdir(workdir)
+    with open("tokens.json", "w") as f:
+        json.dump({"access_token": "stub-access", "refresh_token": "stub-refresh",
+                   "expires_at": int(time.time()) + 10 * 365 * 86400}, f)
+
+    # Imported here so config picks up the stand-in URLs
+    import app as app_module
+    import assistant_client
+    import athlete_profile
+    import http_client
+    import strava_client
+    import weather_client
+
+    app_module.app.root_path = repo
+    counter = CacheCounter()
+    counter.install(strava_client, weather_client, assistant_client)
+    client = app_module.app.test_client()
+
+    results = {"cold": [], "warm": [], "expired": []}
+    try:
+        for route in routes:
+            # Cold: the very first request of each route, after the previous one primed shared state
+            results["cold"].append(_measure(client, route, servers, counter, http_client, 1))
+            results["warm"].append(_measure(client, route, servers, counter, http_client, n))
+        for route in routes:
+            samples = []
+            for _ in range(n):
+                _expire_caches(strava_client, weather_client, assistant_client, athlete_profile)
+                samples.append(_measure(client, route, servers, counter, http_client, 1))
+            results["expired"].append(_merge(samples))
+    finally:
+        for server in servers.values():
+            server.stop()
+    return results
+
+
+def _merge(samples):
+    """Combine single-request measurements into one row (percentiles over all)."""
+    timings = [s["p50_ms"] for s in samples]
+    calls = {u: sum(s["upstream_calls"][u] for s in samples) for u in UPSTREAMS}
+    ratios = [s["cache_hit_ratio"] for s in samples if s["cache_hit_ratio"] is not None]
+    return {
+        "route": samples[0]["route"],
+        "requests": len(samples),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "upstream_calls": calls,
+        "throttled": sum(s["throttled"] for s in samples),
+        "cache_hit_ratio": round(sum(ratios) / len(ratios), 3) if ratios else None,
+        "errors": sum(s["errors"] for s in samples),
+    }
+
+
+def print_report(results):
+    header = f"{'route':<18}{'n':>4}{'p50':>9}{'p95':>9}{'p99':>9}  {'strava':>6}{'owm':>5}{'geo':>5}{'llm':>5}{'429':>5}{'hit%':>7}{'err':>5}"
+    for scenario, rows in results.items():
+        print(f"\n== {scenario} ==")
+        print(header)
+        for r in rows:
+            c = r["upstream_calls"]
+            hit = f"{r['cache_hit_ratio'] * 100:.0f}" if r["cache_hit_ratio"] is not None else "-"
+            print(
+                f"{r['route']:<18}{r['requests']:>4}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}  "
+                f"{c['strava']:>6}{c['openweather']:>5}{c['nominatim']:>5}{c['anthropic']:>5}"
+                f"{r['throttled']:>5}{hit:>7}{r['errors']:>5}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard API against local upstream stand-ins.")
+    parser.add_argument("--requests", type=int, default=20, help="requests per route for warm/expired runs")
+    parser.add_argument("--latency-ms", type=float, default=40, help="injected upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="± random latency jitter")
+    parser.add_argument("--rate-limit", type=int, default=None, help="Strava requests per 15 min before 429s")
+    parser.add_argument("--routes", nargs="+", default=DEFAULT_ROUTES)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args.routes, args.requests, args.latency_ms, args.jitter_ms, args.rate_limit)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+Local stand-ins for Strava, OpenWeather, Nominatim and Anthropic.
+Each is a threaded HTTP server returning deterministic, realistic-shaped JSON,
+with configurable injected latency and a fixed-window rate limit (429s).
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Short real-looking polyline (Concord loop) reused for every activity
+POLYLINE = "sdvfFv~lgVq@dA}@jAWd@mAjBaKhO{@tACHa@ZSXkC`EkAzAs@lAaArA[j@_BbC}B~CcAfBGVsAjBs@fAc@bAM\\ORSl@WbAEZiBbJ"
+
+
+class StubServer:
+    """
+    Threaded HTTP server around a route function: route(method, path, query, body) → (status, json).
+    latency_ms: added to every response (± jitter_ms).
+    rate_limit: max requests per `rate_window` seconds before returning 429 (None = unlimited).
+    """
+
+    def __init__(self, name, route, latency_ms=0, jitter_ms=0, rate_limit=None, rate_window=900):
+        self.name = name
+        self.route = route
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.calls = 0
+        self.throttled = 0
+        self._window_start = time.time()
+        self._window_calls = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(name)
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                status, payload = stub._dispatch(method, self.path, body)
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (deadline) before the injected latency elapsed
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls = 0
+            self.throttled = 0
+
+    def _dispatch(self, method, raw_path, body):
+        with self._lock:
+            self.calls += 1
+            now = time.time()
+            if now - self._window_start >= self.rate_window:
+                self._window_start = now
+                self._window_calls = 0
+            self._window_calls += 1
+            limited = self.rate_limit is not None and self._window_calls > self.rate_limit
+            if limited:
+                self.throttled += 1
+            delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if limited:
+            return 429, {"message": "Rate Limit Exceeded"}
+
+        parsed = urlparse(raw_path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        try:
+            payload = json.loads(body) if body and body[:1] in (b"{", b"[") else {}
+        except ValueError:
+            payload = {}
+        return self.route(method, parsed.path, query, payload)
+
+
+# ---------------------------------------------------------------------------
+# Strava
+# ---------------------------------------------------------------------------
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class FakeStrava:
+    """One run a day (plus a ride every 5th day) going back `days`."""
+
+    def __init__(self, days=120):
+        now = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        rng = random.Random(7)
+        self.activities = []
+        for d in range(days):
+            start = (now - timedelta(days=d)).replace(hour=14)
+            if start > now:
+                start -= timedelta(days=1)
+            is_ride = d % 5 == 4
+            distance = rng.uniform(20000, 40000) if is_ride else rng.uniform(5000, 21000)
+            speed = rng.uniform(6, 8) if is_ride else rng.uniform(2.9, 3.6)
+            self.activities.append({
+                "id": 10_000_000 + (days - d),
+                "name": "Afternoon Ride" if is_ride else "Morning Run",
+                "type": "Ride" if is_ride else "Run",
+                "sport_type": "Ride" if is_ride else "Run",
+                "workout_type": 2 if distance > 16000 and not is_ride else 0,
+                "start_date": _iso(start),
+                "start_date_local": _iso(start - timedelta(hours=7)),
+                "distance": round(distance, 1),
+                "moving_time": int(distance / speed),
+                "elapsed_time": int(distance / speed) + 60,
+                "total_elevation_gain": round(rng.uniform(20, 300), 1),
+                "average_speed": round(speed, 3),
+                "has_heartrate": True,
+                "average_heartrate": round(rng.uniform(135, 165), 1),
+                "max_heartrate": round(rng.uniform(170, 185), 1),
+                "suffer_score": rng.randint(20, 150),
+                "gear_id": "g1" if d % 2 else "g2",
+                "start_latlng": [37.978 + rng.uniform(-0.01, 0.01), -122.031 + rng.uniform(-0.01, 0.01)],
+                "map": {"summary_polyline": POLYLINE},
+            })
+        self._by_id = {a["id"]: a for a in self.activities}
+
+    def _list(self, query):
+        after = float(query.get("after", 0))
+        before = float(query.get("before", 1e12))
+        per_page = int(query.get("per_page", 30))
+        page = int(query.get("page", 1))
+        rows = [
+            a for a in self.activities
+            if after < datetime.fromisoformat(a["start_date"].replace("Z", "+00:00")).timestamp() < before
+        ]
+        if "after" in query and "before" not in query:
+            rows = rows[::-1]  # like Strava: after= alone lists oldest first
+        return rows[(page - 1) * per_page:page * per_page]
+
+    def _detail(self, a):
+        detail = dict(a)
+        mile_speed = a["average_speed"]
+        full = int(a["distance"] // 1609.34)
+        detail["splits_standard"] = [
+            {"split": i + 1, "distance": 1609.3, "moving_time": int(1609.3 / mile_speed),
+             "average_speed": mile_speed, "elevation_difference": (-1) ** i * 3.2}
+            for i in range(full)
+        ]
+        detail["splits_metric"] = [
+            {"split": i + 1, "distance": 1000.0, "moving_time": int(1000 / mile_speed),
+             "average_speed": mile_speed, "elevation_difference": (-1) ** i * 2.1}
+            for i in range(int(a["distance"] // 1000))
+        ]
+        detail.update({
+            "description": None, "device_name": "Garmin Forerunner 965",
+            "calories": int(a["distance"] / 16), "average_cadence": 86.0,
+            "gear": {"id": a["gear_id"], "name": "Stub Shoe " + a["gear_id"]},
+        })
+        return detail
+
+    def _streams(self, a):
+        n = int(a["moving_time"])
+        speed = a["average_speed"]
+        lat0, lng0 = a["start_latlng"]
+        return {
+            "time": {"data": list(range(n))},
+            "distance": {"data": [round(i * speed * (1 + 0.05 * math.sin(i / 60)), 1) for i in range(n)]},
+            "altitude": {"data": [round(50 + 10 * math.sin(i / 300), 1) for i in range(n)]},
+            "heartrate": {"data": [int(140 + 20 * math.sin(i / 400)) for i in range(n)]},
+            "cadence": {"data": [86] * n},
+            "latlng": {"data": [[lat0 + 0.0001 * math.sin(i / 200), lng0 + 0.0001 * i / 10] for i in range(n)]},
+        }
+
+    def route(self, method, path, query, body):
+        if path.endswith("/oauth/token"):
+            return 200, {
+                "access_token": "stub-access", "refresh_token": "stub-refresh",
+                "expires_at": int(time.time()) + 6 * 3600,
+                "athlete": {"id": 1, "firstname": "Stub", "lastname": "Runner"},
+            }
+        if path.endswith("/athlete"):
+            return 200, {
+                "id": 1, "firstname": "Stub", "lastname": "Runner", "city": "Concord", "state": "CA",
+                "profile_medium": "", "measurement_preference": "feet",
+                "shoes": [{"id": "g1", "name": "Stub Shoe g1", "distance": 412000.0},
+                          {"id": "g2", "name": "Stub Shoe g2", "distance": 95000.0}],
+            }
+        if "/athletes/" in path and path.endswith("/stats"):
+            return 200, {"ytd_run_totals": {"distance": 1_250_000.0, "count": 150}}
+        if path.endswith("/athlete/activities"):
+            return 200, self._list(query)
+        parts = path.rstrip("/").split("/")
+        if "activities" in parts:
+            idx = parts.index("activities")
+            try:
+                a = self._by_id[int(parts[idx + 1])]
+            except (IndexError, ValueError, KeyError):
+                return 404, {"message": "Record Not Found"}
+            if parts[-1] == "streams":
+                return 200, self._streams(a)
+            return 200, self._detail(a)
+        return 404, {"message": "Not Found"}
+
+
+# ---------------------------------------------------------------------------
+# OpenWeather / Nominatim / Anthropic
+# ---------------------------------------------------------------------------
+def openweather_route(method, path, query, body):
+    if not path.endswith("/onecall") and not path.endswith("/onecall/timemachine"):
+        return 404, {"message": "Not Found"}
+    start = int(time.time()) // 3600 * 3600
+    if path.endswith("/timemachine"):
+        dt = int(query.get("dt", start))
+        return 200, {"lat": float(query.get("lat", 0)), "lon": float(query.get("lon", 0)),
+                     "data": [_weather_hour(dt - dt % 3600, dt // 3600 % 24)]}
+    return 200, {"timezone": "America/Los_Angeles", "timezone_offset": -25200,
+                 "hourly": [_weather_hour(start + h * 3600, h) for h in range(48)]}
+
+
+def _weather_hour(ts, h):
+    return {
+        "dt": ts, "temp": round(55 + 10 * math.sin(h / 4), 1), "feels_like": 54.0,
+        "humidity": 60, "pop": round(max(0, math.sin(h / 6)) * 0.6, 2),
+        "wind_speed": round(4 + 3 * abs(math.sin(h / 5)), 1), "wind_deg": 270,
+        "weather": [{"main": "Clouds" if h % 3 else "Clear", "description": "scattered clouds"}],
+    }
+
+
+def nominatim_route(method, path, query, body):
+    if not path.endswith("/reverse"):
+        return 404, {"error": "Not Found"}
+    return 200, {"address": {"city": "Concord", "state": "California"}}
+
+
+def anthropic_route(method, path, query, body):
+    if not path.endswith("/v1/messages"):
+        return 404, {"type": "error"}
+    return 200, {
+        "content": [{"type": "text", "text": "Cool and dry this morning.\n- Easy 6 before the wind picks up."}],
+        "usage": {"input_tokens": 900, "output_tokens": 40,
+                  "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0},
+    }
+
+
+def start_all(latency_ms=0, jitter_ms=0, strava_rate_limit=None, days=120):
+    """Start every stand-in. Returns {name: StubServer}."""
+    strava = FakeStrava(days=days)
+    servers = {
+        "strava": StubServer("strava", strava.route, latency_ms, jitter_ms, rate_limit=strava_rate_limit),
+        "openweather": StubServer("openweather", openweather_route, latency_ms, jitter_ms),
+        "nominatim": StubServer("nominatim", nominatim_route, latency_ms, jitter_ms),
+        "anthropic": StubServer("anthropic", anthropic_route, latency_ms * 4, jitter_ms),
+    }
+    for server in servers.values():
+        server.start()
+    return servers
@@ -0,0 +1,132 @@
+"""
+Circuit breakers and last-known-good responses for upstream calls.
+A breaker trips after FAILURE_THRESHOLD consecutive failures (errors, 5xx,
+429, or calls slower than its slow_after), stays open for a cooldown, then lets
+a single probe through (half-open). While open, http_client answers GETs from
+the last successful response for the same request, persisted in LKG_DIR.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+import metrics
+
+FAILURE_THRESHOLD = 5      # consecutive failures before tripping
+OPEN_SECONDS = 30          # first cooldown; doubles on each failed probe
+MAX_OPEN_SECONDS = 300
+
+LKG_DIR = "last_known_good"
+LKG_MAX_BYTES = 512 * 1024  # don't persist huge bodies (streams)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class Breaker:
+    """Per-upstream breaker. State is per process."""
+
+    def __init__(self, name, slow_after):
+        self.name = name
+        self.slow_after = slow_after
+        self.state = CLOSED
+        self.failures = 0
+        self.cooldown = OPEN_SECONDS
+        self.open_until = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        if state != self.state:
+            self.state = state
+            metrics.inc("circuit_breaker_transitions_total", upstream=self.name, state=state)
+
+    def allow(self):
+        """True if a call may go out now (closed, or this caller is the half-open probe)."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.time() >= self.open_until and not self.probing:
+                self._set_state(HALF_OPEN)
+                self.probing = True
+                return True
+            return False
+
+    def success(self, elapsed):
+        if elapsed > self.slow_after:
+            self.failure()
+            return
+        with self._lock:
+            self.failures = 0
+            self.cooldown = OPEN_SECONDS
+            self.probing = False
+            self._set_state(CLOSED)
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, MAX_OPEN_SECONDS)
+            elif self.failures < FAILURE_THRESHOLD:
+                return
+            self.probing = False
+            self.open_until = time.time() + self.cooldown
+            self._set_state(OPEN)
+
+    def release(self):
+        """
+        The call ended without telling us anything (caller's deadline) — free the
+        probe slot. An aborted half-open probe reopens the breaker already due, so
+        the next call probes again instead of finding it half-open with no probe.
+        """
+        with self._lock:
+            self.probing = False
+            if self.state == HALF_OPEN:
+                self.open_until = time.time()
+                self._set_state(OPEN)
+
+    def snapshot(self):
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "retryIn": max(0, round(self.open_until - time.time())) if self.state == OPEN else 0,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Last-known-good store
+# ---------------------------------------------------------------------------
+def _lkg_path(key):
+    return os.path.join(LKG_DIR, hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def save_lkg(key, status, content):
+    """Persist a successful JSON response body for `key`."""
+    if len(content) > LKG_MAX_BYTES:
+        return
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return
+    os.makedirs(LKG_DIR, exist_ok=True)
+    path = _lkg_path(key)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"key": key, "status": status, "body": body, "saved_at": time.time()}, f)
+    os.replace(tmp, path)
+
+
+def load_lkg(key):
+    """(status, body, age_seconds) for `key`, or None."""
+    path = _lkg_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            entry = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        return None
+    return entry["status"], entry["body"], time.time() - entry["saved_at"]
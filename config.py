@@ -10,22 +10,64 @@ REDIRECT_URI = os.getenv("REDIRECT_URI", "http://localhost:5000/auth/callback")
 FLASK_SECRET_KEY = os.getenv("FLASK_SECRET_KEY", "dev-secret-change-me")
 
 STRAVA_AUTH_URL = "https://www.strava.com/oauth/authorize"
-STRAVA_TOKEN_URL = "https://www.strava.com/oauth/token"
-STRAVA_API_BASE = "https://www.strava.com/api/v3"
+STRAVA_TOKEN_URL = os.getenv("STRAVA_TOKEN_URL", "https://www.strava.com/oauth/token")
+STRAVA_API_BASE = os.getenv("STRAVA_API_BASE", "https://www.strava.com/api/v3")
 STRAVA_SCOPES = "read,activity:read_all,profile:read_all"
+# Push subscription (/api/webhooks/strava) — the token Strava echoes back when the subscription is created
+STRAVA_WEBHOOK_VERIFY_TOKEN = os.getenv("STRAVA_WEBHOOK_VERIFY_TOKEN")
 
 # OpenWeatherMap
 OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
+OPENWEATHER_API_BASE = os.getenv("OPENWEATHER_API_BASE", "https://api.openweathermap.org")
+# Historical lookups (weather at each activity's start) per UTC day, across all
+# athletes — One Call 3.0 includes 1000 free calls/day; forecasts use the rest
+WEATHER_HISTORY_DAILY_CALLS = int(os.getenv("WEATHER_HISTORY_DAILY_CALLS", "500"))
+
+# Nominatim reverse geocoding (free, no key)
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
 
 # Anthropic (Claude AI Assistant)
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
+ANTHROPIC_API_URL = os.getenv("ANTHROPIC_API_URL", "https://api.anthropic.com")
 
 # App mode: "personal", "demo", "development"
 APP_MODE = os.getenv("APP_MODE", "development")
 
+# Upstream snapshots — HTTP_RECORD=1 captures responses; APP_MODE=demo replays them
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "snapshots/demo.json")
+HTTP_RECORD = os.getenv("HTTP_RECORD") == "1"
+
 # Defaults
 DEFAULT_SHOE_MAX_MILES = 300
 DEFAULT_WEEKLY_GOAL = 50
+DEFAULT_MAX_HR = 190
+DEFAULT_REST_HR = 55
 CACHE_TTL_SECONDS = 300  # 5 minutes
+
+# Deadline budgets (seconds) — hard ceiling on route latency; None = no deadline
+UPSTREAM_TIMEOUT = 10
+DEFAULT_ROUTE_BUDGET = 8.0
+ROUTE_BUDGETS = {
+    "/api/activities": 6.0,
+    "/api/weeks": 5.0,
+    "/api/profile": 4.0,
+    "/api/weather": 3.0,
+    "/api/assistant": 10.0,
+    "/api/sync": None,
+    "/api/export": None,  # streams the whole history from the local store
+    "/api/webhooks/strava": 1.5,  # Strava retries events not acknowledged within 2s
+}
 ACTIVITIES_PER_PAGE = 30
 WEEKS_TO_FETCH = 4  # current + 3 past
+
+# Strava's rate limits apply to the whole application, shared by every athlete.
+# Background sync may use SYNC_RATE_SHARE of each 15-minute window; the rest is
+# kept for interactive requests.
+STRAVA_RATE_LIMIT_15MIN = int(os.getenv("STRAVA_RATE_LIMIT_15MIN", "100"))
+STRAVA_RATE_LIMIT_DAILY = int(os.getenv("STRAVA_RATE_LIMIT_DAILY", "1000"))
+SYNC_RATE_SHARE = float(os.getenv("SYNC_RATE_SHARE", "0.5"))
+
+# Background worker (worker.py). With BACKGROUND_WORKER=1 the web process never
+# calls an upstream: routes serve what the worker last published.
+BACKGROUND_WORKER = os.getenv("BACKGROUND_WORKER") == "1"
+WORKER_INTERVAL = int(os.getenv("WORKER_INTERVAL", "300"))  # seconds between full passes
@@ -0,0 +1,107 @@
+"""
+Per-request deadline budgets.
+A route's budget is set when the request starts; http_client caps every
+upstream timeout at the time left and fails fast once it's spent. Data
+functions fall back to stale cached values and mark the current response
+section partial, so a route returns what it has instead of hanging.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+import requests
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+_section = contextvars.ContextVar("section", default=None)
+_stale_age = contextvars.ContextVar("stale_age", default=None)
+
+
+class DeadlineExceeded(requests.Timeout):
+    """The request's budget ran out before (or during) an upstream call."""
+
+
+class Section:
+    __slots__ = ("partial",)
+
+    def __init__(self):
+        self.partial = False
+
+
+def start(seconds):
+    """Give the current request `seconds` from now."""
+    _deadline.set(time.monotonic() + seconds)
+
+
+def clear():
+    _deadline.set(None)
+    _section.set(None)
+    _stale_age.set(None)
+
+
+def remaining():
+    """Seconds left in the budget, or None if no deadline is set."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def cap_timeout(timeout):
+    """
+    Upstream timeout capped at the time left. Returns (timeout, capped).
+    Raises DeadlineExceeded if the budget is already spent.
+    """
+    left = remaining()
+    if left is None:
+        return timeout, False
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    if timeout is None or left < timeout:
+        return left, True
+    return timeout, False
+
+
+@contextmanager
+def section():
+    """Track whether anything inside fell back to stale or missing data."""
+    s = Section()
+    token = _section.set(s)
+    try:
+        yield s
+    finally:
+        _section.reset(token)
+        if s.partial:
+            mark_partial()  # a partial inner section makes the enclosing one partial
+
+
+def run_section(fn, default):
+    """
+    Run one section of a response under the route's deadline.
+    Returns (data, partial): partial if it fell back to stale data, or to
+    `default` because the budget ran out with nothing cached.
+    """
+    with section() as s:
+        try:
+            data = fn()
+        except DeadlineExceeded:
+            return default, True
+    return data, s.partial
+
+
+def mark_partial():
+    s = _section.get()
+    if s is not None:
+        s.partial = True
+
+
+def mark_stale(age):
+    """A last-known-good response `age` seconds old was used for this request."""
+    mark_partial()
+    current = _stale_age.get()
+    _stale_age.set(age if current is None else max(current, age))
+
+
+def stale_age():
+    """Oldest last-known-good age (seconds) used by this request, or None."""
+    return _stale_age.get()
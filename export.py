@@ -0,0 +1,137 @@
+"""
+Full-history export — the local activity store streamed as NDJSON or CSV.
+Rows are generated one activity at a time (newest first), so the response
+starts with the first row and memory stays flat however long the history.
+Values are raw SI units as stored; optional extras: run types, per-mile/km
+splits from the stored streams (no Strava calls), decoded routes and the
+weather at the start (weather_history.py — never fetched during an export).
+"""
+
+import csv
+import json
+
+import activity_store
+import stream_store
+import weather_history
+from geo_utils import decode_polyline
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "activities.ndjson"),
+    "csv": ("text/csv", "activities.csv"),
+}
+EXTRAS = ("run_types", "splits", "routes", "weather")
+SPLIT_METERS = {"feet": 1609.34, "meters": 1000.0}
+
+CSV_FIELDS = [f for f in activity_store.SUMMARY_FIELDS if f != "start_latlng"] + [
+    "start_lat", "start_lng", "polyline",
+]
+
+
+def parse_include(value):
+    """?include=splits,routes → set of extras. Raises ValueError on unknown names."""
+    include = {name.strip() for name in (value or "").split(",") if name.strip()}
+    unknown = include - set(EXTRAS)
+    if unknown:
+        raise ValueError(f"Unknown export extras: {', '.join(sorted(unknown))} (choose from {', '.join(EXTRAS)})")
+    return include
+
+
+# ---------------------------------------------------------------------------
+# Per-activity extras
+# ---------------------------------------------------------------------------
+def stream_splits(activity_id, split_meters):
+    """
+    Splits every `split_meters` from the activity's streams:
+    [{ split, distance, elapsed_time, elevation_difference }], the last one
+    partial. None if streams aren't ingested yet.
+    """
+    streams = stream_store.open_streams(activity_id)
+    if streams is None:
+        return None
+    with streams:
+        if "distance" not in streams or "time" not in streams:
+            return []
+        dist, time, alt = streams["distance"], streams["time"], streams.get("altitude")
+        splits = []
+        start_i, start_t = 0, time[0] if streams.count else 0
+        boundary = split_meters
+        for i in range(1, streams.count):
+            if dist[i] < boundary:
+                continue
+            # Interpolate when the boundary was crossed between samples i-1 and i
+            d0, d1 = dist[i - 1], dist[i]
+            t = time[i - 1] + (time[i] - time[i - 1]) * (boundary - d0) / (d1 - d0) if d1 > d0 else time[i]
+            splits.append(_split(len(splits) + 1, split_meters, t - start_t, alt, start_i, i))
+            start_i, start_t = i, t
+            boundary += split_meters
+        if streams.count and dist[-1] - (boundary - split_meters) >= 1:
+            splits.append(_split(len(splits) + 1, dist[-1] - (boundary - split_meters),
+                                 time[-1] - start_t, alt, start_i, streams.count - 1))
+        return splits
+
+
+def _split(number, meters, seconds, alt, i, j):
+    return {
+        "split": number,
+        "distance": round(meters, 1),
+        "elapsed_time": round(seconds, 1),
+        "elevation_difference": round(alt[j] - alt[i], 1) if alt is not None else None,
+    }
+
+
+def _route(a):
+    try:
+        return decode_polyline(a.get("polyline"))
+    except ValueError:
+        return None
+
+
+def _record(a, include, run_types, split_meters):
+    record = dict(a)
+    if "run_types" in include:
+        record["run_type"] = run_types.get(str(a["id"]))
+    if "splits" in include:
+        record["splits"] = stream_splits(a["id"], split_meters) if activity_store.is_run(a) else None
+    if "routes" in include:
+        record["route"] = _route(a)
+    if "weather" in include:
+        record["start_weather"] = weather_history.at_start(a["id"])
+    return record
+
+
+# ---------------------------------------------------------------------------
+# Streams
+# ---------------------------------------------------------------------------
+def ndjson(include=(), run_types=None, units="feet"):
+    """Yield one JSON line per stored activity, newest first."""
+    split_meters = SPLIT_METERS.get(units, SPLIT_METERS["feet"])
+    for a in activity_store.all_activities():
+        yield json.dumps(_record(a, include, run_types or {}, split_meters)) + "\n"
+
+
+class _Line:
+    """File-like target for csv.writer that hands back each row instead of buffering it."""
+
+    def write(self, line):
+        return line
+
+
+def csv_rows(include=(), run_types=None, units="feet"):
+    """
+    Yield the CSV header, then one row per stored activity, newest first.
+    Nested extras (splits, route) are JSON in their cell.
+    """
+    split_meters = SPLIT_METERS.get(units, SPLIT_METERS["feet"])
+    fields = CSV_FIELDS + [{"run_types": "run_type", "splits": "splits", "routes": "route", "weather": "start_weather"}[e]
+                           for e in EXTRAS if e in include]
+    writer = csv.writer(_Line())
+    yield writer.writerow(fields)
+    for a in activity_store.all_activities():
+        record = _record(a, include, run_types or {}, split_meters)
+        latlng = record.pop("start_latlng", None) or [None, None]
+        record["start_lat"], record["start_lng"] = latlng[0], latlng[1]
+        row = []
+        for field in fields:
+            value = record.get(field)
+            row.append(json.dumps(value) if isinstance(value, (list, dict)) else value)
+        yield writer.writerow(row)
@@ -0,0 +1,67 @@
+"""
+Geometry helpers shared by the backend — the Python side of the frontend's
+decodePolyline (static/app.jsx), plus encoding and distances for imported tracks.
+"""
+
+import math
+
+
+def decode_polyline(encoded):
+    """
+    Google Encoded Polyline → [[lat, lng], ...] (5-decimal precision, as
+    Strava sends). Raises ValueError if the string is cut short.
+    """
+    points = []
+    index = lat = lng = 0
+    length = len(encoded or "")
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                if index >= length:
+                    raise ValueError("Truncated polyline")
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append([lat / 1e5, lng / 1e5])
+    return points
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return "".join(chunks)
+
+
+def encode_polyline(points):
+    """[[lat, lng], ...] → Google Encoded Polyline (inverse of decode_polyline)."""
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat, lng = round(lat * 1e5), round(lng * 1e5)
+        out.append(_encode_value(lat - prev_lat))
+        out.append(_encode_value(lng - prev_lng))
+        prev_lat, prev_lng = lat, lng
+    return "".join(out)
+
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Great-circle distance in meters between two points in degrees."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lng2 - lng1)
+    h = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
@@ -0,0 +1,281 @@
+"""
+Personal route heatmap — every stored run's route rasterized into per-tile
+density grids (how many runs crossed each pixel) at zooms HEAT_ZOOMS, served
+as Web Mercator PNG tiles at /tiles/heat/{z}/{x}/{y}.png.
+Each run's route is remembered in an index, so a new, edited or deleted run
+adds or subtracts only its own pixels and rewrites only the tiles it touches;
+a tile's PNG is rendered on first request after its density changes and kept
+on disk. Colour follows a fixed log scale (no global maximum), so one busy
+street never invalidates the rest of the map. The browser fetches a handful
+of small images instead of decoding every polyline.
+"""
+
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import zlib
+from array import array
+
+import activity_store
+import tenancy
+from geo_utils import decode_polyline
+
+HEATMAP_DIR = "heatmap"           # <z>/<x>/<y>.density (+ .png once rendered)
+HEAT_INDEX_FILE = "heat_index.json"
+HEAT_ZOOMS = range(6, 17)         # below 6 a city is a dot; past 16 Leaflet upscales
+TILE_SIZE = 256
+SATURATE = 50                     # runs over a pixel for full colour
+FLUSH_PIXELS = 2_000_000          # pending pixel deltas before tiles are written (full rebuilds)
+
+# Orange (the route colour) through to pale yellow, opacity rising with density
+_LOW, _HIGH = (252, 76, 2), (255, 236, 140)
+_MIN_ALPHA, _MAX_ALPHA = 110, 255
+
+_index = {}  # tenancy key -> (file mtime, {activity id: polyline})
+
+
+# ---------------------------------------------------------------------------
+# Route index
+# ---------------------------------------------------------------------------
+def _load_index():
+    """The current athlete's route index — re-read if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(HEAT_INDEX_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _index.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        index = {}
+        if mtime is not None:
+            with open(path, "r") as f:
+                index = json.load(f)
+        _index[key] = cached = (mtime, index)
+    return cached[1]
+
+
+def _save_index():
+    path = tenancy.path(HEAT_INDEX_FILE)
+    index = _load_index()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+    _index[tenancy.key()] = (os.stat(path).st_mtime, index)
+
+
+def _route(a):
+    """The polyline a stored activity contributes, or None (not a run / no GPS)."""
+    if a is None or not activity_store.is_run(a):
+        return None
+    return a.get("polyline") or None
+
+
+# ---------------------------------------------------------------------------
+# Rasterization
+# ---------------------------------------------------------------------------
+def _world(lat, lng):
+    """Lat/lng → Web Mercator world coordinates in [0, 1)."""
+    lat = max(-85.05112878, min(85.05112878, lat))
+    s = math.sin(math.radians(lat))
+    return (lng + 180) / 360, 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def _pixels(world, zoom):
+    """Global pixel (x, y) pairs the route crosses at `zoom`, each once."""
+    scale = TILE_SIZE << zoom
+    limit = scale - 1
+    coords = [(min(limit, int(wx * scale)), min(limit, int(wy * scale))) for wx, wy in world]
+    pixels = set(coords[:1])
+    for (x0, y0), (x1, y1) in zip(coords, coords[1:]):
+        dx, dy = x1 - x0, y1 - y0
+        steps = max(abs(dx), abs(dy))
+        if steps <= 1:
+            pixels.add((x1, y1))
+            continue
+        half = steps // 2  # integer rounding of x0 + dx * i / steps
+        pixels.update(((x0 * steps + dx * i + half) // steps, (y0 * steps + dy * i + half) // steps)
+                      for i in range(1, steps + 1))
+    return pixels
+
+
+def _rasterize(polyline, sign, deltas):
+    """Add ±1 for each pixel of the route to deltas {(z, x, y): {offset: delta}}."""
+    try:
+        world = [_world(lat, lng) for lat, lng in decode_polyline(polyline)]
+    except ValueError:
+        return 0
+    count = 0
+    for z in HEAT_ZOOMS:
+        pixels = _pixels(world, z)
+        count += len(pixels)
+        for px, py in pixels:
+            tx, ox = divmod(px, TILE_SIZE)
+            ty, oy = divmod(py, TILE_SIZE)
+            tile = deltas.get((z, tx, ty))
+            if tile is None:
+                tile = deltas[(z, tx, ty)] = {}
+            offset = oy * TILE_SIZE + ox
+            tile[offset] = tile.get(offset, 0) + sign
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Density tiles
+# ---------------------------------------------------------------------------
+def _tile_path(z, x, y, suffix):
+    return os.path.join(tenancy.path(HEATMAP_DIR), str(z), str(x), f"{y}.{suffix}")
+
+
+def _read_density(path):
+    """A tile's counts as array('I') of TILE_SIZE² (row-major), or None."""
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        grid = array("I", zlib.decompress(f.read()))
+    if sys.byteorder == "big":
+        grid.byteswap()  # stored little-endian
+    return grid
+
+
+def _write_density(path, grid):
+    out = array("I", grid)
+    if sys.byteorder == "big":
+        out.byteswap()
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(zlib.compress(out.tobytes(), 6))
+    os.replace(tmp, path)
+
+
+def _flush(deltas):
+    """Apply pending deltas — one read/write per touched tile. Returns tiles written."""
+    written = 0
+    for (z, x, y), changes in deltas.items():
+        changes = {o: d for o, d in changes.items() if d}
+        if not changes:
+            continue
+        path = _tile_path(z, x, y, "density")
+        grid = _read_density(path)
+        if grid is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            grid = array("I", bytes(4 * TILE_SIZE * TILE_SIZE))
+        for offset, delta in changes.items():
+            grid[offset] = max(0, grid[offset] + delta)
+        if any(grid):
+            _write_density(path, grid)
+        elif os.path.exists(path):
+            os.remove(path)
+        png = _tile_path(z, x, y, "png")
+        if os.path.exists(png):
+            os.remove(png)
+        written += 1
+    deltas.clear()
+    return written
+
+
+# ---------------------------------------------------------------------------
+# Incremental update
+# ---------------------------------------------------------------------------
+def update(activity_ids=None):
+    """
+    Apply new/changed/deleted activities to the density tiles.
+    With no ids (or nothing applied yet), reconciles the whole store; with an
+    empty index that starts from clean tiles, so deleting HEAT_INDEX_FILE
+    forces a rebuild. Returns the number of tiles rewritten.
+    """
+    index = _load_index()
+    if activity_ids is None or not index:
+        if not index:
+            shutil.rmtree(tenancy.path(HEATMAP_DIR), ignore_errors=True)
+        keys = {str(a["id"]) for a in activity_store.all_activities()} | set(index)
+    else:
+        keys = {str(i) for i in activity_ids}
+
+    deltas, pending, written, changed = {}, 0, 0, False
+    for key in keys:
+        new = _route(activity_store.get(key))
+        old = index.get(key)
+        if old == new:
+            continue
+        if old:
+            pending += _rasterize(old, -1, deltas)
+        if new:
+            pending += _rasterize(new, 1, deltas)
+            index[key] = new
+        else:
+            index.pop(key, None)
+        changed = True
+        if pending >= FLUSH_PIXELS:
+            written += _flush(deltas)
+            _save_index()
+            pending = 0
+
+    if changed:
+        written += _flush(deltas)
+        _save_index()
+    return written
+
+
+# ---------------------------------------------------------------------------
+# PNG tiles
+# ---------------------------------------------------------------------------
+def _png(rgba):
+    """Encode TILE_SIZE² RGBA bytes as a PNG (filter 0 on every row)."""
+    stride = TILE_SIZE * 4
+    raw = b"".join(b"\x00" + rgba[r * stride:(r + 1) * stride] for r in range(TILE_SIZE))
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data
+                + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF))
+
+    return (b"\x89PNG\r\n\x1a\n"
+            + chunk(b"IHDR", struct.pack(">IIBBBBB", TILE_SIZE, TILE_SIZE, 8, 6, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw, 6))
+            + chunk(b"IEND", b""))
+
+
+def _colour(count):
+    t = min(1.0, math.log1p(count) / math.log1p(SATURATE))
+    rgb = [round(lo + (hi - lo) * t) for lo, hi in zip(_LOW, _HIGH)]
+    return bytes(rgb + [round(_MIN_ALPHA + (_MAX_ALPHA - _MIN_ALPHA) * t)])
+
+
+_PALETTE = [_colour(c) for c in range(SATURATE + 1)]  # 0 unused; saturated counts share the last
+EMPTY_TILE = _png(bytes(4 * TILE_SIZE * TILE_SIZE))
+
+
+def _render(grid):
+    rgba = bytearray(4 * TILE_SIZE * TILE_SIZE)
+    for offset, count in enumerate(grid):
+        if count:
+            rgba[4 * offset:4 * offset + 4] = _PALETTE[min(count, SATURATE)]
+    return _png(bytes(rgba))
+
+
+def valid_tile(z, x, y):
+    return z in HEAT_ZOOMS and 0 <= x < 1 << z and 0 <= y < 1 << z
+
+
+def tile_file(z, x, y):
+    """
+    Path of the tile's rendered PNG, rendering it first if its density
+    changed since; None if no run crosses the tile (serve EMPTY_TILE).
+    """
+    density = _tile_path(z, x, y, "density")
+    png = _tile_path(z, x, y, "png")
+    try:
+        density_mtime = os.stat(density).st_mtime
+    except FileNotFoundError:
+        return None
+    if os.path.exists(png) and os.stat(png).st_mtime >= density_mtime:
+        return png
+    grid = _read_density(density)
+    if grid is None:
+        return None
+    tmp = f"{png}.{os.getpid()}.tmp"  # web workers may render the same tile at once
+    with open(tmp, "wb") as f:
+        f.write(_render(grid))
+    os.replace(tmp, png)
+    return png
@@ -0,0 +1,418 @@
+"""
+Shared HTTP client for every upstream call (Strava, OpenWeather, Nominatim, Anthropic).
+One pooled requests.Session, and one place to count/observe outbound traffic.
+
+Each upstream has a circuit breaker (breakers.py). While it's open — or when a
+GET fails — the last-known-good response for the same request is served with
+an Age header instead of waiting on a dead service.
+
+Record/replay: with recording on, every successful upstream response is saved
+to a versioned snapshot file; with replay on (APP_MODE=demo), every request is
+answered from that snapshot and nothing goes out over the network.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
+
+import requests
+
+import breakers
+import deadlines
+import metrics
+import tenancy
+import tracing
+from config import UPSTREAM_TIMEOUT, STRAVA_RATE_LIMIT_15MIN, STRAVA_RATE_LIMIT_DAILY
+
+# Upstream names used for accounting
+STRAVA = "strava"
+OPENWEATHER = "openweather"
+NOMINATIM = "nominatim"
+ANTHROPIC = "anthropic"
+
+_session = requests.Session()
+
+# upstream -> number of requests sent by this process
+call_counts = {}
+
+# Calls slower than slow_after seconds count as failures toward tripping
+_breakers = {
+    STRAVA: breakers.Breaker(STRAVA, slow_after=5.0),
+    OPENWEATHER: breakers.Breaker(OPENWEATHER, slow_after=5.0),
+    NOMINATIM: breakers.Breaker(NOMINATIM, slow_after=3.0),
+    ANTHROPIC: breakers.Breaker(ANTHROPIC, slow_after=20.0),
+}
+
+
+class CircuitOpen(requests.ConnectionError):
+    """Upstream's breaker is open and there's no last-known-good response."""
+
+
+def request(upstream, method, url, **kwargs):
+    """Send a request to `upstream`. Same arguments/return as requests.request."""
+    with tracing.span("upstream", upstream=upstream, method=method, path=urlparse(url).path) as span:
+        if _snapshot["mode"] == "replay":
+            span["status"] = "replay"
+            return _replay(upstream, method, url, kwargs)
+
+        breaker = _breakers[upstream]
+        lkg_key = _lkg_key(upstream, url, kwargs) if method == "GET" else None
+        if not breaker.allow():
+            span["status"] = "circuit_open"
+            return _last_known_good(upstream, lkg_key, span, CircuitOpen(f"{upstream} circuit open"))
+
+        start = time.perf_counter()
+        try:
+            resp = _send(upstream, method, url, kwargs)
+        except deadlines.DeadlineExceeded:
+            breaker.release()
+            raise
+        except requests.RequestException as e:
+            breaker.failure()
+            span["status"] = "error"
+            return _last_known_good(upstream, lkg_key, span, e)
+
+        span["status"] = resp.status_code
+        if resp.status_code >= 500 or resp.status_code == 429:
+            breaker.failure()
+            return _last_known_good(upstream, lkg_key, span, None, fallback=resp)
+        breaker.success(time.perf_counter() - start)
+        if lkg_key and resp.ok:
+            breakers.save_lkg(lkg_key, resp.status_code, resp.content)
+        return resp
+
+
+def breaker_states():
+    return {name: b.snapshot() for name, b in _breakers.items()}
+
+
+def _lkg_key(upstream, url, kwargs):
+    params = kwargs.get("params") or {}
+    stable = sorted((k, str(v)) for k, v in params.items() if k not in SECRET_PARAMS)
+    # Strava answers differ per athlete for the same URL (/athlete, /athlete/activities)
+    owner = f"@{tenancy.key()}" if upstream == STRAVA and tenancy.key() else ""
+    return f"{upstream}{owner} GET {urlparse(url).path}?" + "&".join(f"{k}={v}" for k, v in stable)
+
+
+def _last_known_good(upstream, key, span, exc, fallback=None):
+    """
+    Last successful response for `key` (with an Age header, section marked
+    partial). Otherwise return `fallback`, or raise `exc`.
+    """
+    stored = breakers.load_lkg(key) if key else None
+    if stored is None:
+        if fallback is not None:
+            return fallback
+        raise exc
+    status, body, age = stored
+    metrics.inc("last_known_good_served_total", upstream=upstream)
+    deadlines.mark_stale(age)
+    span["status"] = "last_known_good"
+    span["age"] = round(age)
+    return _json_response(status, body, headers={"Age": str(int(age))})
+
+
+def _json_response(status, body, url=None, headers=None):
+    resp = requests.Response()
+    resp.status_code = status
+    resp.reason = "OK"
+    resp.url = url
+    resp.headers["Content-Type"] = "application/json"
+    resp.headers.update(headers or {})
+    resp._content = json.dumps(body).encode()
+    return resp
+
+
+def _send(upstream, method, url, kwargs):
+    # Every call gets a timeout, capped at what's left of the route's budget
+    timeout, capped = deadlines.cap_timeout(kwargs.pop("timeout", UPSTREAM_TIMEOUT))
+    call_counts[upstream] = call_counts.get(upstream, 0) + 1
+    if upstream == STRAVA:
+        _count_strava_call()
+    status = "error"
+    start = time.perf_counter()
+    try:
+        resp = _session.request(method, url, timeout=timeout, **kwargs)
+        status = str(resp.status_code)
+    except requests.Timeout as e:
+        status = "timeout"
+        if capped:
+            raise deadlines.DeadlineExceeded(f"Request deadline exceeded calling {upstream}") from e
+        raise
+    finally:
+        metrics.observe("upstream_request_duration_seconds", time.perf_counter() - start, upstream=upstream)
+        metrics.inc("upstream_requests_total", upstream=upstream, status=status)
+    if upstream == STRAVA:
+        _note_strava_usage(resp.headers)
+    if upstream == ANTHROPIC and resp.ok:
+        try:
+            metrics.claude_usage(resp.json().get("usage"))
+        except ValueError:
+            pass
+    if _snapshot["mode"] == "record":
+        _record(upstream, method, url, kwargs, resp)
+    return resp
+
+
+def get(upstream, url, **kwargs):
+    return request(upstream, "GET", url, **kwargs)
+
+
+def post(upstream, url, **kwargs):
+    return request(upstream, "POST", url, **kwargs)
+
+
+# ---------------------------------------------------------------------------
+# Strava rate limit (per application — shared by every athlete)
+# ---------------------------------------------------------------------------
+# Counted locally per call and corrected from Strava's usage headers on every
+# response, so other workers' calls show up as soon as this one hears back.
+# Windows reset on the quarter hour and at midnight UTC.
+_strava_usage = {"window": 0, "day": 0, "short": 0, "daily": 0,
+                 "short_limit": STRAVA_RATE_LIMIT_15MIN, "daily_limit": STRAVA_RATE_LIMIT_DAILY}
+_usage_lock = threading.Lock()
+
+
+def _roll_windows(now):
+    window, day = int(now // 900), int(now // 86400)
+    if window != _strava_usage["window"]:
+        _strava_usage["window"] = window
+        _strava_usage["short"] = 0
+    if day != _strava_usage["day"]:
+        _strava_usage["day"] = day
+        _strava_usage["daily"] = 0
+
+
+def _count_strava_call():
+    with _usage_lock:
+        _roll_windows(time.time())
+        _strava_usage["short"] += 1
+        _strava_usage["daily"] += 1
+
+
+def _parse_pair(value):
+    try:
+        short, daily = (int(v) for v in value.split(","))
+        return short, daily
+    except (AttributeError, ValueError):
+        return None
+
+
+def _note_strava_usage(headers):
+    # Read limits are the tighter ones for everything this app does
+    usage = _parse_pair(headers.get("X-ReadRateLimit-Usage") or headers.get("X-RateLimit-Usage"))
+    limit = _parse_pair(headers.get("X-ReadRateLimit-Limit") or headers.get("X-RateLimit-Limit"))
+    with _usage_lock:
+        _roll_windows(time.time())
+        if usage:
+            _strava_usage["short"], _strava_usage["daily"] = usage
+        if limit:
+            _strava_usage["short_limit"], _strava_usage["daily_limit"] = limit
+
+
+def strava_quota():
+    """
+    App-wide Strava usage: {short, short_limit, daily, daily_limit, short_left, daily_left}.
+    "short" is the current 15-minute window.
+    """
+    with _usage_lock:
+        _roll_windows(time.time())
+        usage = {k: _strava_usage[k] for k in ("short", "short_limit", "daily", "daily_limit")}
+    usage["short_left"] = max(0, usage["short_limit"] - usage["short"])
+    usage["daily_left"] = max(0, usage["daily_limit"] - usage["daily"])
+    return usage
+
+
+# ---------------------------------------------------------------------------
+# Record / replay snapshots
+# ---------------------------------------------------------------------------
+SNAPSHOT_VERSION = 1
+
+# Time-dependent query params — ignored when matching so a replay days later still hits
+VOLATILE_PARAMS = {"after", "before", "dt"}
+# Never written to a snapshot key
+SECRET_PARAMS = {"appid", "client_id", "client_secret", "refresh_token", "code", "key"}
+# Responses carrying credentials are never recorded
+UNRECORDED_PATHS = ("/oauth/token",)
+
+# mode:    None | "record" | "replay"
+# entries: exact key -> {"upstream", "method", "path", "status", "body", "recorded_at"}
+# loose:   "upstream METHOD path" -> exact key of the latest entry for that path
+_snapshot = {"mode": None, "path": None, "rebase": True, "entries": {}, "loose": {}}
+_snapshot_lock = threading.Lock()
+
+
+def _keys(upstream, method, url, kwargs):
+    """(exact, loose) match keys. Exact includes stable params and a body hash."""
+    path = urlparse(url).path
+    params = kwargs.get("params") or {}
+    stable = sorted(
+        (k, str(v)) for k, v in params.items()
+        if k not in VOLATILE_PARAMS and k not in SECRET_PARAMS
+    )
+    body = kwargs.get("json") if kwargs.get("json") is not None else kwargs.get("data")
+    exact = f"{upstream} {method} {path}?" + "&".join(f"{k}={v}" for k, v in stable)
+    if body is not None:
+        digest = hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()
+        exact += f"#{digest[:12]}"
+    return exact, f"{upstream} {method} {path}"
+
+
+def _index_loose():
+    loose = {}
+    for key, entry in sorted(_snapshot["entries"].items(), key=lambda kv: kv[1]["recorded_at"]):
+        loose[f"{entry['upstream']} {entry['method']} {entry['path']}"] = key
+    _snapshot["loose"] = loose
+
+
+def _load_snapshot(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        data = json.load(f)
+    if data.get("version") != SNAPSHOT_VERSION:
+        print(f"Snapshot {path} is version {data.get('version')}, expected {SNAPSHOT_VERSION} — ignoring")
+        return {}
+    return data.get("entries", {})
+
+
+def _save_snapshot():
+    path = _snapshot["path"]
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": SNAPSHOT_VERSION, "entries": _snapshot["entries"]}, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def start_recording(path):
+    """Capture every successful upstream response into `path` (merged with what's there)."""
+    _snapshot.update(mode="record", path=path, entries=_load_snapshot(path))
+    _index_loose()
+
+
+def start_replay(path, rebase=True):
+    """
+    Answer every request from the snapshot at `path`; misses raise ConnectionError.
+    rebase=True shifts recorded timestamps forward to now (Strava by whole days,
+    OpenWeather by whole hours) so a months-old snapshot still looks current;
+    pass False for byte-identical fixtures.
+    """
+    _snapshot.update(mode="replay", path=path, rebase=rebase, entries=_load_snapshot(path))
+    _index_loose()
+    if not _snapshot["entries"]:
+        print(f"Replay snapshot {path} is empty or missing — upstream calls will fail")
+
+
+def stop_snapshot():
+    _snapshot.update(mode=None, path=None, entries={}, loose={})
+
+
+def replaying():
+    return _snapshot["mode"] == "replay"
+
+
+def snapshot_available():
+    """True if replaying from a snapshot that actually has responses."""
+    return replaying() and bool(_snapshot["entries"])
+
+
+def _record(upstream, method, url, kwargs, resp):
+    path = urlparse(url).path
+    if not resp.ok or path.endswith(UNRECORDED_PATHS):
+        return
+    try:
+        body = resp.json()
+    except ValueError:
+        return
+    exact, _ = _keys(upstream, method, url, kwargs)
+    windowed = VOLATILE_PARAMS & set(kwargs.get("params") or {})
+    with _snapshot_lock:
+        previous = _snapshot["entries"].get(exact)
+        if windowed and previous and isinstance(body, list) and isinstance(previous["body"], list):
+            # Same list, different time window (e.g. each past week) — keep the union
+            body = _merge_by_id(previous["body"], body)
+        _snapshot["entries"][exact] = {
+            "upstream": upstream,
+            "method": method,
+            "path": path,
+            "status": resp.status_code,
+            "body": body,
+            "recorded_at": int(time.time()),
+        }
+        _index_loose()
+        _save_snapshot()
+
+
+def _merge_by_id(old, new):
+    merged = {item.get("id"): item for item in old + new if isinstance(item, dict)}
+    return sorted(merged.values(), key=lambda a: a.get("start_date", ""), reverse=True)
+
+
+def _replay(upstream, method, url, kwargs):
+    exact, loose = _keys(upstream, method, url, kwargs)
+    entry = _snapshot["entries"].get(exact)
+    if entry is None:
+        entry = _snapshot["entries"].get(_snapshot["loose"].get(loose))
+    if entry is None:
+        raise requests.ConnectionError(f"No snapshot response for {exact}")
+
+    body = copy.deepcopy(entry["body"])
+    if _snapshot["rebase"]:
+        age = time.time() - entry["recorded_at"]
+        if upstream == STRAVA:
+            body = _rebase_strava(body, int(age // 86400) * 86400, kwargs.get("params") or {})
+        elif upstream == OPENWEATHER:
+            _rebase_epochs(body, int(age // 3600) * 3600)
+
+    return _json_response(entry["status"], body, url=url)
+
+
+def _shift_iso(value, seconds):
+    dt = datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ") + timedelta(seconds=seconds)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _rebase_strava(body, seconds, params):
+    """Shift activity start dates forward and re-apply the after/before window."""
+    items = body if isinstance(body, list) else [body]
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        for field in ("start_date", "start_date_local"):
+            if isinstance(item.get(field), str):
+                try:
+                    item[field] = _shift_iso(item[field], seconds)
+                except ValueError:
+                    pass
+    if not isinstance(body, list) or not ("after" in params or "before" in params):
+        return body
+
+    after = float(params.get("after", 0))
+    before = float(params.get("before", float("inf")))
+
+    def start(a):
+        dt = datetime.strptime(a["start_date"], "%Y-%m-%dT%H:%M:%SZ")
+        return dt.replace(tzinfo=timezone.utc).timestamp()
+
+    return [a for a in body if isinstance(a, dict) and "start_date" in a and after < start(a) < before]
+
+
+def _rebase_epochs(node, seconds):
+    """Add `seconds` to every dt/sunrise/sunset epoch in an OpenWeather payload."""
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k in ("dt", "sunrise", "sunset") and isinstance(v, (int, float)):
+                node[k] = v + seconds
+            else:
+                _rebase_epochs(v, seconds)
+    elif isinstance(node, list):
+        for v in node:
+            _rebase_epochs(v, seconds)
@@ -0,0 +1,270 @@
+"""
+Bulk import — a Strava bulk-export ZIP, or a directory of GPX/TCX/FIT files,
+loaded into the local store with zero Strava API calls:
+
+    python importer.py export_12345.zip [--athlete 12345] [--workers 8]
+
+Files are parsed in parallel across CPU cores (ProcessPoolExecutor); the main
+process writes streams as results arrive, upserts every summary in one batch
+and then updates derived data. Activities keep their Strava id where it can
+be found — activities.csv, or an already-synced activity starting within a
+minute — and otherwise get a stable negative id (minus the start epoch), so
+re-running an import doesn't duplicate anything. Synced summaries are never
+overwritten; they only gain streams they were missing.
+
+The app can keep running: stores are re-read when their files change. Sync
+(the worker, or the web itself without one) writes the same files, so the
+import holds sync.store_lock() throughout — it waits for a sync pass in
+progress, and sync passes skip until it's done.
+"""
+
+import argparse
+import csv
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import activity_files
+import activity_store
+import athlete_profile
+import heatmap
+import mileage
+import records
+import rollups
+import routes
+import stream_store
+import sync
+import tenancy
+import training_load
+import zones
+
+DEFAULT_TIMEZONE = "America/Los_Angeles"  # for start_date_local, as elsewhere in the app
+MATCH_WINDOW = 60                          # seconds — same start as a synced activity
+CSV_NAME = "activities.csv"
+
+
+# ---------------------------------------------------------------------------
+# activities.csv (Strava bulk export)
+# ---------------------------------------------------------------------------
+def _number(value):
+    try:
+        return float(value.replace(",", "")) if value else None
+    except ValueError:
+        return None
+
+
+def _seconds(value):
+    number = _number(value)
+    return int(number) if number is not None else None
+
+
+def read_activities_csv(text, tz):
+    """
+    Strava's activities.csv → {file name (lower case, "" if none): [summary, ...]}.
+    The export repeats some headers; the second "Distance" is in meters,
+    the first (and only, in older exports) in km.
+    """
+    reader = csv.reader(io.StringIO(text))
+    header = next(reader, [])
+    columns = {}
+    for i, name in enumerate(header):
+        columns.setdefault(name.strip(), []).append(i)
+
+    def col(row, name, occurrence=0):
+        idx = columns.get(name, [])
+        return row[idx[occurrence]].strip() if len(idx) > occurrence and idx[occurrence] < len(row) else ""
+
+    by_file = {}
+    for row in reader:
+        activity_id = col(row, "Activity ID")
+        if not activity_id.isdigit():
+            continue
+        try:
+            start = datetime.strptime(col(row, "Activity Date"), "%b %d, %Y, %I:%M:%S %p")
+        except ValueError:
+            continue
+        start = start.replace(tzinfo=timezone.utc)
+        meters = (_number(col(row, "Distance", 1)) if len(columns.get("Distance", [])) > 1
+                  else (_number(col(row, "Distance")) or 0) * 1000)
+        sport = col(row, "Activity Type") or "Workout"
+        summary = {
+            "id": int(activity_id),
+            "name": col(row, "Activity Name") or f"Imported {sport}",
+            "type": sport,
+            "sport_type": sport,
+            "start_date": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "start_date_local": start.astimezone(tz).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "distance": meters,
+            "elapsed_time": _seconds(col(row, "Elapsed Time")),
+            "moving_time": _seconds(col(row, "Moving Time")),
+            "total_elevation_gain": _number(col(row, "Elevation Gain")),
+            "average_heartrate": _number(col(row, "Average Heart Rate")),
+            "max_heartrate": _number(col(row, "Max Heart Rate")),
+        }
+        summary = {k: v for k, v in summary.items() if v is not None}
+        by_file.setdefault(col(row, "Filename").lower(), []).append(summary)
+    return by_file
+
+
+# ---------------------------------------------------------------------------
+# Parsing (runs in the pool)
+# ---------------------------------------------------------------------------
+_zips = {}  # per worker process: archive path -> open ZipFile
+
+
+def _read(source, member):
+    if source is None:
+        with open(member, "rb") as f:
+            return f.read()
+    if source not in _zips:
+        _zips[source] = zipfile.ZipFile(source)
+    return _zips[source].read(member)
+
+
+def _parse_job(job):
+    """(source, member, tz name) → (member, {streams, summary}) or (member, error string)."""
+    source, member, tz_name = job
+    try:
+        track = activity_files.parse_file(member, _read(source, member))
+        if len(track["time"]) < 2:
+            return member, "no track points"
+        streams = activity_files.to_streams(track)
+        return member, {"streams": streams,
+                        "summary": activity_files.to_summary(track, streams, ZoneInfo(tz_name))}
+    except Exception as e:
+        return member, f"{type(e).__name__}: {e}"
+
+
+# ---------------------------------------------------------------------------
+# Import
+# ---------------------------------------------------------------------------
+def _sources(path):
+    """(zip path or None, [activity file members], activities.csv text or None)."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as z:
+            names = z.namelist()
+            csv_member = next((n for n in names if os.path.basename(n) == CSV_NAME), None)
+            text = z.read(csv_member).decode("utf-8-sig") if csv_member else None
+        return path, [n for n in names if activity_files.file_kind(n)], text
+    members, text = [], None
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            full = os.path.join(root, name)
+            if name == CSV_NAME and text is None:
+                with open(full, "r", encoding="utf-8-sig") as f:
+                    text = f.read()
+            elif activity_files.file_kind(name):
+                members.append(full)
+    return None, sorted(members), text
+
+
+def _csv_key(source, member, path):
+    """activities.csv names files relative to the export root ("activities/123.fit.gz")."""
+    rel = member if source else os.path.relpath(member, path)
+    return rel.replace(os.sep, "/").lower()
+
+
+def _stored_starts():
+    """Synced activities by start minute, for matching files without an id."""
+    starts = {}
+    for a in activity_store.all_activities():
+        starts.setdefault(int(activity_store.start_ts(a)) // 60, []).append(a)
+    return starts
+
+
+def _match(starts, start_ts):
+    for minute in (start_ts // 60 - 1, start_ts // 60, start_ts // 60 + 1):
+        for a in starts.get(minute, []):
+            if abs(activity_store.start_ts(a) - start_ts) <= MATCH_WINDOW:
+                return a["id"]
+    return None
+
+
+def run_import(path, workers=None, tz_name=DEFAULT_TIMEZONE):
+    """Import an export ZIP or directory for the current athlete. Returns counts."""
+    with sync.store_lock(wait=True):
+        return _import(path, workers, tz_name)
+
+
+def _import(path, workers, tz_name):
+    tz = ZoneInfo(tz_name)
+    source, members, csv_text = _sources(path)
+    csv_rows = read_activities_csv(csv_text, tz) if csv_text else {}
+    starts = _stored_starts()
+
+    summaries = {}  # id -> summary to upsert
+    counts = {"files": len(members), "parsed": 0, "failed": 0, "streams": 0, "summaries": 0}
+    used_rows = set()
+    jobs = [(source, m, tz_name) for m in members]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for member, result in pool.map(_parse_job, jobs, chunksize=16):
+            key = _csv_key(source, member, path)
+            row = (csv_rows.get(key) or [None])[0]
+            if isinstance(result, str):
+                counts["failed"] += 1
+                print(f"Skipped {member}: {result}")
+                if row:
+                    used_rows.add(key)
+                    summaries.setdefault(row["id"], row)  # the CSV alone still gives a summary
+                continue
+            counts["parsed"] += 1
+            summary = result["summary"]
+            start_ts = int(activity_store.start_ts(summary))
+            if row:
+                used_rows.add(key)
+                activity_id = row["id"]
+            else:
+                activity_id = _match(starts, start_ts) or -start_ts
+            if not stream_store.has_streams(activity_id):
+                stream_store.write_streams(activity_id, result["streams"])
+                counts["streams"] += 1
+            # Strava's own numbers (and name) win over what the file implies
+            summaries.setdefault(activity_id, {
+                **summary, "name": f"Imported {summary['type']}", **(row or {}), "id": activity_id,
+            })
+            if counts["parsed"] % 500 == 0:
+                print(f"  {counts['parsed']} files parsed ({time.perf_counter() - started:.0f}s)")
+
+    # Manual entries and rows whose file is missing
+    for key, rows in csv_rows.items():
+        if key not in used_rows:
+            for row in rows:
+                summaries.setdefault(row["id"], row)
+
+    new = [s for i, s in summaries.items() if activity_store.get(i) is None]
+    changed = activity_store.upsert(new)
+    counts["summaries"] = len(changed)
+
+    training_load.update(changed)
+    athlete_profile.update(changed)
+    mileage.update(changed)
+    rollups.update(changed)
+    heatmap.update(changed)
+    routes.update(changed)
+    counts["records"] = records.update()
+    zones.update()
+    counts["seconds"] = round(time.perf_counter() - started, 1)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a Strava bulk export or GPX/TCX/FIT files.")
+    parser.add_argument("path", help="Strava export .zip, or a directory of activity files")
+    parser.add_argument("--athlete", help="Strava athlete id to import for (default: single-athlete install)")
+    parser.add_argument("--workers", type=int, default=None, help="parser processes (default: CPU count)")
+    parser.add_argument("--timezone", default=DEFAULT_TIMEZONE, help="zone for local start times")
+    args = parser.parse_args()
+
+    with tenancy.use(args.athlete):
+        counts = run_import(args.path, workers=args.workers, tz_name=args.timezone)
+    print(f"Imported {counts['summaries']} activities, {counts['streams']} streams from "
+          f"{counts['parsed']}/{counts['files']} files ({counts['failed']} failed) in {counts['seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Counters and histograms for upstream calls, cache lookups and routes,
+exposed as Prometheus text at /metrics.
+Each gunicorn worker keeps its own in-memory totals and flushes them to
+METRICS_DIR/<pid>.json (at most once a second); a scrape sums the files of
+live workers, so the numbers cover all workers whichever one answers. Files
+left by dead workers (restarts, reloads) are removed rather than summed again.
+"""
+
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+METRICS_DIR = "metrics_data"
+FLUSH_INTERVAL = 1.0  # seconds between per-worker flushes
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name -> (type, help)
+METRICS = {
+    "http_requests_total": ("counter", "Requests handled, by route, method and status."),
+    "http_request_duration_seconds": ("histogram", "Route handler latency."),
+    "upstream_requests_total": ("counter", "Outbound requests, by upstream and status."),
+    "upstream_request_duration_seconds": ("histogram", "Outbound request latency, by upstream."),
+    "cache_lookups_total": ("counter", "Cache lookups, by cache and result (hit/miss)."),
+    "anthropic_tokens_total": ("counter", "Claude token usage from Messages responses, by kind."),
+    "circuit_breaker_transitions_total": ("counter", "Circuit breaker state changes, by upstream and new state."),
+    "last_known_good_served_total": ("counter", "Responses served from last-known-good, by upstream."),
+}
+
+# (name, ((label, value), ...)) -> float
+_counters = {}
+# (name, labels) -> [per-bucket counts..., +Inf count, sum]
+_histograms = {}
+_lock = threading.Lock()
+_flush_lock = threading.Lock()  # one writer at a time, so an older snapshot never lands last
+_last_flush = 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def observe(name, seconds, **labels):
+    key = _key(name, labels)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(DEFAULT_BUCKETS) + 2)
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                h[i] += 1
+                break
+        else:
+            h[len(DEFAULT_BUCKETS)] += 1
+        h[-1] += seconds
+    _maybe_flush()
+
+
+def cache_lookup(cache, hit):
+    inc("cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+
+
+def claude_usage(usage):
+    """Count token usage from a Messages API response's `usage` block."""
+    for field, kind in (
+        ("input_tokens", "input"),
+        ("output_tokens", "output"),
+        ("cache_read_input_tokens", "cache_read"),
+        ("cache_creation_input_tokens", "cache_creation"),
+    ):
+        if (usage or {}).get(field):
+            inc("anthropic_tokens_total", usage[field], kind=kind)
+
+
+# ---------------------------------------------------------------------------
+# Cross-worker aggregation
+# ---------------------------------------------------------------------------
+def _maybe_flush():
+    global _last_flush
+    now = time.time()
+    with _lock:  # check-and-set, so only one request thread flushes per interval
+        if now - _last_flush < FLUSH_INTERVAL:
+            return
+        _last_flush = now
+    flush()
+
+
+def flush():
+    """Write this worker's totals to METRICS_DIR/<pid>.json."""
+    global _last_flush
+    with _flush_lock:
+        with _lock:
+            data = {
+                "counters": [[n, list(l), v] for (n, l), v in _counters.items()],
+                "histograms": [[n, list(l), h] for (n, l), h in _histograms.items()],
+            }
+            _last_flush = time.time()
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        pid = os.getpid()
+        path = os.path.join(METRICS_DIR, f"{pid}.json")
+        tmp = os.path.join(METRICS_DIR, f"{pid}.{uuid.uuid4().hex}.tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _collect():
+    """Sum the files of live workers, deleting those of workers that have exited."""
+    counters, histograms = {}, {}
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        pid = os.path.basename(path)[:-len(".json")]
+        if pid.isdigit() and not _alive(int(pid)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            continue
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            continue
+        for name, labels, value in data.get("counters", []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in data.get("histograms", []):
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(h))
+            histograms[key] = [a + b for a, b in zip(total, h)]
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v):
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render():
+    """Prometheus text exposition (format 0.0.4) summed across workers."""
+    flush()
+    counters, histograms = _collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        if kind == "counter":
+            series = sorted((l, v) for (n, l), v in counters.items() if n == name)
+        else:
+            series = sorted((l, h) for (n, l), h in histograms.items() if n == name)
+        if not series:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            if kind == "counter":
+                lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+                continue
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, value):
+                cumulative += count
+                lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', bound)])} {cumulative}")
+            cumulative += value[len(DEFAULT_BUCKETS)]
+            lines.append(f"{name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {cumulative}")
+            lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(value[-1])}")
+            lines.append(f"{name}_count{_fmt_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,197 @@
+"""
+Daily mileage index — date → run distance, run time, run count and the
+sports done that day, derived from the local activity store.
+Kept in step incrementally (each activity's contribution is stored, like
+training_load.py) on every sync and Strava webhook event, so a week, month or
+any date range is one lookup per day instead of a pass over raw activities.
+Summaries here carry no weekly goal — callers apply the athlete's goal, so a
+cached aggregate can never pin whichever goal asked first.
+"""
+
+import json
+import os
+from datetime import date, timedelta
+
+import activity_store
+import shared_cache
+import tenancy
+from units import format_duration, meters_to_miles
+
+MILEAGE_FILE = "daily_mileage.json"
+
+# contrib: str(activity_id) -> [date, sport, is run, run meters, run seconds]   (what each activity added)
+# days:    date -> [run meters, run seconds, runs, {sport: activities}]
+_indexes = {}  # tenancy key -> (file mtime, index)
+
+
+def _load():
+    """The current athlete's index — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(MILEAGE_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _indexes.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        index = {"contrib": {}, "days": {}}
+        if mtime is not None:
+            with open(path, "r") as f:
+                index.update(json.load(f))
+        _indexes[key] = cached = (mtime, index)
+    return cached[1]
+
+
+def _save():
+    path = tenancy.path(MILEAGE_FILE)
+    index = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+    _indexes[tenancy.key()] = (os.stat(path).st_mtime, index)
+
+
+def _contribution(a):
+    """[date, sport, is run, run meters, run seconds] for one stored activity (None if undated)."""
+    # start_date_local carries a Z but is local time — the date prefix is the local day
+    day = (a.get("start_date_local") or "")[:10]
+    if not day:
+        return None
+    sport = a.get("sport_type") or a.get("type") or "Workout"
+    if not activity_store.is_run(a):
+        return [day, sport, 0, 0, 0]
+    return [day, sport, 1, round(a.get("distance") or 0, 1), a.get("moving_time") or 0]
+
+
+def _apply(days, entry, sign):
+    day, sport, run, meters, seconds = entry
+    bucket = days.setdefault(day, [0, 0, 0, {}])
+    bucket[0] = round(bucket[0] + sign * meters, 1)
+    bucket[1] += sign * seconds
+    bucket[2] += sign * run
+    sports = bucket[3]
+    sports[sport] = sports.get(sport, 0) + sign
+    if sports[sport] <= 0:
+        sports.pop(sport)
+    if not sports:
+        days.pop(day)
+
+
+# ---------------------------------------------------------------------------
+# Incremental update
+# ---------------------------------------------------------------------------
+def update(activity_ids=None):
+    """
+    Apply new/changed/deleted activities to the index. With no ids (or an
+    empty index) reconciles the whole store. Returns the number changed.
+    """
+    index = _load()
+    contrib = index["contrib"]
+    if activity_ids is None or not contrib:
+        keys = {str(a["id"]) for a in activity_store.all_activities()} | set(contrib)
+    else:
+        keys = {str(i) for i in activity_ids}
+
+    changed = 0
+    for key in keys:
+        a = activity_store.get(key)
+        new = _contribution(a) if a else None
+        old = contrib.get(key)
+        if old == new:
+            continue
+        if old:
+            _apply(index["days"], old, -1)
+        if new:
+            _apply(index["days"], new, 1)
+            contrib[key] = new
+        else:
+            contrib.pop(key, None)
+        changed += 1
+
+    if changed:
+        _save()
+    return changed
+
+
+def _days():
+    index = _load()
+    if not index["contrib"] and activity_store.count() and not shared_cache.read_only:
+        update()  # first use on an existing store (the worker's job when read-only)
+    return index["days"]
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def day_totals(start, end):
+    """
+    One entry per date in [start, end] (datetime.date, inclusive):
+    { date, meters, seconds, runs, sports } — zeros on rest days.
+    """
+    days = _days()
+    out = []
+    day = start
+    while day <= end:
+        meters, seconds, runs, sports = days.get(day.isoformat(), (0, 0, 0, {}))
+        out.append({"date": day, "meters": meters, "seconds": seconds, "runs": runs,
+                    "sports": sorted(sports)})
+        day += timedelta(days=1)
+    return out
+
+
+def range_totals(start, end):
+    """Run totals over [start, end]: { meters, seconds, runs, activeDays }."""
+    days = day_totals(start, end)
+    return {
+        "meters": round(sum(d["meters"] for d in days), 1),
+        "seconds": sum(d["seconds"] for d in days),
+        "runs": sum(d["runs"] for d in days),
+        "activeDays": sum(1 for d in days if d["runs"]),
+    }
+
+
+def week_start(day=None):
+    """Monday of the training week containing `day` (default today)."""
+    day = day or date.today()
+    return day - timedelta(days=day.weekday())
+
+
+def current_week():
+    """
+    This week's day bubbles and total miles (Monday–Sunday), without the goal:
+    { weekDays: [{day, date, miles, sport, today}], totalMi }.
+    """
+    today = date.today()
+    day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    week_days = []
+    for name, d in zip(day_names, day_totals(week_start(today), week_start(today) + timedelta(days=6))):
+        miles = meters_to_miles(d["meters"])
+        week_days.append({
+            "day": name,
+            "date": d["date"].day,
+            "miles": miles,
+            "sport": "run" if miles > 0 else None,
+            "today": d["date"] == today,
+        })
+    return {"weekDays": week_days, "totalMi": round(sum(d["miles"] for d in week_days), 1)}
+
+
+def past_weeks(count=3):
+    """
+    The `count` weeks before this one, newest first.
+    Returns shape matching wireframe PAST_WEEKS constant.
+    """
+    day_abbrevs = ["M", "T", "W", "Th", "F", "Sa", "Su"]
+    this_monday = week_start()
+    weeks = []
+    for w in range(1, count + 1):
+        start = this_monday - timedelta(weeks=w)
+        end = start + timedelta(days=6)
+        days = day_totals(start, end)
+        miles = [meters_to_miles(d["meters"]) for d in days]
+        weeks.append({
+            # "Jan 27 – Feb 2"
+            "label": f"{start.strftime('%b %-d')} – {end.strftime('%b %-d')}",
+            "miles": round(sum(miles), 1),
+            "time": format_duration(sum(d["seconds"] for d in days)),
+            "days": [{"d": abbrev, "mi": mi} for abbrev, mi in zip(day_abbrevs, miles)],
+        })
+    return {"weeks": weeks}
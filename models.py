@@ -0,0 +1,142 @@
+"""
+Typed activity records.
+Hold raw Strava numbers (meters, seconds, m/s) in __slots__ classes; display
+strings are only built in to_json(), per the athlete's measurement_preference.
+"""
+
+from units import (
+    METRIC, format_date, format_distance, format_duration, format_elevation,
+    format_pace, meters_to_miles,
+)
+
+# Strava workout_type → wireframe run type mapping
+WORKOUT_TYPE_MAP = {
+    0: None,                # Default — no type
+    1: None,                # Race (could add to RUN_TYPES later)
+    2: "Easy Long Run",     # Long Run
+    3: "Tempo Run",         # Workout (structured effort)
+}
+
+
+def map_run_type(workout_type):
+    """Map Strava workout_type int to wireframe run type string."""
+    if workout_type is None:
+        return None
+    return WORKOUT_TYPE_MAP.get(workout_type, None)
+
+
+class Split:
+    """One mile (or km) split — raw meters, seconds, m/s."""
+
+    __slots__ = ("number", "distance", "moving_time", "average_speed", "elevation_difference")
+
+    def __init__(self, number, distance, moving_time, average_speed, elevation_difference):
+        self.number = number
+        self.distance = distance
+        self.moving_time = moving_time
+        self.average_speed = average_speed
+        self.elevation_difference = elevation_difference
+
+    @classmethod
+    def from_strava(cls, s, number):
+        return cls(
+            number=s.get("split", number),
+            distance=s.get("distance", 0),
+            moving_time=s.get("moving_time", 0),
+            average_speed=s.get("average_speed", 0),
+            elevation_difference=s.get("elevation_difference") or 0,
+        )
+
+    def to_json(self, units="feet"):
+        return {
+            "m": self.number,
+            "p": format_pace(self.average_speed, units, suffix=False),
+            "e": format_elevation(self.elevation_difference, units, signed=True),
+            "dist": self.distance,
+            "moving_time": self.moving_time,
+        }
+
+
+def _splits(raw):
+    return tuple(Split.from_strava(s, i + 1) for i, s in enumerate(raw or []))
+
+
+class Activity:
+    """A run from /activities/{id} — everything needed by the activity card."""
+
+    __slots__ = (
+        "id", "name", "description", "start_date_local", "distance", "moving_time",
+        "total_elevation_gain", "average_speed", "gear_name", "device_name",
+        "workout_type", "run_type", "calories", "suffer_score", "average_heartrate",
+        "max_heartrate", "average_cadence", "polyline", "city",
+        "splits_standard", "splits_metric",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def from_strava(cls, a, city=None):
+        """Build from Strava activity detail JSON (or a stored summary — no splits)."""
+        has_hr = a.get("has_heartrate")
+        return cls(
+            id=a["id"],
+            name=a.get("name", "Run"),
+            description=a.get("description") or None,
+            start_date_local=a.get("start_date_local", ""),
+            distance=a.get("distance", 0),
+            moving_time=a.get("moving_time", 0),
+            total_elevation_gain=a.get("total_elevation_gain", 0),
+            average_speed=a.get("average_speed", 0),
+            gear_name=(a.get("gear") or {}).get("name"),
+            device_name=a.get("device_name") or None,
+            workout_type=a.get("workout_type"),
+            run_type=map_run_type(a.get("workout_type")),
+            calories=a.get("calories", 0) or 0,
+            suffer_score=a.get("suffer_score") or None,
+            average_heartrate=a.get("average_heartrate") if has_hr else None,
+            max_heartrate=a.get("max_heartrate") if has_hr else None,
+            average_cadence=a.get("average_cadence"),
+            polyline=(a.get("map") or {}).get("summary_polyline") or a.get("polyline") or None,
+            city=city,
+            splits_standard=_splits(a.get("splits_standard")),
+            splits_metric=_splits(a.get("splits_metric")),
+        )
+
+    @property
+    def miles(self):
+        return meters_to_miles(self.distance or 0)
+
+    def splits(self, units="feet"):
+        if units == METRIC:
+            return self.splits_metric or self.splits_standard
+        return self.splits_standard or self.splits_metric
+
+    def to_json(self, units="feet"):
+        """Wireframe-shaped activity dict with display strings in `units`."""
+        return {
+            "id": self.id,
+            "title": self.name,
+            "description": self.description,
+            "date": format_date(self.start_date_local),
+            "distance": format_distance(self.distance, units),
+            "distance_raw": self.miles,
+            "pace": format_pace(self.average_speed, units),
+            "time": format_duration(self.moving_time),
+            "elev": format_elevation(self.total_elevation_gain, units),
+            "shoe": self.gear_name or "Unknown",
+            "device": self.device_name,
+            "runType": self.run_type,
+            "sport": "run",
+            "units": units,
+            "splits": [s.to_json(units) for s in self.splits(units)],
+            "cal": self.calories,
+            "eff": self.suffer_score,
+            "avg_hr": round(self.average_heartrate) if self.average_heartrate else None,
+            "max_hr": round(self.max_heartrate) if self.max_heartrate else None,
+            "avg_cadence": round(self.average_cadence * 2) if self.average_cadence else None,
+            "start_date_local": self.start_date_local,
+            "polyline": self.polyline,
+            "city": self.city,
+        }
@@ -0,0 +1,180 @@
+"""
+Dashboard payload builders and the settings they read — run inline by the
+routes in app.py, or by worker.py to publish (without loading Flask).
+"""
+
+import json
+import os
+import time
+from collections import Counter
+
+import requests
+
+import activity_store
+import athlete_profile
+import deadlines
+import mileage
+import run_types
+import strava_client
+import sync
+import tenancy
+import training_load
+import weather_client
+import zones
+from config import DEFAULT_SHOE_MAX_MILES, DEFAULT_WEEKLY_GOAL, WEEKS_TO_FETCH
+
+FEED_PAGE_SIZE = 10
+MAX_FEED_PAGE_SIZE = 50
+PUBLISHED_WEEKS = WEEKS_TO_FETCH - 1  # past weeks shown on the dashboard
+HOME_WINDOW_DAYS = 90  # run starts that count toward the athlete's home forecast
+
+
+# ---------------------------------------------------------------------------
+# User settings (one file per athlete — see tenancy.py)
+# ---------------------------------------------------------------------------
+SETTINGS_FILE = "user_settings.json"
+
+
+def load_settings():
+    path = tenancy.path(SETTINGS_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {
+        "goalMi": DEFAULT_WEEKLY_GOAL,
+        "shoeMaxMiles": DEFAULT_SHOE_MAX_MILES,
+        "vo2": 52,
+    }
+
+
+def save_settings(settings):
+    with open(tenancy.path(SETTINGS_FILE), "w") as f:
+        json.dump(settings, f, indent=2)
+
+
+def zone_bounds(settings):
+    """(hr_bounds, pace_bounds) from user settings, falling back to defaults."""
+    return (
+        settings.get("hrZones") or zones.DEFAULT_HR_ZONES,
+        settings.get("paceZones") or zones.DEFAULT_PACE_ZONES,
+    )
+
+
+# ---------------------------------------------------------------------------
+# Run type overlay (run_types.json)
+# ---------------------------------------------------------------------------
+def apply_run_types(activities):
+    """Overlay user-assigned run types from run_types.json onto Activity records."""
+    saved_types = run_types.load()
+    for act in activities:
+        key = str(act.id)
+        if key in saved_types:
+            act.run_type = saved_types[key]
+
+
+def apply_run_types_json(activities):
+    """Same overlay for activities already in JSON shape (feed payloads)."""
+    saved_types = run_types.load()
+    for act in activities:
+        key = str(act["id"])
+        if key in saved_types:
+            act["runType"] = saved_types[key]
+
+
+# ---------------------------------------------------------------------------
+# Payloads
+# ---------------------------------------------------------------------------
+def build_profile(settings):
+    return athlete_profile.get_profile(shoe_maxes=settings.get("shoeMaxMiles"))
+
+
+def refresh_store():
+    """Pick up new uploads before building from the local store (at most once per cache TTL)."""
+    try:
+        sync.refresh_store_if_stale()
+    except deadlines.DeadlineExceeded:
+        deadlines.mark_partial()
+    except requests.RequestException as e:
+        # Strava unreachable — the stored history is still worth serving
+        print(f"Store refresh failed: {e}")
+        deadlines.mark_partial()
+
+
+def build_feed(count=FEED_PAGE_SIZE, before=None):
+    """
+    One page of the run feed: {"activities": [JSON dicts], "nextCursor"}.
+    The first page picks up new uploads first. Run types are overlaid when served.
+    """
+    if before is None:
+        refresh_store()
+    activities, next_cursor = strava_client.get_run_feed(count=count, before=before)
+    units = athlete_profile.get_units()
+    return {"activities": [a.to_json(units) for a in activities], "nextCursor": next_cursor}
+
+
+def feed_payload_name(before=None):
+    """shared_cache name of a published feed page (cursors are URL-safe base64)."""
+    return f"feed_{before}" if before else "feed"
+
+
+def build_week(goal):
+    """Current week from the daily mileage index; the goal is applied here, never cached."""
+    refresh_store()
+    return {**mileage.current_week(), "goalMi": goal}
+
+
+def home_cells(count=1, days=HOME_WINDOW_DAYS):
+    """Forecast cells of the athlete's most frequent run starts in the last `days`, busiest first."""
+    since = time.time() - days * 86400
+    starts = Counter(
+        weather_client.cell(*a["start_latlng"][:2]) for a in activity_store.runs()
+        if len(a.get("start_latlng") or []) >= 2 and activity_store.start_ts(a) >= since
+    )
+    return [cell for cell, _ in starts.most_common(count)]
+
+
+def build_weeks(count=PUBLISHED_WEEKS):
+    refresh_store()
+    return mileage.past_weeks(count=count)
+
+
+def coaching_context(settings):
+    """Live inputs for the coaching message (get_coaching_message keyword args)."""
+    goal = settings.get("goalMi", DEFAULT_WEEKLY_GOAL)
+
+    activities, _ = deadlines.run_section(lambda: strava_client.get_recent_activities(count=10), [])
+    apply_run_types(activities)
+
+    week, _ = deadlines.run_section(lambda: build_week(goal), {"weekDays": [], "totalMi": 0, "goalMi": goal})
+
+    # Profile — best effort
+    profile = None
+    try:
+        profile = athlete_profile.get_profile()
+    except Exception:
+        pass
+
+    # Training load — best effort, from the local store
+    load = None
+    try:
+        load = training_load.current()
+    except Exception:
+        pass
+
+    return {
+        "activities": activities,
+        "week_summary": week,
+        "weather": assistant_weather(),
+        "plan": settings.get("plan"),  # from settings if saved, else None
+        "profile": profile,
+        "goal_mi": goal,
+        "load": load,
+    }
+
+
+def assistant_weather():
+    """48h forecast for assistant context — best effort."""
+    try:
+        return weather_client.get_48h_forecast(location="concord")
+    except Exception:
+        return None
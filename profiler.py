@@ -0,0 +1,181 @@
+"""
+Sampling profiler for API requests.
+One background thread samples the stacks of in-flight request threads every
+SAMPLE_INTERVAL seconds (stdlib sys._current_frames — no tracing overhead on
+the request itself). Profiles are stored as collapsed stacks ("a;b;c 12"),
+the input format for flamegraph.pl and speedscope.
+
+Kept on disk in PROFILE_DIR:
+  - every explicitly requested profile (?__profile=1 or X-Profile: 1), last KEEP_REQUESTED
+  - the KEEP_SLOWEST slowest requests seen, recorded automatically
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+PROFILE_DIR = "profiles"
+INDEX_FILE = os.path.join(PROFILE_DIR, "index.json")
+SAMPLE_INTERVAL = 0.005   # 200 Hz
+KEEP_SLOWEST = 20
+KEEP_REQUESTED = 20
+
+_active = {}   # thread id -> Recording
+_lock = threading.Lock()
+_store_lock = threading.Lock()
+_sampler = None
+
+
+class Recording:
+    __slots__ = ("thread_id", "start", "stacks", "samples")
+
+    def __init__(self, thread_id):
+        self.thread_id = thread_id
+        self.start = time.perf_counter()
+        self.stacks = {}
+        self.samples = 0
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample_loop():
+    global _sampler
+    while True:
+        time.sleep(SAMPLE_INTERVAL)
+        with _lock:
+            if not _active:
+                _sampler = None
+                return
+            recordings = list(_active.values())
+        frames = sys._current_frames()
+        for rec in recordings:
+            frame = frames.get(rec.thread_id)
+            if frame is None:
+                continue
+            stack = _collapse(frame)
+            rec.stacks[stack] = rec.stacks.get(stack, 0) + 1
+            rec.samples += 1
+
+
+def start():
+    """Start sampling the current thread. Returns a Recording for stop()."""
+    global _sampler
+    rec = Recording(threading.get_ident())
+    with _lock:
+        _active[rec.thread_id] = rec
+        if _sampler is None:
+            _sampler = threading.Thread(target=_sample_loop, name="profiler", daemon=True)
+            _sampler.start()
+    return rec
+
+
+def stop(rec):
+    """Stop sampling. Returns elapsed seconds."""
+    with _lock:
+        _active.pop(rec.thread_id, None)
+    return time.perf_counter() - rec.start
+
+
+def folded(rec):
+    """Collapsed-stack text, one "frame;frame;frame count" line per unique stack."""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(rec.stacks.items()))
+
+
+# ---------------------------------------------------------------------------
+# Storage — rolling slowest + explicitly requested
+# ---------------------------------------------------------------------------
+def _load_index():
+    if os.path.exists(INDEX_FILE):
+        try:
+            with open(INDEX_FILE, "r") as f:
+                return json.load(f)
+        except (json.JSONDecodeError, IOError):
+            pass
+    return {"slowest": [], "requested": []}
+
+
+def _save_index(index):
+    tmp = f"{INDEX_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp, INDEX_FILE)
+
+
+def _profile_path(profile_id):
+    return os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+
+
+def keep(rec, elapsed, route, path, requested=False):
+    """
+    Store the profile if it was requested or is among the slowest seen.
+    Returns the profile id, or None if it wasn't kept.
+    """
+    with _store_lock:
+        return _keep(rec, elapsed, route, path, requested)
+
+
+def _keep(rec, elapsed, route, path, requested):
+    index = _load_index()
+    slowest = index["slowest"]
+    is_slow = len(slowest) < KEEP_SLOWEST or elapsed * 1000 > slowest[-1]["ms"]
+    if not requested and not is_slow:
+        return None
+
+    entry = {
+        "id": uuid.uuid4().hex[:12],
+        "route": route,
+        "path": path,
+        "ms": round(elapsed * 1000, 1),
+        "samples": rec.samples,
+        "at": int(time.time()),
+    }
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_profile_path(entry["id"]), "w") as f:
+        f.write(folded(rec))
+
+    evicted = []
+    if requested:
+        index["requested"].insert(0, entry)
+        evicted += index["requested"][KEEP_REQUESTED:]
+        index["requested"] = index["requested"][:KEEP_REQUESTED]
+    if is_slow:
+        slowest.append(entry)
+        slowest.sort(key=lambda e: e["ms"], reverse=True)
+        evicted += slowest[KEEP_SLOWEST:]
+        index["slowest"] = slowest[:KEEP_SLOWEST]
+
+    live = {e["id"] for e in index["slowest"] + index["requested"]}
+    for e in evicted:
+        if e["id"] not in live and os.path.exists(_profile_path(e["id"])):
+            os.remove(_profile_path(e["id"]))
+    _save_index(index)
+    return entry["id"]
+
+
+def list_profiles():
+    return _load_index()
+
+
+def get_profile(profile_id):
+    """Collapsed stacks for a stored profile, or None."""
+    if not profile_id.isalnum():
+        return None
+    path = _profile_path(profile_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return f.read()
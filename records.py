@@ -0,0 +1,203 @@
+"""
+Best-effort / personal-record engine.
+Finds the fastest 400 m, mile, 5K, 10K, half and marathon inside every run
+from its distance/time streams and keeps per-distance leaderboards.
+"""
+
+import heapq
+import json
+import os
+from bisect import bisect_left
+from datetime import datetime
+
+import activity_store
+import stream_store
+import tenancy
+from units import format_pace
+
+RECORDS_FILE = "records.json"
+LEADERBOARD_SIZE = 10
+
+# (label, meters) — matches Strava's best-effort names
+DISTANCES = (
+    ("400m", 400.0),
+    ("1 mile", 1609.34),
+    ("5K", 5000.0),
+    ("10K", 10000.0),
+    ("Half-Marathon", 21097.5),
+    ("Marathon", 42195.0),
+)
+
+# efforts: str(activity_id) -> {label: [seconds, start_offset_s]}
+# Activities with streams but no qualifying distance store {} so they aren't rescanned.
+_efforts = {}  # tenancy key -> (file mtime, efforts)
+
+
+def _load():
+    """The current athlete's efforts — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(RECORDS_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _efforts.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        efforts = {}
+        if mtime is not None:
+            with open(path, "r") as f:
+                efforts = json.load(f).get("efforts", {})
+        _efforts[key] = cached = (mtime, efforts)
+    return cached[1]
+
+
+def _save():
+    path = tenancy.path(RECORDS_FILE)
+    efforts = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": 1, "efforts": efforts}, f)
+    os.replace(tmp, path)
+    _efforts[tenancy.key()] = (os.stat(path).st_mtime, efforts)
+
+
+# ---------------------------------------------------------------------------
+# Sliding window
+# ---------------------------------------------------------------------------
+def _fastest(dist, time, target):
+    """
+    Fastest contiguous segment covering `target` meters — linear two-pointer.
+    For each end sample j, the start pointer i only moves forward, to the last
+    sample that still leaves `target` meters before j. The start time is
+    interpolated between i and i+1 so the segment is exactly `target` long.
+    Returns (seconds, start_time) or None if the run is too short.
+    """
+    n = len(dist)
+    if n < 2 or dist[-1] - dist[0] < target:
+        return None
+
+    best = None
+    best_elapsed = float("inf")
+    i = 0
+    for j in range(bisect_left(dist, dist[0] + target), n):
+        limit = dist[j] - target
+        while dist[i + 1] <= limit:
+            i += 1
+        end = time[j]
+        # The start lies between time[i] and time[i+1] — skip the
+        # interpolation when even the latest possible start can't win.
+        if end - time[i + 1] >= best_elapsed:
+            continue
+        d0, d1 = dist[i], dist[i + 1]
+        t0 = time[i]
+        start = t0 + (time[i + 1] - t0) * (limit - d0) / (d1 - d0) if d1 > d0 else t0
+        if end - start < best_elapsed:
+            best_elapsed = end - start
+            best = (best_elapsed, start)
+    return best
+
+
+def best_efforts(dist, time):
+    """Best effort per DISTANCES label for one run's streams."""
+    dist = dist.tolist() if hasattr(dist, "tolist") else dist
+    time = time.tolist() if hasattr(time, "tolist") else time
+    out = {}
+    for label, meters in DISTANCES:
+        hit = _fastest(dist, time, meters)
+        if hit is None:
+            break  # DISTANCES is ascending — longer ones won't fit either
+        out[label] = [round(hit[0], 1), round(hit[1])]
+    return out
+
+
+# ---------------------------------------------------------------------------
+# Incremental update
+# ---------------------------------------------------------------------------
+def _scan(activity_id):
+    streams = stream_store.open_streams(activity_id)
+    if streams is None:
+        return None
+    with streams:
+        if "distance" not in streams or "time" not in streams:
+            return {}
+        return best_efforts(streams["distance"], streams["time"])
+
+
+def update(activity_ids=None):
+    """
+    Compute efforts for runs that have streams but haven't been scanned.
+    Pass `activity_ids` to force a rescan of specific (e.g. edited) runs.
+    Returns the number of runs scanned.
+    """
+    stored = _load()
+    force = {str(i) for i in (activity_ids or [])}
+    scanned = 0
+    for a in activity_store.runs():
+        key = str(a["id"])
+        if key in stored and key not in force:
+            continue
+        efforts = _scan(a["id"])
+        if efforts is None:
+            continue  # streams not ingested yet — picked up on a later sync
+        stored[key] = efforts
+        scanned += 1
+    if scanned:
+        _save()
+    return scanned
+
+
+def remove(activity_id):
+    if _load().pop(str(activity_id), None) is not None:
+        _save()
+
+
+def rebuild():
+    """Drop all stored efforts and rescan every run with streams."""
+    _load().clear()
+    return update()
+
+
+# ---------------------------------------------------------------------------
+# Leaderboards
+# ---------------------------------------------------------------------------
+def format_clock(seconds):
+    """Format seconds to '1:23:45' or '19:42'."""
+    seconds = int(round(seconds))
+    hours, rem = divmod(seconds, 3600)
+    mins, secs = divmod(rem, 60)
+    if hours:
+        return f"{hours}:{mins:02d}:{secs:02d}"
+    return f"{mins}:{secs:02d}"
+
+
+def _format_day(start_date_local):
+    try:
+        return datetime.fromisoformat(start_date_local.replace("Z", "")).strftime("%b %-d, %Y")
+    except (ValueError, AttributeError):
+        return ""
+
+
+def get_records(limit=LEADERBOARD_SIZE, units="feet"):
+    """
+    Per-distance leaderboards, fastest first; paces per mile, or per km for
+    `units` "meters".
+    Returns { "records": [{ distance, meters, efforts: [...] }], "runsScanned": n }
+    """
+    stored = _load()
+    records = []
+    for label, meters in DISTANCES:
+        candidates = [
+            (e[label][0], key, e[label][1])
+            for key, e in stored.items() if label in e
+        ]
+        efforts = []
+        for seconds, key, offset in heapq.nsmallest(limit, candidates):
+            a = activity_store.get(key) or {}
+            efforts.append({
+                "id": int(key),
+                "title": a.get("name", "Run"),
+                "date": _format_day(a.get("start_date_local", "")),
+                "seconds": seconds,
+                "time": format_clock(seconds),
+                "pace": format_pace(meters / seconds if seconds else 0, units),
+                "startOffset": offset,
+            })
+        records.append({"distance": label, "meters": meters, "efforts": efforts})
+    return {"records": records, "runsScanned": len(stored)}
@@ -0,0 +1,202 @@
+"""
+Materialized run rollups — week, month and year tables of distance, time,
+elevation, run counts by run type and per-shoe distance.
+Each run's contribution is stored (like mileage.py), so sync, webhook events,
+imports and run-type edits adjust only the periods that run falls in, and a
+multi-year chart is a read of one small table — raw activities are never
+rescanned. The file is re-read when another process (the worker) rewrites it.
+"""
+
+import json
+import os
+from datetime import date, timedelta
+
+import activity_store
+import shared_cache
+import run_types
+import tenancy
+
+ROLLUPS_FILE = "rollups.json"
+GRAINS = ("week", "month", "year")
+UNTYPED = "Untyped"
+
+# contrib: str(activity_id) -> [date, meters, seconds, elevation m, run type, gear id]
+# week:    Monday date -> totals   month: "YYYY-MM" -> totals   year: "YYYY" -> totals
+# totals:  {meters, seconds, elevation, runs, types: {run type: runs}, shoes: {gear id: meters}}
+# built:   true once the whole store has been reconciled (an athlete with no runs has no contrib)
+_tables = {}  # tenancy key -> (file mtime, tables)
+
+
+def _empty():
+    return {"contrib": {}, **{grain: {} for grain in GRAINS}}
+
+
+def _load():
+    """The current athlete's tables — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(ROLLUPS_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _tables.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        tables = _empty()
+        if mtime is not None:
+            with open(path, "r") as f:
+                tables.update(json.load(f))
+        _tables[key] = cached = (mtime, tables)
+    return cached[1]
+
+
+def _save():
+    path = tenancy.path(ROLLUPS_FILE)
+    tables = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(tables, f)
+    os.replace(tmp, path)
+    _tables[tenancy.key()] = (os.stat(path).st_mtime, tables)
+
+
+def period_keys(day):
+    """(week, month, year) keys for an ISO date string."""
+    d = date.fromisoformat(day)
+    return (d - timedelta(days=d.weekday())).isoformat(), day[:7], day[:4]
+
+
+def _contribution(a, saved_types):
+    day = (a.get("start_date_local") or "")[:10]
+    if not day or not activity_store.is_run(a):
+        return None
+    return [
+        day,
+        round(a.get("distance") or 0, 1),
+        a.get("moving_time") or 0,
+        round(a.get("total_elevation_gain") or 0, 1),
+        run_types.resolve(a, saved_types) or UNTYPED,
+        a.get("gear_id"),
+    ]
+
+
+def _add(totals, key, amount):
+    totals[key] = round(totals.get(key, 0) + amount, 1)
+    if not totals[key]:
+        totals.pop(key)
+
+
+def _apply(tables, entry, sign):
+    day, meters, seconds, elevation, run_type, gear_id = entry
+    for grain, period in zip(GRAINS, period_keys(day)):
+        totals = tables[grain].setdefault(
+            period, {"meters": 0, "seconds": 0, "elevation": 0, "runs": 0, "types": {}, "shoes": {}})
+        totals["meters"] = round(totals["meters"] + sign * meters, 1)
+        totals["seconds"] += sign * seconds
+        totals["elevation"] = round(totals["elevation"] + sign * elevation, 1)
+        totals["runs"] += sign
+        _add(totals["types"], run_type, sign)
+        if gear_id:
+            _add(totals["shoes"], gear_id, sign * meters)
+        if not totals["runs"]:
+            tables[grain].pop(period)
+
+
+# ---------------------------------------------------------------------------
+# Incremental update
+# ---------------------------------------------------------------------------
+def update(activity_ids=None):
+    """
+    Apply new/changed/deleted activities (or changed run types) to the tables.
+    With no ids (or not built yet), reconciles the whole store.
+    Returns the number of activities whose contribution changed.
+    """
+    tables = _load()
+    contrib = tables["contrib"]
+    if activity_ids is None or not tables.get("built"):
+        keys = {str(a["id"]) for a in activity_store.all_activities()} | set(contrib)
+    else:
+        keys = {str(i) for i in activity_ids}
+
+    saved_types = run_types.load()
+    changed = 0
+    for key in keys:
+        a = activity_store.get(key)
+        new = _contribution(a, saved_types) if a else None
+        old = contrib.get(key)
+        if old == new:
+            continue
+        if old:
+            _apply(tables, old, -1)
+        if new:
+            _apply(tables, new, 1)
+            contrib[key] = new
+        else:
+            contrib.pop(key, None)
+        changed += 1
+
+    if changed or not tables.get("built"):
+        tables["built"] = True
+        _save()
+    return changed
+
+
+def _tables_ready():
+    tables = _load()
+    if not tables.get("built") and activity_store.count() and not shared_cache.read_only:
+        update()  # first use on an existing store (the worker's job when read-only)
+    return tables
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def get_rollups(grain, start=None, end=None):
+    """
+    One grain's periods in order, optionally limited to period keys in
+    [start, end] (e.g. "2024-01" … "2025-12" for months).
+    Returns [{period, meters, seconds, elevation, runs, types, shoes}].
+    """
+    table = _tables_ready()[grain]
+    return [
+        {"period": period, **table[period]}
+        for period in sorted(table)
+        if (start is None or period >= start) and (end is None or period <= end)
+    ]
+
+
+def _longest_run(year):
+    """(activity id, meters) of the year's longest run, from stored contributions."""
+    best = None
+    for key, (day, meters, *_rest) in _tables_ready()["contrib"].items():
+        if day.startswith(year) and (best is None or meters > best[1]):
+            best = (int(key), meters)
+    return best
+
+
+def year_in_review(year):
+    """
+    Totals for `year` with the change from the year before, biggest week and
+    month, runs by type, shoes by distance and the longest run. Weeks belong
+    to the ISO year of their Thursday, so the one holding Jan 1–3 counts
+    whenever most of it is in `year`. None if there were no runs that year.
+    """
+    tables = _tables_ready()
+    year = str(year)
+    totals = tables["year"].get(year)
+    if totals is None:
+        return None
+    previous = tables["year"].get(str(int(year) - 1))
+    weeks = {p: t for p, t in tables["week"].items()
+             if str((date.fromisoformat(p) + timedelta(days=3)).year) == year}
+    months = {p: t for p, t in tables["month"].items() if p.startswith(year)}
+    biggest_week = max(weeks, key=lambda p: weeks[p]["meters"]) if weeks else None
+    biggest_month = max(months, key=lambda p: months[p]["meters"])
+    longest = _longest_run(year)
+    return {
+        "year": int(year),
+        **{k: totals[k] for k in ("meters", "seconds", "elevation", "runs")},
+        "previousYear": {k: previous[k] for k in ("meters", "seconds", "elevation", "runs")} if previous else None,
+        "activeWeeks": len(weeks),
+        "biggestWeek": {"period": biggest_week, "meters": weeks[biggest_week]["meters"]} if biggest_week else None,
+        "biggestMonth": {"period": biggest_month, "meters": months[biggest_month]["meters"]},
+        "types": dict(sorted(totals["types"].items(), key=lambda t: -t[1])),
+        "shoes": dict(sorted(totals["shoes"].items(), key=lambda s: -s[1])),
+        "longestRun": {"id": longest[0], "meters": longest[1]} if longest else None,
+    }
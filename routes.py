@@ -0,0 +1,341 @@
+"""
+Repeated-route detection — groups runs that follow the same course into
+route clusters, with each route's history (best time, pace trend).
+Each route is simplified to ROUTE_POINTS points evenly spaced along its
+length. A new run is matched against clusters starting near its start (a
+grid index over start points), cheaply filtered on length and end point,
+and then compared with the discrete Fréchet distance; under MATCH_METERS it
+joins the closest cluster, otherwise it founds a new one. Like the other
+derived data, each run's polyline is remembered so edits and deletes only
+move that run. The file is re-read when another process (the worker) rewrites it.
+"""
+
+import json
+import math
+import os
+from collections import Counter
+
+import activity_store
+import shared_cache
+import tenancy
+from geo_utils import EARTH_RADIUS_M, decode_polyline, encode_polyline, haversine_m
+
+ROUTES_FILE = "routes.json"
+ROUTE_POINTS = 48           # points per simplified route
+MATCH_METERS = 150.0        # max Fréchet distance between runs of the same route
+LENGTH_TOLERANCE = 0.12     # routes more than 12% longer/shorter never match
+MIN_ROUTE_METERS = 400.0    # shorter routes (GPS glitches, treadmill drift) aren't clustered
+GRID_DEG = 0.01             # start-point grid cell, ~1 km
+TREND_MIN_RUNS = 3
+
+_M_PER_DEG = EARTH_RADIUS_M * math.pi / 180
+
+# routes:  route id -> {"points": [[lat, lng], ...] of the founding run, "length": meters}
+# members: str(activity_id) -> [route id or None (no usable route), polyline]
+# next_id: next route id (ids are never reused, so links to a route stay valid)
+# built:   true once the whole store has been reconciled (an athlete with no runs has no members)
+_data = {}  # tenancy key -> (file mtime, data, start grid)
+
+
+# ---------------------------------------------------------------------------
+# Persistence
+# ---------------------------------------------------------------------------
+def _cell(lat, lng):
+    return math.floor(lat / GRID_DEG), math.floor(lng / GRID_DEG)
+
+
+def _grid(routes):
+    grid = {}
+    for route_id, route in routes.items():
+        grid.setdefault(_cell(*route["points"][0]), set()).add(route_id)
+    return grid
+
+
+def _load():
+    """(data, start grid) for the current athlete — re-read if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(ROUTES_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _data.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        data = {"routes": {}, "members": {}, "next_id": 1}
+        if mtime is not None:
+            with open(path, "r") as f:
+                data.update(json.load(f))
+        _data[key] = cached = (mtime, data, _grid(data["routes"]))
+    return cached[1], cached[2]
+
+
+def _save():
+    path = tenancy.path(ROUTES_FILE)
+    data, grid = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    _data[tenancy.key()] = (os.stat(path).st_mtime, data, grid)
+
+
+# ---------------------------------------------------------------------------
+# Geometry
+# ---------------------------------------------------------------------------
+def simplify(polyline):
+    """
+    Polyline → (ROUTE_POINTS [lat, lng] points evenly spaced along it, length in m),
+    or None if it's missing, unreadable or shorter than MIN_ROUTE_METERS.
+    """
+    try:
+        points = decode_polyline(polyline)
+    except ValueError:
+        return None
+    if len(points) < 2:
+        return None
+    cumulative = [0.0]
+    for (lat1, lng1), (lat2, lng2) in zip(points, points[1:]):
+        cumulative.append(cumulative[-1] + haversine_m(lat1, lng1, lat2, lng2))
+    length = cumulative[-1]
+    if length < MIN_ROUTE_METERS:
+        return None
+    out, j = [], 0
+    for k in range(ROUTE_POINTS):
+        target = length * k / (ROUTE_POINTS - 1)
+        while j < len(points) - 2 and cumulative[j + 1] < target:
+            j += 1
+        span = cumulative[j + 1] - cumulative[j]
+        f = (target - cumulative[j]) / span if span else 0.0
+        (lat1, lng1), (lat2, lng2) = points[j], points[j + 1]
+        out.append([round(lat1 + (lat2 - lat1) * f, 6), round(lng1 + (lng2 - lng1) * f, 6)])
+    return out, round(length, 1)
+
+
+def _local(points, lat0):
+    """Degrees → meters on a plane through lat0 (fine across a city)."""
+    kx = _M_PER_DEG * math.cos(math.radians(lat0))
+    return [(lng * kx, lat * _M_PER_DEG) for lat, lng in points]
+
+
+def frechet(a, b, limit=math.inf):
+    """
+    Discrete Fréchet distance in meters between two [lat, lng] point lists.
+    Returns inf as soon as it's certain to exceed `limit`.
+    """
+    lat0 = a[0][0]
+    p, q = _local(a, lat0), _local(b, lat0)
+    limit_sq = limit * limit
+    prev = None
+    for i, (px, py) in enumerate(p):
+        row = []
+        for j, (qx, qy) in enumerate(q):
+            d = (px - qx) ** 2 + (py - qy) ** 2
+            if i == 0:
+                reach = row[j - 1] if j else d
+            elif j == 0:
+                reach = prev[0]
+            else:
+                reach = min(prev[j], prev[j - 1], row[j - 1])
+            row.append(d if d > reach else reach)
+        if min(row) > limit_sq:
+            return math.inf  # every coupling through this row is already too far
+        prev = row
+    return math.sqrt(prev[-1])
+
+
+# ---------------------------------------------------------------------------
+# Matching
+# ---------------------------------------------------------------------------
+def _candidates(grid, routes, points, length):
+    """Clusters that start within a cell of this run and pass the cheap filters."""
+    (lat, lng), end = points[0], points[-1]
+    row, col = _cell(lat, lng)
+    for dr in (-1, 0, 1):
+        for dc in (-1, 0, 1):
+            for route_id in grid.get((row + dr, col + dc), ()):
+                route = routes[route_id]
+                if abs(route["length"] - length) > LENGTH_TOLERANCE * max(length, route["length"]):
+                    continue
+                # The Fréchet distance is at least the start and end distances
+                if (haversine_m(lat, lng, *route["points"][0]) > MATCH_METERS
+                        or haversine_m(*end, *route["points"][-1]) > MATCH_METERS):
+                    continue
+                yield route_id
+
+
+def match(points, length):
+    """(route id, Fréchet distance in m) of the closest matching cluster, or (None, None)."""
+    data, grid = _load()
+    routes = data["routes"]
+    best, best_distance = None, MATCH_METERS
+    for route_id in _candidates(grid, routes, points, length):
+        distance = frechet(points, routes[route_id]["points"], best_distance)
+        if distance <= best_distance:
+            best, best_distance = route_id, distance
+    return (best, round(best_distance, 1)) if best else (None, None)
+
+
+def _route(a):
+    if a is None or not activity_store.is_run(a):
+        return None
+    return a.get("polyline") or None
+
+
+def _leave(data, grid, key):
+    """Remove a run from its cluster, dropping the cluster if it was the last."""
+    route_id = data["members"].pop(key)[0]
+    if route_id and not any(m[0] == route_id for m in data["members"].values()):
+        route = data["routes"].pop(route_id)
+        cell = grid.get(_cell(*route["points"][0]))
+        if cell:
+            cell.discard(route_id)
+
+
+def _join(data, grid, key, polyline):
+    simplified = simplify(polyline)
+    if simplified is None:
+        data["members"][key] = [None, polyline]  # no usable route — remembered so it isn't retried
+        return
+    route_id, _ = match(*simplified)
+    if route_id is None:
+        route_id = str(data["next_id"])
+        data["next_id"] += 1
+        points, length = simplified
+        data["routes"][route_id] = {"points": points, "length": length}
+        grid.setdefault(_cell(*points[0]), set()).add(route_id)
+    data["members"][key] = [route_id, polyline]
+
+
+# ---------------------------------------------------------------------------
+# Incremental update
+# ---------------------------------------------------------------------------
+def update(activity_ids=None):
+    """
+    Assign new/changed runs to route clusters and drop deleted ones.
+    With no ids (or not built yet), reconciles the whole store —
+    oldest first, so a route's shape is the first run on it.
+    Returns the number of activities whose assignment changed.
+    """
+    data, grid = _load()
+    members = data["members"]
+    if activity_ids is None or not data.get("built"):
+        keys = {str(a["id"]) for a in activity_store.all_activities()} | set(members)
+    else:
+        keys = {str(i) for i in activity_ids}
+
+    found = [(key, activity_store.get(key)) for key in keys]
+    found.sort(key=lambda item: activity_store.start_ts(item[1]) if item[1] else 0)
+    changed = 0
+    for key, a in found:
+        new = _route(a)
+        old = members.get(key)
+        if (old[1] if old else None) == new:
+            continue
+        if old:
+            _leave(data, grid, key)
+        if new:
+            _join(data, grid, key, new)
+        changed += 1
+
+    if changed or not data.get("built"):
+        data["built"] = True
+        _save()
+    return changed
+
+
+def _ready():
+    data, _ = _load()
+    if not data.get("built") and activity_store.count() and not shared_cache.read_only:
+        update()  # first use on an existing store (the worker's job when read-only)
+    return data
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def route_of(activity_id):
+    """Route cluster id of an activity, or None."""
+    data, _ = _load()
+    member = data["members"].get(str(activity_id))
+    return member[0] if member else None
+
+
+def _runs(data, route_id):
+    """The cluster's runs from the store, oldest first."""
+    runs = []
+    for key, (member_route, _) in data["members"].items():
+        if member_route == route_id:
+            a = activity_store.get(key)
+            if a:
+                runs.append(a)
+    runs.sort(key=activity_store.start_ts)
+    return runs
+
+
+def _pace(a):
+    """Seconds per km, or None."""
+    meters, seconds = a.get("distance") or 0, a.get("moving_time") or 0
+    return round(seconds / (meters / 1000), 1) if meters and seconds else None
+
+
+def _trend(runs):
+    """Least-squares pace change in seconds per km per 30 days (negative = faster)."""
+    samples = [(activity_store.start_ts(a) / 86400, _pace(a)) for a in runs]
+    samples = [(day, pace) for day, pace in samples if pace]
+    if len(samples) < TREND_MIN_RUNS:
+        return None
+    mean_day = sum(d for d, _ in samples) / len(samples)
+    mean_pace = sum(p for _, p in samples) / len(samples)
+    spread = sum((d - mean_day) ** 2 for d, _ in samples)
+    if not spread:
+        return None
+    slope = sum((d - mean_day) * (p - mean_pace) for d, p in samples) / spread
+    return round(slope * 30, 2)
+
+
+def _summary(data, route_id, runs):
+    route = data["routes"][route_id]
+    timed = [a for a in runs if a.get("moving_time")]
+    best = min(timed, key=lambda a: a["moving_time"]) if timed else None
+    names = Counter(a.get("name") for a in runs if a.get("name"))
+    return {
+        "id": route_id,
+        "name": names.most_common(1)[0][0] if names else None,
+        "runs": len(runs),
+        "length": route["length"],
+        "start": route["points"][0],
+        "polyline": encode_polyline(route["points"]),
+        "first": (runs[0].get("start_date_local") or "")[:10] if runs else None,
+        "last": (runs[-1].get("start_date_local") or "")[:10] if runs else None,
+        "best": {"id": best["id"], "date": (best.get("start_date_local") or "")[:10],
+                 "movingTime": best["moving_time"], "pace": _pace(best)} if best else None,
+        "paceTrend": _trend(runs),
+    }
+
+
+def list_routes(min_runs=2):
+    """Routes run at least `min_runs` times, most-run first."""
+    data = _ready()
+    counts = Counter(m[0] for m in data["members"].values() if m[0])
+    return [
+        _summary(data, route_id, _runs(data, route_id))
+        for route_id, n in counts.most_common()
+        if n >= min_runs and route_id in data["routes"]
+    ]
+
+
+def route_history(route_id):
+    """One route's summary plus every run on it (oldest first); None if unknown."""
+    data = _ready()
+    if route_id not in data["routes"]:
+        return None
+    runs = _runs(data, route_id)
+    return {
+        **_summary(data, route_id, runs),
+        "history": [{
+            "id": a["id"],
+            "name": a.get("name"),
+            "date": (a.get("start_date_local") or "")[:10],
+            "distance": a.get("distance"),
+            "movingTime": a.get("moving_time"),
+            "pace": _pace(a),
+            "averageHeartrate": a.get("average_heartrate"),
+        } for a in runs],
+    }
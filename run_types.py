@@ -0,0 +1,33 @@
+"""
+User-assigned run types (run_types.json, per athlete) — the RunTypePill
+choice overlaid on Strava's workout_type.
+"""
+
+import json
+import os
+
+import tenancy
+from models import map_run_type
+
+RUN_TYPES_FILE = "run_types.json"
+
+
+def load():
+    path = tenancy.path(RUN_TYPES_FILE)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def save(data):
+    with open(tenancy.path(RUN_TYPES_FILE), "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def resolve(a, saved):
+    """Run type for a stored activity: the user's choice, else Strava's workout_type."""
+    key = str(a["id"])
+    if key in saved:
+        return saved[key]
+    return map_run_type(a.get("workout_type"))
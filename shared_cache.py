@@ -0,0 +1,177 @@
+"""
+Shared, file-backed store of ready-to-serve API payloads.
+The background worker (worker.py) builds each athlete's dashboard payloads and
+publishes them here; read-only web workers serve them without touching an
+upstream. Per-athlete entries live in the athlete's directory (tenancy.path),
+app-wide ones (weather) in APP_DIR. Web workers ask for an early refresh by
+dropping a request file in WAKE_DIR, and note which athletes are active in
+SEEN_DIR (and which forecast cells are wanted in WEATHER_DIR) so the worker
+only keeps those payloads fresh.
+"""
+
+import json
+import os
+import threading
+import time
+
+import tenancy
+
+CACHE_DIR = "shared_cache"
+APP_DIR = os.path.join(CACHE_DIR, "app")
+WAKE_DIR = os.path.join(CACHE_DIR, "wake")
+SEEN_DIR = os.path.join(CACHE_DIR, "seen")
+WEATHER_DIR = os.path.join(CACHE_DIR, "weather_cells")
+SEEN_RESOLUTION = 60  # seconds — don't touch the seen file on every request
+LEGACY = "legacy"  # file name for the single-athlete install
+
+# Set by the read-only web (app.READ_ONLY): the stores it reads are the
+# worker's, so reads never write them — catching up on first use is left to the worker
+read_only = False
+
+# path -> (mtime, data, published_at) — re-read only when the worker rewrites a file
+_memo = {}
+_memo_lock = threading.Lock()
+_last_seen = {}  # tenancy key (or weather cell) -> last time this process touched its file
+
+
+def _path(name, shared):
+    directory = APP_DIR if shared else tenancy.path(CACHE_DIR)
+    return os.path.join(directory, f"{name}.json")
+
+
+def publish(name, data, shared=False):
+    """Store `data` as the current payload for `name` (atomic replace)."""
+    path = _path(name, shared)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"published_at": time.time(), "data": data}, f)
+    os.replace(tmp, path)
+
+
+def read(name, shared=False):
+    """(data, age_seconds) of the latest payload for `name`, or None if never published."""
+    path = _path(name, shared)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+    with _memo_lock:
+        memo = _memo.get(path)
+    if memo is None or memo[0] != mtime:
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            return None
+        memo = (mtime, entry["data"], entry["published_at"])
+        with _memo_lock:
+            _memo[path] = memo
+    return memo[1], time.time() - memo[2]
+
+
+# ---------------------------------------------------------------------------
+# Refresh requests (web → worker)
+# ---------------------------------------------------------------------------
+def _athlete_file(directory):
+    return os.path.join(directory, tenancy.current() or LEGACY)
+
+
+def _athlete_id(name):
+    return None if name == LEGACY else name
+
+
+def request_refresh(force=False, cursors=(), activities=(), retyped=()):
+    """
+    Ask the worker to rebuild the current athlete's payloads on its next poll,
+    plus the feed pages before any of `cursors`. `force` also drops the
+    worker's upstream caches for the athlete first; `activities` are ids from
+    webhook events for the worker to refetch before rebuilding; `retyped` are
+    ids whose run type the user changed, for the worker to re-roll up.
+    """
+    os.makedirs(WAKE_DIR, exist_ok=True)
+    path = _athlete_file(WAKE_DIR)
+    pending = {}  # nothing queued: never equal to `merged`, so even a bare request is written
+    try:
+        with open(path, "r") as f:
+            pending = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    merged = {
+        "force": pending.get("force", False) or force,
+        "cursors": sorted(set(pending.get("cursors", [])) | set(cursors)),
+        "activities": sorted(set(pending.get("activities", [])) | set(activities)),
+        "retyped": sorted(set(pending.get("retyped", [])) | set(retyped)),
+    }
+    if merged == pending:
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(merged, f)
+    os.replace(tmp, path)
+
+
+def take_refresh_requests():
+    """Pending requests as [(athlete_id or None, force, cursors, activities, retyped)], removing them."""
+    if not os.path.isdir(WAKE_DIR):
+        return []
+    pending = []
+    for name in os.listdir(WAKE_DIR):
+        if name != LEGACY and not name.isdigit():
+            continue
+        path = os.path.join(WAKE_DIR, name)
+        try:
+            with open(path, "r") as f:
+                request = json.load(f)
+            os.remove(path)
+        except (json.JSONDecodeError, IOError):
+            continue
+        pending.append((_athlete_id(name), request.get("force", False), request.get("cursors", []),
+                        request.get("activities", []), request.get("retyped", [])))
+    return pending
+
+
+def mark_seen():
+    """Note that the current athlete is using the dashboard."""
+    key, now = tenancy.key(), time.time()
+    if now - _last_seen.get(key, 0) < SEEN_RESOLUTION:
+        return
+    _last_seen[key] = now
+    os.makedirs(SEEN_DIR, exist_ok=True)
+    with open(_athlete_file(SEEN_DIR), "w") as f:
+        f.write(str(int(now)))
+
+
+def active_athletes(within):
+    """Athletes (None = legacy) seen in the last `within` seconds, most recent first."""
+    if not os.path.isdir(SEEN_DIR):
+        return []
+    seen = []
+    for name in os.listdir(SEEN_DIR):
+        mtime = os.stat(os.path.join(SEEN_DIR, name)).st_mtime
+        if time.time() - mtime <= within:
+            seen.append((mtime, _athlete_id(name)))
+    return [athlete_id for _, athlete_id in sorted(seen, key=lambda s: -s[0])]
+
+
+def want_weather(cell):
+    """Note that someone is looking at the forecast for `cell` (weather_client.cell)."""
+    key, now = f"weather:{cell}", time.time()
+    if now - _last_seen.get(key, 0) < SEEN_RESOLUTION:
+        return
+    _last_seen[key] = now
+    os.makedirs(WEATHER_DIR, exist_ok=True)
+    with open(os.path.join(WEATHER_DIR, cell), "w") as f:
+        f.write(str(int(now)))
+
+
+def wanted_weather(within):
+    """Forecast cells wanted in the last `within` seconds, most recent first."""
+    if not os.path.isdir(WEATHER_DIR):
+        return []
+    wanted = []
+    for name in os.listdir(WEATHER_DIR):
+        mtime = os.stat(os.path.join(WEATHER_DIR, name)).st_mtime
+        if time.time() - mtime <= within:
+            wanted.append((mtime, name))
+    return [cell for _, cell in sorted(wanted, key=lambda w: -w[0])]
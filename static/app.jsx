@@ -252,6 +252,7 @@ function _finishIcon(size) {
 
 const OSM_TILE = "https://cartodb-basemaps-{s}.global.ssl.fastly.net/rastertiles/voyager/{z}/{x}/{y}.png";
 const SAT_TILE = "https://server.arcgisonline.com/ArcGIS/rest/services/World_Imagery/MapServer/tile/{z}/{y}/{x}";
+const HEAT_TILE = "/tiles/heat/{z}/{x}/{y}.png"; // every run's route, rasterized server-side
 const ROUTE_COLOR = "#FC4C02";
 
 // ---------------------------------------------------------------------------
@@ -304,11 +305,13 @@ function RouteMap({ polyline, t, width, height, interactive, onExpand }) {
 // ---------------------------------------------------------------------------
 // MapModal — fullscreen interactive map with tile toggle
 // ---------------------------------------------------------------------------
-function MapModal({ polyline, accent, t, onClose }) {
+function MapModal({ polyline, accent, t, onClose, heatmap }) {
   const ref = useRef(null);
   const mapRef = useRef(null);
   const [satellite, setSatellite] = useState(false);
+  const [showHeat, setShowHeat] = useState(false);
   const tileRef = useRef(null);
+  const heatRef = useRef(null);
 
   useEffect(() => {
     if (!ref.current || !polyline || typeof L === "undefined") return;
@@ -328,6 +331,8 @@ function MapModal({ polyline, accent, t, onClose }) {
     mapRef.current = map;
 
     tileRef.current = L.tileLayer(satellite ? SAT_TILE : OSM_TILE, { maxZoom: 19 }).addTo(map);
+    heatRef.current = L.tileLayer(HEAT_TILE, { maxZoom: 19, minNativeZoom: 6, maxNativeZoom: 16, opacity: 0.85 });
+    if (showHeat) heatRef.current.addTo(map);
 
     L.polyline(points, { color: ROUTE_COLOR, weight: 4, opacity: 0.95 }).addTo(map);
     // Finish marker first (checkered) — so start marker renders on top
@@ -347,12 +352,20 @@ function MapModal({ polyline, accent, t, onClose }) {
     tileRef.current.setUrl(satellite ? SAT_TILE : OSM_TILE);
   }, [satellite]);
 
+  // Toggle heatmap overlay
+  useEffect(() => {
+    if (!mapRef.current || !heatRef.current) return;
+    if (showHeat) heatRef.current.addTo(mapRef.current);
+    else heatRef.current.remove();
+  }, [showHeat]);
+
   return <div style={{ position: "fixed", top: 0, left: 0, right: 0, bottom: 0, background: "rgba(0,0,0,0.82)", display: "flex", alignItems: "center", justifyContent: "center", zIndex: 2000, backdropFilter: "blur(6px)" }} onClick={onClose}>
     <div onClick={e => e.stopPropagation()} style={{ background: t.card, borderRadius: 16, padding: 16, width: "min(94vw,1040px)", border: `1px solid ${t.border}`, boxShadow: "0 24px 64px rgba(0,0,0,0.7)" }}>
       <div style={{ display: "flex", justifyContent: "space-between", alignItems: "center", marginBottom: 12 }}>
         <div style={{ display: "flex", gap: 6 }}>
           <button onClick={() => setSatellite(false)} style={{ padding: "5px 14px", borderRadius: 8, border: `1px solid ${t.border}`, background: !satellite ? accent : "transparent", color: !satellite ? "#fff" : t.dim, fontSize: 13, cursor: "pointer", fontWeight: 600, fontFamily: fontStack }}>Standard</button>
           <button onClick={() => setSatellite(true)} style={{ padding: "5px 14px", borderRadius: 8, border: `1px solid ${t.border}`, background: satellite ? accent : "transparent", color: satellite ? "#fff" : t.dim, fontSize: 13, cursor: "pointer", fontWeight: 600, fontFamily: fontStack }}>Satellite</button>
+          {heatmap && <button onClick={() => setShowHeat(h => !h)} style={{ padding: "5px 14px", borderRadius: 8, border: `1px solid ${t.border}`, background: showHeat ? accent : "transparent", color: showHeat ? "#fff" : t.dim, fontSize: 13, cursor: "pointer", fontWeight: 600, fontFamily: fontStack }}>Heatmap</button>}
         </div>
         <button onClick={onClose} style={{ background: "none", border: "none", color: t.dim, fontSize: 22, cursor: "pointer", padding: "0 4px", fontFamily: fontStack, lineHeight: 1 }}>✕</button>
       </div>
@@ -363,6 +376,7 @@ function MapModal({ polyline, accent, t, onClose }) {
   </div>;
 }
 
+const REPLAY = window.__REPLAY__===true; // demo backed by a recorded upstream snapshot
 const APP_MODE = (()=>{const p=new URLSearchParams(window.location.search).get("mode");return(p==="personal"||p==="demo"||p==="development")?p:(window.__APP_MODE__||"development");})();
 
 function App(){
@@ -412,7 +426,7 @@ function App(){
   const [loadingActivities,setLoadingActivities]=useState(false);
   const [loadingWeeks,setLoadingWeeks]=useState(false);
   const [apiError,setApiError]=useState(null);
-  const [actPage,setActPage]=useState(1);
+  const [actCursor,setActCursor]=useState(null);
   const [loadingMore,setLoadingMore]=useState(false);
   const [hasMore,setHasMore]=useState(true);
   const [liveWeather,setLiveWeather]=useState(null);
@@ -420,11 +434,12 @@ function App(){
   const [assistantMsg,setAssistantMsg]=useState(null);
   const [loadingAssistant,setLoadingAssistant]=useState(false);
   const [mounted,setMounted]=useState(false);
+  const sampleData=demoMode&&!REPLAY; // hardcoded arrays only when there's no snapshot to replay
   useEffect(()=>{const id=setTimeout(()=>setMounted(true),100);return()=>clearTimeout(id);},[]);
 
-  // Fetch live data when switching to live mode
+  // Fetch live data when switching to live mode (or replaying a snapshot)
   useEffect(()=>{
-    if(demoMode)return;
+    if(sampleData)return;
     setApiError(null);
     fetch("/api/status").then(r=>r.json()).then(d=>{setConnected(d.connected);if(d.settings&&d.settings.favoriteShoes)setFavoriteShoes(d.settings.favoriteShoes);}).catch(()=>setConnected(false)).finally(()=>setStatusChecked(true));
     setLoadingProfile(true);
@@ -434,7 +449,7 @@ function App(){
       .finally(()=>setLoadingProfile(false));
     setLoadingActivities(true);
     fetch("/api/activities").then(r=>{if(!r.ok)throw new Error(r.status);return r.json();})
-      .then(d=>{if(d.error)throw new Error(d.error);setLiveActivities(d.activities);setLiveWeekDays(d.weekDays);setLiveTotalMi(d.totalMi);setLiveGoalMi(d.goalMi);if(d.vo2!=null)setVo2(d.vo2);})
+      .then(d=>{if(d.error)throw new Error(d.error);setLiveActivities(d.activities);setActCursor(d.nextCursor||null);setHasMore(!!d.nextCursor);setLiveWeekDays(d.weekDays);setLiveTotalMi(d.totalMi);setLiveGoalMi(d.goalMi);if(d.vo2!=null)setVo2(d.vo2);})
       .catch(e=>setApiError(p=>(p?p+"; ":"")+"Activities: "+e.message))
       .finally(()=>setLoadingActivities(false));
     setLoadingWeeks(true);
@@ -446,27 +461,27 @@ function App(){
 
   // Sync activities state when mode or live data changes
   useEffect(()=>{
-    if(demoMode){setActs(ACTIVITIES);setActPage(1);setHasMore(true);}
+    if(sampleData){setActs(ACTIVITIES);setActCursor(null);setHasMore(true);}
     else if(liveActivities)setActs(liveActivities);
   },[demoMode,liveActivities]);
 
-  // Infinite scroll — load more activities
+  // Infinite scroll — load more activities (cursor = where the last page ended)
   const loadMoreActivities=useCallback(()=>{
-    if(demoMode||loadingMore||!hasMore)return;
-    const nextPage=actPage+1;
+    if(demoMode||loadingMore||!hasMore||!actCursor)return;
     setLoadingMore(true);
-    fetch(`/api/activities?page=${nextPage}`).then(r=>{if(!r.ok)throw new Error(r.status);return r.json();})
+    fetch(`/api/activities?before=${encodeURIComponent(actCursor)}`).then(r=>{if(!r.ok)throw new Error(r.status);return r.json();})
       .then(d=>{
         if(d.error)throw new Error(d.error);
         const newActs=d.activities||[];
-        if(newActs.length===0){setHasMore(false);return;}
+        // Page not ready yet (background worker) — keep the cursor, the next scroll retries
+        if(newActs.length===0&&d.partial&&d.partial.activities)return;
         setActs(prev=>{const ids=new Set(prev.map(a=>a.id));const unique=newActs.filter(a=>!ids.has(a.id));return[...prev,...unique];});
-        setActPage(nextPage);
-        if(newActs.length<10)setHasMore(false);
+        setActCursor(d.nextCursor||null);
+        setHasMore(!!d.nextCursor);
       })
       .catch(e=>setApiError(p=>(p?p+"; ":"")+"Load more: "+e.message))
       .finally(()=>setLoadingMore(false));
-  },[demoMode,loadingMore,hasMore,actPage]);
+  },[demoMode,loadingMore,hasMore,actCursor]);
 
   // Scroll listener for infinite scroll
   useEffect(()=>{
@@ -483,12 +498,17 @@ function App(){
   // Fetch weather (both demo + live — live weather enhances demo too)
   // Refreshes every 30 min to stay current with backend cache TTL
   useEffect(()=>{
+    const load=query=>fetch(`/api/weather?${query}`).then(r=>{if(!r.ok)throw new Error(r.status);return r.json();})
+      .then(d=>{if(d.error)throw new Error(d.error);setLiveWeather(d.hours);})
+      .catch(()=>{setLiveWeather(null);})
+      .finally(()=>setLoadingWeather(false));
     const fetchWeather=()=>{
       setLoadingWeather(true);
-      fetch(`/api/weather?location=${loc.toLowerCase()}`).then(r=>{if(!r.ok)throw new Error(r.status);return r.json();})
-        .then(d=>{if(d.error)throw new Error(d.error);setLiveWeather(d.hours);})
-        .catch(()=>{setLiveWeather(null);})
-        .finally(()=>setLoadingWeather(false));
+      // "Here" = the browser's location, rounded — the server snaps it to a ~5 km cell anyway
+      if(loc==="Here")navigator.geolocation.getCurrentPosition(
+        p=>load(`lat=${p.coords.latitude.toFixed(2)}&lon=${p.coords.longitude.toFixed(2)}`),
+        ()=>setLoc("Concord"),{maximumAge:30*60*1000,timeout:10000});
+      else load(`location=${loc.toLowerCase()}`);
     };
     fetchWeather();
     const interval=setInterval(fetchWeather,30*60*1000);
@@ -511,14 +531,14 @@ function App(){
   const isLight=["stravaLight","oceanLight","forestLight","minimalGray"].includes(themeKey);
   const accent=t.accent;
   const accent2=t.accent2||t.accent;
-  const totalMi=demoMode?26.2:liveTotalMi, goalMi=demoMode?(liveGoalMi||50):liveGoalMi;
-  const resolvedWeekDays=demoMode?WEEK_DAYS:(liveWeekDays||WEEK_DAYS);
-  const resolvedPastWeeks=demoMode?PAST_WEEKS:(livePastWeeks||PAST_WEEKS);
-  const resolvedShoes=demoMode?ALL_SHOES:(liveProfile?liveProfile.shoes:ALL_SHOES);
-  const resolvedName=demoMode?"DJ Run":(liveProfile?liveProfile.name:"\u2014");
-  const resolvedLocation=demoMode?"Concord, CA":(liveProfile?[liveProfile.city,liveProfile.state].filter(Boolean).join(", "):"\u2014");
-  const resolvedYtdMiles=demoMode?198.7:(liveProfile?liveProfile.ytd_miles:0);
-  const resolvedAvatar=demoMode?null:(liveProfile?liveProfile.avatar:null);
+  const totalMi=sampleData?26.2:liveTotalMi, goalMi=sampleData?(liveGoalMi||50):liveGoalMi;
+  const resolvedWeekDays=sampleData?WEEK_DAYS:(liveWeekDays||WEEK_DAYS);
+  const resolvedPastWeeks=sampleData?PAST_WEEKS:(livePastWeeks||PAST_WEEKS);
+  const resolvedShoes=sampleData?ALL_SHOES:(liveProfile?liveProfile.shoes:ALL_SHOES);
+  const resolvedName=sampleData?"DJ Run":(liveProfile?liveProfile.name:"\u2014");
+  const resolvedLocation=sampleData?"Concord, CA":(liveProfile?[liveProfile.city,liveProfile.state].filter(Boolean).join(", "):"\u2014");
+  const resolvedYtdMiles=sampleData?198.7:(liveProfile?liveProfile.ytd_miles:0);
+  const resolvedAvatar=sampleData?null:(liveProfile?liveProfile.avatar:null);
   const resolvedWeather=liveWeather||WEATHER;
 
   // Current week boundaries (shared by plan counts + RunTypePill rules)
@@ -710,7 +730,7 @@ function App(){
 
         {/* Demo info banner */}
         {demoMode&&!demoBannerDismissed&&<div style={{...anim(0),background:accent+"0c",border:`1px solid ${accent}20`,borderRadius:10,padding:"10px 14px",display:"flex",alignItems:"flex-start",gap:10}}>
-          <div style={{fontSize:14,color:t.text,lineHeight:1.5,flex:1,opacity:0.85}}>This is an interactive demo. Activities, profile, and shoes are sample data. The full version connects to Strava API for real-time running data, with live weather (OpenWeatherMap), AI coaching (Claude API), and fitness metrics synced from Garmin.</div>
+          <div style={{fontSize:14,color:t.text,lineHeight:1.5,flex:1,opacity:0.85}}>This is an interactive demo. Activities, profile, and shoes are {REPLAY?"a recorded snapshot of real data":"sample data"}. The full version connects to Strava API for real-time running data, with live weather (OpenWeatherMap), AI coaching (Claude API), and fitness metrics synced from Garmin.</div>
           <button onClick={()=>setDemoBannerDismissed(true)} style={{background:"none",border:"none",color:t.dim,fontSize:15,cursor:"pointer",padding:"0 2px",fontFamily:fontStack,lineHeight:1,flexShrink:0}}>✕</button>
         </div>}
 
@@ -723,7 +743,7 @@ function App(){
         </div>}</div>
 
         {/* Weekly Goal */}
-        <div style={anim(200)}>{!demoMode&&loadingActivities?<LoadingCard t={t} rows={5} label="WEEKLY GOAL"/>:<div className="card-hover" style={crd}>
+        <div style={anim(200)}>{!sampleData&&loadingActivities?<LoadingCard t={t} rows={5} label="WEEKLY GOAL"/>:<div className="card-hover" style={crd}>
           <div style={{display:"flex",justifyContent:"space-between",alignItems:"center",marginBottom:14}}>
             <div style={{display:"flex",alignItems:"center",gap:8}}>
               <span style={lbl}>WEEKLY GOAL</span>
@@ -752,7 +772,7 @@ function App(){
             </button>
           </div>
 
-          {showMore&&(!demoMode&&loadingWeeks?<LoadingCard t={t} rows={3} label="PAST WEEKS"/>:resolvedPastWeeks.map((w,i)=><div key={i} className="item-hover" style={{marginTop:i===0?16:0,padding:"14px 0",borderTop:`1px solid ${t.border}`,borderRadius:8}}>
+          {showMore&&(!sampleData&&loadingWeeks?<LoadingCard t={t} rows={3} label="PAST WEEKS"/>:resolvedPastWeeks.map((w,i)=><div key={i} className="item-hover" style={{marginTop:i===0?16:0,padding:"14px 0",borderTop:`1px solid ${t.border}`,borderRadius:8}}>
             <div style={{display:"flex",justifyContent:"space-between",marginBottom:10}}>
               <span style={{fontSize:16,fontWeight:600}}>{w.label}</span>
               <span style={{fontSize:15,color:t.dim,fontWeight:500}}>{w.miles} mi · {w.time}</span>
@@ -768,7 +788,7 @@ function App(){
         </div>}</div>
 
         {/* Activity Feed */}
-        <div ref={activitiesRef} style={anim(300)}>{!demoMode&&loadingActivities?<LoadingCard t={t} rows={5} label="RECENT ACTIVITIES"/>:<div>
+        <div ref={activitiesRef} style={anim(300)}>{!sampleData&&loadingActivities?<LoadingCard t={t} rows={5} label="RECENT ACTIVITIES"/>:<div>
           <div style={{...lbl,marginBottom:14}}>RECENT ACTIVITIES</div>
           <div style={{display:"flex",flexDirection:"column",gap:14}}>
             {acts.map(a=><div key={a.id} className="card-hover" style={{...crd}}>
@@ -806,19 +826,21 @@ function App(){
                     <div style={{...lbl,marginBottom:10}}>SPLITS</div>
                     <div style={{fontSize:15,paddingRight:20}}>
                       <div style={{display:"flex",padding:"6px 0",borderBottom:`1px solid ${t.border}`,fontWeight:600,color:t.dim}}>
-                        <span style={{width:40}}>Mile</span><span style={{width:80}}>Pace</span><span style={{width:70,textAlign:"right"}}>Elevation</span>
+                        <span style={{width:40}}>{a.units==="meters"?"Km":"Mile"}</span><span style={{width:80}}>Pace</span><span style={{width:70,textAlign:"right"}}>Elevation</span>
                       </div>
                       <div className="splits-scroll" style={{maxHeight:264,overflowY:(a.splits||[]).length>8?"auto":"visible",scrollbarWidth:"thin",scrollbarColor:`${t.border} transparent`}}>
                         {(a.splits||[]).map((s,si)=>{
+                          const metric=a.units==="meters";
+                          const unitM=metric?1000:1609.34;
                           const isLast=si===(a.splits||[]).length-1;
-                          const isPartial=s.dist&&s.dist<1500&&isLast;
+                          const isPartial=s.dist&&s.dist<unitM*0.93&&isLast;
                           // Hide GPS noise: final split < 0.1 mi (~161m)
                           if(isLast&&s.dist&&s.dist<161)return null;
-                          const partialMi=isPartial?((s.dist||0)*0.000621371).toFixed(2):null;
-                          const partialPace=isPartial&&s.moving_time&&s.dist?(()=>{const spm=1609.34/(s.dist/s.moving_time);const m=Math.floor(spm/60);const sc=Math.floor(spm%60);return`${m}:${sc<10?"0":""}${sc}`;})():null;
+                          const partialMi=isPartial?((s.dist||0)/unitM).toFixed(2):null;
+                          const partialPace=isPartial&&s.moving_time&&s.dist?(()=>{const spm=unitM/(s.dist/s.moving_time);const m=Math.floor(spm/60);const sc=Math.floor(spm%60);return`${m}:${sc<10?"0":""}${sc}`;})():null;
                           return <div key={s.m} style={{display:"flex",padding:"6px 0",borderBottom:`1px solid ${t.border}18`,opacity:isPartial?0.6:1}}>
                             <span style={{width:40,color:t.dim,fontStyle:isPartial?"italic":"normal"}}>{isPartial?partialMi:s.m}</span>
-                            <span style={{width:80,fontWeight:500,fontStyle:isPartial?"italic":"normal"}}>{isPartial&&partialPace?partialPace:(s.p||"\u2014")} /mi</span>
+                            <span style={{width:80,fontWeight:500,fontStyle:isPartial?"italic":"normal"}}>{isPartial&&partialPace?partialPace:(s.p||"\u2014")} {metric?"/km":"/mi"}</span>
                             <span style={{width:70,textAlign:"right",color:t.dim}}>{s.e||"\u2014"}</span>
                           </div>;
                         })}
@@ -904,7 +926,7 @@ function App(){
           <div style={{display:"flex",justifyContent:"space-between",alignItems:"center",marginBottom:14}}>
             <div style={lbl}>WEATHER</div>
             <div style={{display:"flex",borderRadius:8,overflow:"hidden",border:`1px solid ${t.border}`}}>
-              {["Concord","Danville"].map(l=><button key={l} onClick={()=>setLoc(l)} style={{background:loc===l?accent:"transparent",color:loc===l?"#fff":t.dim,border:"none",padding:"5px 14px",fontSize:13,cursor:"pointer",fontWeight:600,fontFamily:fontStack,transition:"all 0.2s"}}>{l}</button>)}
+              {[...(demoMode?[]:["Home"]),"Concord","Danville",...(navigator.geolocation?["Here"]:[])].map(l=><button key={l} onClick={()=>setLoc(l)} style={{background:loc===l?accent:"transparent",color:loc===l?"#fff":t.dim,border:"none",padding:"5px 14px",fontSize:13,cursor:"pointer",fontWeight:600,fontFamily:fontStack,transition:"all 0.2s"}}>{l}</button>)}
             </div>
           </div>
           {!demoMode&&loadingWeather?<LoadingCard t={t} rows={4} label="Loading forecast..."/>:<div style={{position:"relative"}}>
@@ -1026,7 +1048,7 @@ function App(){
     </div>}
 
     {/* Map Modal */}
-    {mapModal&&<MapModal polyline={mapModal} accent={accent} t={t} onClose={()=>setMapModal(null)}/>}
+    {mapModal&&<MapModal polyline={mapModal} accent={accent} t={t} heatmap={!demoMode} onClose={()=>setMapModal(null)}/>}
 
     {/* Notes Edit Modal */}
     {showNotesModal&&<div style={{position:"fixed",top:0,left:0,right:0,bottom:0,background:"rgba(0,0,0,0.75)",display:"flex",alignItems:"center",justifyContent:"center",zIndex:1000,backdropFilter:"blur(4px)"}} onClick={()=>{setShowNotesModal(false);setNotesModalAdd(false);setEditingNoteId(null);setConfirmDeleteId(null);}}>
@@ -1,40 +1,56 @@
 """
 Strava API client with data transforms.
-All public functions return data shaped to match the wireframe's constants.
+Public functions return data shaped to match the wireframe's constants;
+activity details are typed Activity records (see models.py), formatted at the JSON boundary.
 """
 
 import time
 import json
 import os
-import requests
-from datetime import datetime, timedelta
+import activity_store
+import deadlines
+import http_client
+import metrics
+import tenancy
+import tracing
 from config import (
     STRAVA_CLIENT_ID, STRAVA_CLIENT_SECRET, STRAVA_TOKEN_URL,
-    STRAVA_API_BASE, DEFAULT_SHOE_MAX_MILES, CACHE_TTL_SECONDS
+    STRAVA_API_BASE, NOMINATIM_URL, CACHE_TTL_SECONDS
 )
+from models import Activity
 
 # ---------------------------------------------------------------------------
-# Token storage (file-based — fine for single-user personal app)
+# Token storage (one file per athlete — see tenancy.py)
 # ---------------------------------------------------------------------------
 TOKEN_FILE = "tokens.json"
 
 
 def save_tokens(token_data):
-    """Persist tokens to disk."""
-    with open(TOKEN_FILE, "w") as f:
+    """Persist the current athlete's tokens to disk."""
+    with open(tenancy.path(TOKEN_FILE), "w") as f:
         json.dump(token_data, f)
 
 
 def load_tokens():
-    """Load tokens from disk. Returns None if not found."""
-    if not os.path.exists(TOKEN_FILE):
+    """Load the current athlete's tokens from disk. Returns None if not found."""
+    path = tenancy.path(TOKEN_FILE)
+    if not os.path.exists(path):
         return None
-    with open(TOKEN_FILE, "r") as f:
+    with open(path, "r") as f:
         return json.load(f)
 
 
+def delete_tokens():
+    path = tenancy.path(TOKEN_FILE)
+    if os.path.exists(path):
+        os.remove(path)
+
+
 def get_valid_token():
     """Return a valid access token, refreshing if expired. Returns None if not authed."""
+    if http_client.replaying():
+        return "replay"  # every call is answered from the snapshot
+
     tokens = load_tokens()
     if not tokens:
         return None
@@ -42,7 +58,7 @@ def get_valid_token():
     # Refresh if expired (with 60s buffer)
     if tokens.get("expires_at", 0) < time.time() + 60:
         try:
-            resp = requests.post(STRAVA_TOKEN_URL, data={
+            resp = http_client.post(http_client.STRAVA, STRAVA_TOKEN_URL, data={
                 "client_id": STRAVA_CLIENT_ID,
                 "client_secret": STRAVA_CLIENT_SECRET,
                 "grant_type": "refresh_token",
@@ -58,32 +74,62 @@ def get_valid_token():
             })
             save_tokens(tokens)
         except Exception as e:
+            # Keep going with the old token: if Strava is down, reads can still
+            # be answered from last-known-good; if it's up, it'll reject with 401
             print(f"Token refresh failed: {e}")
-            return None
 
     return tokens["access_token"]
 
 
 # ---------------------------------------------------------------------------
-# Simple in-memory cache
+# Simple in-memory cache, namespaced per athlete
 # ---------------------------------------------------------------------------
-_cache = {}
+_cache = {}  # (tenancy key, key) -> {data, ts}
 
 
 def cached(key, ttl=CACHE_TTL_SECONDS):
     """Decorator-style cache check. Returns (hit, data)."""
-    entry = _cache.get(key)
-    if entry and time.time() - entry["ts"] < ttl:
+    entry = _cache.get((tenancy.key(), key))
+    hit = bool(entry) and time.time() - entry["ts"] < ttl
+    metrics.cache_lookup("strava", hit)
+    tracing.event("cache", cache="strava", key=key, outcome="hit" if hit else "miss")
+    if hit:
         return True, entry["data"]
     return False, None
 
 
 def cache_set(key, data):
-    _cache[key] = {"data": data, "ts": time.time()}
+    _cache[(tenancy.key(), key)] = {"data": data, "ts": time.time()}
+
+
+def cached_at(key):
+    """When `key` was last cached for the current athlete (0 if never)."""
+    entry = _cache.get((tenancy.key(), key))
+    return entry["ts"] if entry else 0
 
 
 def cache_clear():
-    _cache.clear()
+    """Drop the current athlete's cached entries."""
+    namespace = tenancy.key()
+    for k in [k for k in list(_cache) if k[0] == namespace]:
+        del _cache[k]
+
+
+def cache_drop(key):
+    """Forget one of the current athlete's cached entries."""
+    _cache.pop((tenancy.key(), key), None)
+
+
+def _stale(key, exc):
+    """
+    Out-of-budget fallback: the last cached value for `key` regardless of age,
+    marking the response section partial. Re-raises `exc` if nothing is cached.
+    """
+    entry = _cache.get((tenancy.key(), key))
+    if entry is None:
+        raise exc
+    deadlines.mark_partial()
+    return entry["data"]
 
 
 # ---------------------------------------------------------------------------
@@ -94,7 +140,8 @@ def _api_get(endpoint, params=None):
     token = get_valid_token()
     if not token:
         raise Exception("Not authenticated with Strava")
-    resp = requests.get(
+    resp = http_client.get(
+        http_client.STRAVA,
         f"{STRAVA_API_BASE}{endpoint}",
         headers={"Authorization": f"Bearer {token}"},
         params=params or {},
@@ -126,16 +173,23 @@ def _save_geo_cache():
 _load_geo_cache()
 
 
+def _geo_key(lat, lng):
+    # Round to 3 decimals (~111m) to deduplicate nearby starts
+    return f"{round(lat, 3)},{round(lng, 3)}"
+
+
 def reverse_geocode(lat, lng):
     """Reverse geocode lat/lng to 'City, State' string via Nominatim."""
-    # Round to 3 decimals (~111m) to deduplicate nearby starts
-    key = f"{round(lat, 3)},{round(lng, 3)}"
+    key = _geo_key(lat, lng)
+    metrics.cache_lookup("geocode", key in _geo_cache)
+    tracing.event("cache", cache="geocode", key=key, outcome="hit" if key in _geo_cache else "miss")
     if key in _geo_cache:
         return _geo_cache[key]
 
     try:
-        resp = requests.get(
-            "https://nominatim.openstreetmap.org/reverse",
+        resp = http_client.get(
+            http_client.NOMINATIM,
+            f"{NOMINATIM_URL}/reverse",
             params={"lat": lat, "lon": lng, "format": "json", "zoom": 10},
             headers={"User-Agent": "RunningDashboard/1.0"},
             timeout=5,
@@ -146,6 +200,8 @@ def reverse_geocode(lat, lng):
         city = addr.get("city") or addr.get("town") or addr.get("village") or ""
         state = addr.get("state", "")
         result = ", ".join(filter(None, [city, state])) or None
+    except deadlines.DeadlineExceeded:
+        return None  # out of time — don't remember this as "no city"
     except Exception:
         result = None
 
@@ -154,137 +210,9 @@ def reverse_geocode(lat, lng):
     return result
 
 
-# ---------------------------------------------------------------------------
-# Unit conversions
-# ---------------------------------------------------------------------------
-def meters_to_miles(m):
-    return round(m * 0.000621371, 1)
-
-
-def meters_to_feet(m):
-    return round(m * 3.28084)
-
-
-def seconds_to_pace(seconds_per_meter):
-    """Convert speed (m/s as 1/speed) to pace string like '7:42'."""
-    if not seconds_per_meter or seconds_per_meter == 0:
-        return "—"
-    secs_per_mile = 1609.34 / seconds_per_meter
-    mins = int(secs_per_mile // 60)
-    secs = int(secs_per_mile % 60)
-    return f"{mins}:{secs:02d}"
-
-
-def speed_to_pace(meters_per_sec):
-    """Convert m/s to pace string like '7:42 /mi'."""
-    if not meters_per_sec or meters_per_sec == 0:
-        return "—"
-    secs_per_mile = 1609.34 / meters_per_sec
-    mins = int(secs_per_mile // 60)
-    secs = int(secs_per_mile % 60)
-    return f"{mins}:{secs:02d} /mi"
-
-
-def format_duration(seconds):
-    """Format seconds to '1h 42m' or '35m'."""
-    if not seconds:
-        return "—"
-    hours = int(seconds // 3600)
-    mins = int((seconds % 3600) // 60)
-    if hours > 0:
-        return f"{hours}h {mins:02d}m"
-    return f"{mins}m"
-
-
-def format_date(iso_string):
-    """'2026-02-08T07:24:00Z' → '7:24 AM · Feb 8'."""
-    dt = datetime.fromisoformat(iso_string.replace("Z", "+00:00"))
-    return dt.strftime("%-I:%M %p · %b %-d")
-
-
-# ---------------------------------------------------------------------------
-# Strava workout_type → wireframe run type mapping
-# ---------------------------------------------------------------------------
-WORKOUT_TYPE_MAP = {
-    0: None,                # Default — no type
-    1: None,                # Race (could add to RUN_TYPES later)
-    2: "Easy Long Run",     # Long Run
-    3: "Tempo Run",         # Workout (structured effort)
-}
-
-
-def map_run_type(workout_type):
-    """Map Strava workout_type int to wireframe run type string."""
-    if workout_type is None:
-        return None
-    return WORKOUT_TYPE_MAP.get(workout_type, None)
-
-
 # ---------------------------------------------------------------------------
 # Data fetch + transform functions
 # ---------------------------------------------------------------------------
-def get_profile():
-    """
-    Fetch athlete profile + stats + shoes.
-    Returns shape matching wireframe Profile card + ALL_SHOES.
-    """
-    hit, data = cached("profile")
-    if hit:
-        return data
-
-    athlete = _api_get("/athlete")
-    athlete_id = athlete["id"]
-    stats = _api_get(f"/athletes/{athlete_id}/stats")
-
-    # YTD miles
-    ytd = stats.get("ytd_run_totals", {})
-    ytd_miles = meters_to_miles(ytd.get("distance", 0))
-
-    # Shoes — Strava returns distance in meters
-    shoes = []
-    for s in athlete.get("shoes", []):
-        shoes.append({
-            "id": s["id"],
-            "name": s["name"],
-            "miles": meters_to_miles(s.get("distance", 0)),
-            "max": DEFAULT_SHOE_MAX_MILES,  # user-configurable, not from Strava
-        })
-    # Sort by miles descending (most used first)
-    shoes.sort(key=lambda x: x["miles"], reverse=True)
-
-    result = {
-        "name": f"{athlete.get('firstname', '')} {athlete.get('lastname', '')}".strip(),
-        "city": athlete.get("city", ""),
-        "state": athlete.get("state", ""),
-        "avatar": athlete.get("profile_medium", ""),
-        "ytd_miles": ytd_miles,
-        "shoes": shoes,
-        "measurement_preference": athlete.get("measurement_preference", "feet"),
-    }
-
-    cache_set("profile", result)
-    return result
-
-
-def get_activities_for_week(week_start, week_end):
-    """
-    Fetch activities within a date range.
-    Returns list of activity summaries (no splits — those need detail calls).
-    """
-    after = int(week_start.timestamp())
-    before = int(week_end.timestamp())
-
-    activities = _api_get("/athlete/activities", params={
-        "after": after,
-        "before": before,
-        "per_page": 50,
-    })
-
-    # Filter to runs only (type=Run or sport_type=Run)
-    runs = [a for a in activities if a.get("type") == "Run" or a.get("sport_type") == "Run"]
-    return runs
-
-
 def _get_city(activity):
     """Extract city from start_latlng via reverse geocoding."""
     latlng = activity.get("start_latlng")
@@ -293,66 +221,29 @@ def _get_city(activity):
     return reverse_geocode(latlng[0], latlng[1])
 
 
+def _cached_city(activity):
+    """City from the geocode cache only — never calls Nominatim."""
+    latlng = activity.get("start_latlng")
+    if not latlng or len(latlng) < 2:
+        return None
+    return _geo_cache.get(_geo_key(latlng[0], latlng[1]))
+
+
 def get_activity_detail(activity_id):
     """
     Fetch full activity detail including splits.
-    Returns wireframe-shaped activity dict.
+    Returns an Activity record (raw SI numbers — call .to_json(units) to display).
     """
     cache_key = f"activity_{activity_id}"
     hit, data = cached(cache_key, ttl=600)  # 10 min for individual activities
     if hit:
         return data
 
-    a = _api_get(f"/activities/{activity_id}")
-
-    # Build splits from splits_standard (imperial) or splits_metric
-    raw_splits = a.get("splits_standard", []) or a.get("splits_metric", [])
-    splits = []
-    for s in raw_splits:
-        split_num = s.get("split", len(splits) + 1)
-        avg_speed = s.get("average_speed", 0)
-        elev_diff = s.get("elevation_difference", 0)
-        elev_ft = meters_to_feet(elev_diff) if elev_diff else 0
-        elev_str = f"{'+' if elev_ft >= 0 else ''}{elev_ft}ft"
-        if elev_ft < 0:
-            elev_str = f"{elev_ft}ft"
-
-        splits.append({
-            "m": split_num,
-            "p": seconds_to_pace(avg_speed),
-            "e": elev_str,
-            "dist": s.get("distance", 0),
-            "moving_time": s.get("moving_time", 0),
-        })
-
-    # Gear name
-    gear = a.get("gear", {})
-    shoe_name = gear.get("name", "Unknown") if gear else "Unknown"
-
-    result = {
-        "id": a["id"],
-        "title": a.get("name", "Run"),
-        "description": a.get("description") or None,
-        "date": format_date(a.get("start_date_local", "")),
-        "distance": f"{meters_to_miles(a.get('distance', 0))} mi",
-        "distance_raw": meters_to_miles(a.get("distance", 0)),
-        "pace": speed_to_pace(a.get("average_speed", 0)),
-        "time": format_duration(a.get("moving_time", 0)),
-        "elev": f"{meters_to_feet(a.get('total_elevation_gain', 0))} ft",
-        "shoe": shoe_name,
-        "device": a.get("device_name") or None,
-        "runType": map_run_type(a.get("workout_type")),
-        "sport": "run",
-        "splits": splits,
-        "cal": a.get("calories", 0) or 0,
-        "eff": a.get("suffer_score") or None,  # Can be null
-        "avg_hr": round(a["average_heartrate"]) if a.get("has_heartrate") and a.get("average_heartrate") else None,
-        "max_hr": round(a["max_heartrate"]) if a.get("has_heartrate") and a.get("max_heartrate") else None,
-        "avg_cadence": round(a["average_cadence"] * 2) if a.get("average_cadence") else None,
-        "start_date_local": a.get("start_date_local", ""),
-        "polyline": (a.get("map") or {}).get("summary_polyline") or None,
-        "city": _get_city(a),
-    }
+    try:
+        a = _api_get(f"/activities/{activity_id}")
+    except deadlines.DeadlineExceeded as e:
+        return _stale(cache_key, e)
+    result = Activity.from_strava(a, city=_get_city(a))
 
     cache_set(cache_key, result)
     return result
@@ -363,6 +254,7 @@ def get_recent_activities(count=10, page=1):
     Fetch the most recent N runs with full details (splits, calories, etc).
     Always returns content regardless of what week it is.
     Supports pagination via page param (1-indexed).
+    Returns a list of Activity records.
     """
     cache_key = f"recent_{count}_p{page}"
     hit, data = cached(cache_key)
@@ -371,143 +263,64 @@ def get_recent_activities(count=10, page=1):
 
     # Fetch recent activities (Strava returns newest first by default)
     # Request extra to account for non-run activities being filtered out
-    raw = _api_get("/athlete/activities", params={
-        "per_page": count * 2,
-        "page": page,
-    })
+    try:
+        raw = _api_get("/athlete/activities", params={
+            "per_page": count * 2,
+            "page": page,
+        })
+    except deadlines.DeadlineExceeded as e:
+        return _stale(cache_key, e)
 
     # Filter to runs only
     runs = [a for a in raw if a.get("type") == "Run" or a.get("sport_type") == "Run"]
     runs = runs[:count]
 
-    # Fetch full details for each
+    # Fetch full details for each — stop at the deadline with what we have
     activities = []
-    for r in runs:
-        try:
-            detail = get_activity_detail(r["id"])
-            activities.append(detail)
-        except Exception as e:
-            print(f"Failed to fetch detail for activity {r['id']}: {e}")
-
-    cache_set(cache_key, activities)
-    return activities
-
-
-def get_current_week_summary(goal_miles=None):
-    """
-    Fetch current week's summary: day bubbles, total miles, goal.
-    Separate from activity feed so the feed always has content.
-    """
-    from config import DEFAULT_WEEKLY_GOAL
-
-    hit, data = cached("current_week_summary")
-    if hit:
-        return data
-
-    goal = goal_miles or DEFAULT_WEEKLY_GOAL
-
-    # Calculate current week boundaries (Monday–Sunday)
-    today = datetime.now()
-    monday = today - timedelta(days=today.weekday())
-    monday = monday.replace(hour=0, minute=0, second=0, microsecond=0)
-    sunday = monday + timedelta(days=6, hours=23, minutes=59, seconds=59)
-
-    # Fetch activity list for the week
-    raw_activities = get_activities_for_week(monday, sunday)
-
-    # Build weekDays array from summary data (no detail calls needed)
-    day_names = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
-    week_days = []
-    for i in range(7):
-        day_date = monday + timedelta(days=i)
-        day_miles = 0
-        day_sport = None
-        for a in raw_activities:
+    with deadlines.section() as details:
+        for r in runs:
             try:
-                a_date = datetime.fromisoformat(
-                    a.get("start_date_local", "").replace("Z", "+00:00")
-                )
-                if a_date.date() == day_date.date():
-                    day_miles += meters_to_miles(a.get("distance", 0))
-                    day_sport = "run"
-            except (ValueError, KeyError):
-                pass
-
-        week_days.append({
-            "day": day_names[i],
-            "date": day_date.day,
-            "miles": round(day_miles, 1),
-            "sport": day_sport if day_miles > 0 else None,
-            "today": day_date.date() == today.date(),
-        })
-
-    total_mi = round(sum(d["miles"] for d in week_days), 1)
-
-    result = {
-        "weekDays": week_days,
-        "totalMi": total_mi,
-        "goalMi": goal,
-    }
-
-    cache_set("current_week_summary", result)
-    return result
+                detail = get_activity_detail(r["id"])
+                activities.append(detail)
+            except deadlines.DeadlineExceeded:
+                deadlines.mark_partial()
+                break
+            except Exception as e:
+                print(f"Failed to fetch detail for activity {r['id']}: {e}")
+
+    if not details.partial:
+        cache_set(cache_key, activities)
+    return activities
 
 
-def get_past_weeks(count=3):
+def get_run_feed(count=10, before=None):
     """
-    Fetch past N weeks summaries.
-    Returns shape matching wireframe PAST_WEEKS constant.
+    `count` runs older than the `before` cursor (newest first when None), with
+    full details. Runs come from the local store's start-time index, so a page
+    is the same cost at any depth and new uploads never shift later pages.
+    Runs whose detail can't be fetched in time fall back to their stored
+    summary (no splits), so a page always has exactly `count` runs until the
+    history runs out.
+    Returns (activities, next_cursor); next_cursor is None on the last page.
     """
-    hit, data = cached("past_weeks")
-    if hit:
-        return data
-
-    today = datetime.now()
-    current_monday = today - timedelta(days=today.weekday())
-    current_monday = current_monday.replace(hour=0, minute=0, second=0, microsecond=0)
-
-    weeks = []
-    for w in range(1, count + 1):
-        week_start = current_monday - timedelta(weeks=w)
-        week_end = week_start + timedelta(days=6, hours=23, minutes=59, seconds=59)
-
-        raw_activities = get_activities_for_week(week_start, week_end)
+    cursor = activity_store.decode_cursor(before) if before else None
+    runs = activity_store.runs_before(count, cursor)
 
-        # Group by day
-        day_abbrevs = ["M", "T", "W", "Th", "F", "Sa", "Su"]
-        days = []
-        total_miles = 0
-        total_seconds = 0
-
-        for i in range(7):
-            day_date = week_start + timedelta(days=i)
-            day_miles = 0
-            for a in raw_activities:
+    activities = []
+    out_of_time = False
+    with deadlines.section():
+        for r in runs:
+            # Negative ids are file imports that aren't on Strava — nothing to fetch
+            if not out_of_time and r["id"] > 0:
                 try:
-                    a_date = datetime.fromisoformat(
-                        a.get("start_date_local", "").replace("Z", "+00:00")
-                    )
-                    if a_date.date() == day_date.date():
-                        mi = meters_to_miles(a.get("distance", 0))
-                        day_miles += mi
-                        total_seconds += a.get("moving_time", 0)
-                except (ValueError, KeyError):
-                    pass
-
-            day_miles = round(day_miles, 1)
-            total_miles += day_miles
-            days.append({"d": day_abbrevs[i], "mi": day_miles})
-
-        # Format label: "Jan 27 – Feb 2"
-        label = f"{week_start.strftime('%b %-d')} – {week_end.strftime('%b %-d')}"
-
-        weeks.append({
-            "label": label,
-            "miles": round(total_miles, 1),
-            "time": format_duration(total_seconds),
-            "days": days,
-        })
-
-    result = {"weeks": weeks}
-    cache_set("past_weeks", result)
-    return result
+                    activities.append(get_activity_detail(r["id"]))
+                    continue
+                except deadlines.DeadlineExceeded:
+                    deadlines.mark_partial()
+                    out_of_time = True
+                except Exception as e:
+                    print(f"Failed to fetch detail for activity {r['id']}: {e}")
+            activities.append(Activity.from_strava(r, city=_cached_city(r)))
+
+    next_cursor = activity_store.encode_cursor(runs[-1]) if len(runs) == count else None
+    return activities, next_cursor
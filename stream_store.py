@@ -0,0 +1,287 @@
+"""
+Activity streams store — per-activity typed arrays in memory-mappable files.
+Fetches /activities/{id}/streams once and keeps a compact binary copy on disk,
+so analyses can slice time/distance/HR/etc. without loading or parsing JSON.
+"""
+
+import json
+import mmap
+import os
+import struct
+from array import array
+
+import requests
+
+import strava_client
+import tenancy
+
+STREAMS_DIR = "streams"
+UNAVAILABLE_FILE = "unavailable.json"  # in STREAMS_DIR: activity id -> failed fetches
+MAX_ATTEMPTS = 3  # fetches that failed on the data itself before ingest_many gives up
+
+# Strava stream keys we ingest
+STREAM_KEYS = ("time", "distance", "altitude", "heartrate", "cadence", "latlng")
+
+# ---------------------------------------------------------------------------
+# File layout
+# ---------------------------------------------------------------------------
+# Header: magic, version, sample count, channel bitmask (little-endian).
+# Channels follow in CHANNELS order, each padded to an 8-byte boundary.
+# Arrays are written in native byte order; the header records which one so a
+# file copied across architectures is rejected instead of misread.
+MAGIC = b"RDST"
+VERSION = 1
+_HEADER = struct.Struct("<4sBBxxII")  # magic, version, little-endian flag, count, mask
+
+# (channel name, array typecode) — latlng is split into two int32 channels
+# of degrees × 1e7 (~1 cm resolution at 4 bytes each instead of 8).
+CHANNELS = (
+    ("time", "I"),        # seconds from start
+    ("distance", "f"),    # meters from start
+    ("altitude", "f"),    # meters
+    ("heartrate", "H"),   # bpm
+    ("cadence", "H"),     # Strava raw (strides/min — double for steps)
+    ("lat", "i"),         # degrees × LATLNG_SCALE
+    ("lng", "i"),
+)
+LATLNG_SCALE = 10_000_000
+
+_LITTLE = 1 if struct.pack("=H", 1) == struct.pack("<H", 1) else 0
+
+
+def _path(activity_id):
+    return os.path.join(tenancy.path(STREAMS_DIR), f"{activity_id}.bin")
+
+
+def _pad(n):
+    return (8 - n % 8) % 8
+
+
+# ---------------------------------------------------------------------------
+# Write
+# ---------------------------------------------------------------------------
+def _filled(data):
+    """Forward-fill samples a sensor missed (None); leading gaps take the first value."""
+    last = next((v for v in data if v is not None), None)
+    out = []
+    for v in data:
+        last = v if v is not None else last
+        out.append(last)
+    return out
+
+
+def _to_channels(raw):
+    """
+    Convert Strava key_by_type stream JSON to {channel: array}. Missed
+    samples (None) become 0 in heartrate and cadence ("no reading", left out
+    of time in zone); time, distance, altitude and position carry the last
+    value forward, so distance stays monotonic and nothing downstream sees NaN.
+    """
+    out = {}
+    for name, code in CHANNELS:
+        if name in ("lat", "lng"):
+            continue
+        data = (raw.get(name) or {}).get("data")
+        if not data or all(v is None for v in data):
+            continue
+        if name in ("heartrate", "cadence"):
+            data = [v or 0 for v in data]
+        else:
+            data = _filled(data)
+        if code in ("I", "H"):
+            data = [int(round(v)) for v in data]
+        out[name] = array(code, data)
+
+    latlng = (raw.get("latlng") or {}).get("data")
+    if latlng and any(latlng):
+        latlng = _filled([p or None for p in latlng])
+        out["lat"] = array("i", [int(round(p[0] * LATLNG_SCALE)) for p in latlng])
+        out["lng"] = array("i", [int(round(p[1] * LATLNG_SCALE)) for p in latlng])
+    return out
+
+
+def write_streams(activity_id, raw):
+    """
+    Pack Strava stream JSON into the binary format and write it atomically.
+    Returns the number of samples written.
+    """
+    channels = _to_channels(raw)
+    count = min((len(a) for a in channels.values()), default=0)
+
+    mask = 0
+    body = bytearray()
+    for bit, (name, _code) in enumerate(CHANNELS):
+        arr = channels.get(name)
+        if arr is None:
+            continue
+        mask |= 1 << bit
+        chunk = arr[:count].tobytes()
+        body += chunk + b"\0" * _pad(len(chunk))
+
+    path = _path(activity_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, _LITTLE, count, mask))
+        f.write(b"\0" * _pad(_HEADER.size))
+        f.write(body)
+    os.replace(tmp, path)
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Read (zero-copy)
+# ---------------------------------------------------------------------------
+class Streams:
+    """
+    Memory-mapped view of one activity's streams.
+    streams["heartrate"] returns a memoryview over the mapped file —
+    slicing it does not copy. Close (or use as a context manager) when done.
+    """
+
+    __slots__ = ("activity_id", "count", "_file", "_mmap", "_views")
+
+    def __init__(self, activity_id, path):
+        self.activity_id = activity_id
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            self._file.close()
+            raise ValueError(f"Empty stream file for activity {activity_id}")
+
+        magic, version, little, count, mask = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or little != _LITTLE:
+            self.close()
+            raise ValueError(f"Unsupported stream file for activity {activity_id}")
+
+        self.count = count
+        self._views = {}
+        buf = memoryview(self._mmap)
+        offset = _HEADER.size + _pad(_HEADER.size)
+        for bit, (name, code) in enumerate(CHANNELS):
+            if not mask & (1 << bit):
+                continue
+            size = count * array(code).itemsize
+            self._views[name] = buf[offset:offset + size].cast(code)
+            offset += size + _pad(size)
+
+    def __contains__(self, name):
+        return name in self._views
+
+    def __getitem__(self, name):
+        return self._views[name]
+
+    def get(self, name):
+        return self._views.get(name)
+
+    @property
+    def channels(self):
+        return tuple(self._views)
+
+    def close(self):
+        for view in getattr(self, "_views", {}).values():
+            view.release()
+        self._views = {}
+        if getattr(self, "_mmap", None) is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass  # caller still holds a slice — the map closes when it's released
+            self._mmap = None
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def has_streams(activity_id):
+    return os.path.exists(_path(activity_id))
+
+
+def open_streams(activity_id):
+    """Open an activity's streams. Returns None if not ingested yet."""
+    path = _path(activity_id)
+    if not os.path.exists(path):
+        return None
+    return Streams(activity_id, path)
+
+
+# ---------------------------------------------------------------------------
+# Ingest
+# ---------------------------------------------------------------------------
+def fetch_streams(activity_id):
+    """Fetch raw streams JSON from Strava (keyed by stream type)."""
+    return strava_client._api_get(f"/activities/{activity_id}/streams", params={
+        "keys": ",".join(STREAM_KEYS),
+        "key_by_type": "true",
+    })
+
+
+def ingest(activity_id, force=False):
+    """
+    Fetch and store streams for one activity.
+    Returns True if streams were fetched, False if already on disk.
+    """
+    if not force and has_streams(activity_id):
+        return False
+    raw = fetch_streams(activity_id)
+    write_streams(activity_id, raw)
+    return True
+
+
+def _unavailable():
+    path = os.path.join(tenancy.path(STREAMS_DIR), UNAVAILABLE_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_unavailable(failed):
+    path = os.path.join(tenancy.path(STREAMS_DIR), UNAVAILABLE_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(failed, f)
+    os.replace(tmp, path)
+
+
+def ingest_many(activity_ids, limit=None):
+    """
+    Ingest streams for each activity not yet on disk, newest-first order preserved.
+    `limit` caps upstream calls per pass (Strava allows 100 requests / 15 min).
+    Activities Strava has no streams for (404 — e.g. manual entries) are
+    skipped from then on, as are ones whose streams failed MAX_ATTEMPTS times;
+    network errors and rate limits are just retried next pass.
+    Returns list of activity ids that were fetched.
+    """
+    failed = _unavailable()
+    before = dict(failed)
+    fetched = []
+    for activity_id in activity_ids:
+        if limit is not None and len(fetched) >= limit:
+            break
+        key = str(activity_id)
+        if has_streams(activity_id) or failed.get(key, 0) >= MAX_ATTEMPTS:
+            continue
+        try:
+            ingest(activity_id)
+            fetched.append(activity_id)
+            failed.pop(key, None)
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                failed[key] = MAX_ATTEMPTS
+            print(f"Failed to ingest streams for activity {activity_id}: {e}")
+        except requests.RequestException as e:
+            print(f"Failed to ingest streams for activity {activity_id}: {e}")
+        except Exception as e:
+            failed[key] = failed.get(key, 0) + 1
+            print(f"Failed to ingest streams for activity {activity_id}: {e}")
+    if failed != before:
+        _save_unavailable(failed)
+    return fetched
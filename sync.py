@@ -0,0 +1,334 @@
+"""
+Incremental Strava sync into the local activity store.
+Pulls only activities newer than the last stored one, ingests streams in
+rate-limit-friendly batches, then updates derived data (records, load, zones,
+shoes, daily mileage, rollups, heatmap tiles, repeated routes) and attaches
+weather at the start of a batch of activities. Strava webhook events apply
+single activities in between.
+
+Sync and importer.py read-modify-write the same per-athlete files, so each
+holds store_lock() while it writes; a sync pass that finds it held skips
+and runs again on the next request (or worker round).
+
+Strava's rate limit is per application, so athletes share it: each pass gets
+an even split of the sync share of what's left in the current window, and
+sync_all() visits athletes least-recently-synced first so nobody starves.
+"""
+
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import requests
+
+import activity_store
+import athlete_profile
+import deadlines
+import heatmap
+import http_client
+import mileage
+import records
+import rollups
+import routes
+import stream_store
+import strava_client
+import tenancy
+import training_load
+import weather_history
+import zones
+from config import SYNC_RATE_SHARE
+
+SYNC_INTERVAL = 900       # 15 min between automatic syncs
+SYNC_PAGE_SIZE = 200      # Strava max per_page
+STREAMS_PER_SYNC = 10     # max stream fetches per athlete per pass
+REFRESH_PAGE_SIZE = 50    # newest activities listed inline by refresh_store
+GAPS_FILE = "sync_gaps.json"  # per athlete: [[after, before], ...] start-time ranges not listed yet, newest first
+LOCK_FILE = "store.lock"  # per athlete: flock held by whoever is writing the stores
+
+
+class StoreBusy(Exception):
+    """Another process (an import, or a sync pass) is writing the athlete's stores."""
+
+
+@contextmanager
+def store_lock(wait=False):
+    """
+    Hold the current athlete's store lock (an flock, so it spans processes
+    and is released if the holder dies). Raises StoreBusy if it's taken,
+    unless `wait`, which blocks until it's free.
+    """
+    with open(tenancy.path(LOCK_FILE), "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if not wait:
+                raise StoreBusy("Another process is writing this athlete's data") from None
+            print("Waiting for the sync in progress to finish...")
+            fcntl.flock(f, fcntl.LOCK_EX)
+        yield  # closing the file releases the lock
+
+
+def _update_summaries(changed):
+    """Summary-derived data for new/changed/deleted activities."""
+    training_load.update(changed)
+    athlete_profile.update(changed)
+    mileage.update(changed)
+    rollups.update(changed)
+    heatmap.update(changed)
+    routes.update(changed)
+
+
+def _store_page(batch):
+    """Store one listing page with its summary-derived data. Returns ids changed."""
+    stored = activity_store.upsert(batch)
+    _update_summaries(stored)
+    return stored
+
+
+def _gaps():
+    path = tenancy.path(GAPS_FILE)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_gaps(gaps):
+    path = tenancy.path(GAPS_FILE)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(gaps, f)
+    os.replace(tmp, path)
+
+
+def fetch_new_activities():
+    """
+    Store activities started after the newest stored one (full history on
+    first run). Strava lists `after` oldest first, so each page is stored
+    (with its derived data) as it arrives: an interrupted listing keeps what
+    it got and the next one resumes after it. Returns ids of new/changed activities.
+    """
+    after = int(activity_store.latest_start_ts())
+    changed = []
+    page = 1
+    while True:
+        batch = strava_client._api_get("/athlete/activities", params={
+            "after": after,
+            "per_page": SYNC_PAGE_SIZE,
+            "page": page,
+        })
+        changed += _store_page(batch)
+        if len(batch) < SYNC_PAGE_SIZE:
+            return changed
+        page += 1
+
+
+def fetch_latest(per_page=REFRESH_PAGE_SIZE):
+    """
+    Store the newest `per_page` activities (Strava lists without `after`
+    newest first). If they don't reach back to the newest stored one — an
+    empty store, or a long time away — the range in between is recorded as a
+    gap for fill_gaps(). Returns ids of new/changed activities.
+    """
+    newest_stored = int(activity_store.latest_start_ts())
+    batch = strava_client._api_get("/athlete/activities", params={"per_page": per_page, "page": 1})
+    changed = _store_page(batch)
+    if len(batch) == per_page:
+        oldest = int(min(activity_store.start_ts(a) for a in batch))
+        if oldest > newest_stored:
+            _save_gaps([[newest_stored, oldest]] + _gaps())
+    return changed
+
+
+def fill_gaps(max_pages=None):
+    """
+    List the recorded gaps newest first (`before=`), at most `max_pages`
+    pages. Progress is saved after every page, so an interrupted fill
+    resumes where it stopped. Returns (ids of new/changed activities, all filled).
+    """
+    gaps = _gaps()
+    changed = []
+    pages = 0
+    while gaps:
+        if pages == max_pages:
+            return changed, False
+        after, before = gaps[0]
+        batch = strava_client._api_get("/athlete/activities", params={
+            "before": before,
+            "per_page": SYNC_PAGE_SIZE,
+        })
+        pages += 1
+        changed += _store_page(batch)
+        oldest = min((activity_store.start_ts(a) for a in batch), default=0)
+        if len(batch) < SYNC_PAGE_SIZE or oldest <= after:
+            gaps.pop(0)
+        else:
+            gaps[0] = [after, int(oldest)]
+        _save_gaps(gaps)
+    return changed, True
+
+
+def refresh_store():
+    """
+    Quick pass for the activity feed, inside the request deadline: the
+    newest REFRESH_PAGE_SIZE activities (one request), then one page of any
+    gap behind them. Streams, records and zones are left to the next full
+    sync. Returns (ids of new/changed activities, whether history is complete).
+    """
+    with store_lock():
+        changed = fetch_latest()
+        filled, complete = fill_gaps(max_pages=1)
+    return changed + filled, complete
+
+
+def refresh_store_if_stale():
+    """
+    refresh_store() at most once per CACHE_TTL_SECONDS (or after any sync).
+    While gaps remain (or after a failure) the next call lists again,
+    carrying on from what was stored. Returns changed ids or None.
+    """
+    hit, _ = strava_client.cached("store_refresh")
+    if hit:
+        return None
+    # Mark first so concurrent requests don't list the same page
+    strava_client.cache_set("store_refresh", True)
+    try:
+        changed, complete = refresh_store()
+    except StoreBusy:
+        strava_client.cache_drop("store_refresh")
+        deadlines.mark_partial()  # serve what's stored; list again next request
+        return None
+    except Exception:
+        strava_client.cache_drop("store_refresh")
+        raise
+    if not complete:
+        strava_client.cache_drop("store_refresh")
+        deadlines.mark_partial()  # older history is still to come
+    return changed
+
+
+def sync_activities(streams_limit=STREAMS_PER_SYNC):
+    """
+    Run one sync pass. Returns counts of what changed.
+    Streams are backfilled newest-first, `streams_limit` per pass, so the
+    full history fills in over successive syncs.
+    """
+    with store_lock():
+        changed = fetch_new_activities()
+        filled, _ = fill_gaps()
+        changed += filled
+
+        run_ids = [a["id"] for a in activity_store.runs()]
+        fetched = stream_store.ingest_many(run_ids, limit=streams_limit)
+
+        scanned = records.update()
+        zones.update()
+        weather = weather_history.enrich()
+
+    strava_client.cache_set("last_sync", True)
+    strava_client.cache_set("store_refresh", True)
+    return {"activities": len(changed), "streams": len(fetched), "records": scanned,
+            "weather": weather["attached"]}
+
+
+def apply_event(activity_id):
+    """
+    Apply a Strava webhook event for one of the current athlete's activities.
+    Events aren't signed, so they're only a hint: the activity is refetched,
+    and dropped only if Strava says it's gone (404). Derived data follows;
+    streams for a new run come with the next sync. Returns ids changed;
+    raises StoreBusy while the stores are locked (the webhook's 500 makes
+    Strava send the event again).
+    """
+    strava_client.cache_drop(f"activity_{activity_id}")
+    try:
+        raw = strava_client._api_get(f"/activities/{activity_id}")
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        raw = None
+    with store_lock():
+        if raw is None:
+            changed = [activity_id] if activity_store.delete(activity_id) else []
+            records.remove(activity_id)
+        else:
+            changed = activity_store.upsert([raw])
+        if changed:
+            _update_summaries(changed)
+            zones.update(changed)
+    return changed
+
+
+def sync_budget():
+    """
+    Strava requests sync may still spend: what's left of the app-wide quota,
+    less the part of the window kept back for interactive requests.
+    """
+    quota = http_client.strava_quota()
+    reserve = round(quota["short_limit"] * (1 - SYNC_RATE_SHARE))
+    return min(quota["short_left"], quota["daily_left"]) - reserve
+
+
+def fair_share(athletes_due=1):
+    """
+    Stream fetches one athlete's pass may use: the sync budget split evenly
+    between the athletes due a sync (less one request each for listing new
+    activities).
+    """
+    budget = sync_budget()
+    per_athlete = budget // max(1, athletes_due) - 1
+    return max(0, min(STREAMS_PER_SYNC, per_athlete))
+
+
+def due_athletes():
+    """Athletes with tokens whose last sync is older than SYNC_INTERVAL, longest-waiting first."""
+    waiting = []
+    for athlete_id in tenancy.athletes(strava_client.TOKEN_FILE):
+        with tenancy.use(athlete_id):
+            last = strava_client.cached_at("last_sync")
+        if last < time.time() - SYNC_INTERVAL:
+            waiting.append((last, athlete_id))
+    return [athlete_id for _, athlete_id in sorted(waiting, key=lambda w: w[0])]
+
+
+def sync_if_stale():
+    """Sync the current athlete at most once per SYNC_INTERVAL. Returns the sync result or None."""
+    hit, _ = strava_client.cached("last_sync", ttl=SYNC_INTERVAL)
+    if hit:
+        return None
+    share = fair_share(max(1, len(due_athletes())))
+    # Mark first so concurrent requests don't start a second pass
+    strava_client.cache_set("last_sync", True)
+    try:
+        return sync_activities(streams_limit=share)
+    except StoreBusy:
+        strava_client.cache_drop("last_sync")  # try again on the next request
+        return None
+
+
+def sync_all():
+    """
+    One scheduling round over every athlete that's due, longest-waiting first.
+    Each gets an even share of what's left when their turn comes, so unused
+    share carries over to the athletes after them. Stops once the sync share
+    of the window is spent; whoever is left goes first next round.
+    Returns {athlete_id: result}.
+    """
+    results = {}
+    due = due_athletes()
+    for i, athlete_id in enumerate(due):
+        if sync_budget() <= 0:
+            break
+        with tenancy.use(athlete_id):
+            strava_client.cache_set("last_sync", True)
+            try:
+                results[athlete_id] = sync_activities(streams_limit=fair_share(len(due) - i))
+            except StoreBusy as e:
+                strava_client.cache_drop("last_sync")  # still due next round
+                results[athlete_id] = {"error": str(e)}
+            except Exception as e:
+                print(f"Sync failed for athlete {athlete_id}: {e}")
+                results[athlete_id] = {"error": str(e)}
+    return results
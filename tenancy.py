@@ -0,0 +1,101 @@
+"""
+Multi-athlete tenancy.
+The current athlete (Strava athlete id) is a context variable, set from the
+Flask session at the start of each request and by the sync scheduler for each
+pass. Per-athlete files live in ATHLETES_DIR/<id>/ and in-memory caches are
+keyed by key(). With no athlete selected, paths resolve to the working
+directory as before, so a single-athlete install keeps using its files.
+"""
+
+import contextvars
+import os
+import shutil
+from contextlib import contextmanager
+
+ATHLETES_DIR = "athletes"
+
+_current = contextvars.ContextVar("athlete", default=None)
+_made = set()  # athlete dirs already created by this process
+
+
+def _normalize(athlete_id):
+    if athlete_id is None or athlete_id == "":
+        return None
+    athlete_id = str(athlete_id)
+    if not athlete_id.isdigit():
+        raise ValueError(f"Invalid athlete id: {athlete_id!r}")
+    return athlete_id
+
+
+def current():
+    """Current athlete id (str), or None for the legacy single-athlete files."""
+    return _current.get()
+
+
+def set_current(athlete_id):
+    """Select the athlete for the rest of this request/thread."""
+    _current.set(_normalize(athlete_id))
+
+
+@contextmanager
+def use(athlete_id):
+    """Run the with-block as `athlete_id` (background sync)."""
+    token = _current.set(_normalize(athlete_id))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def key():
+    """Namespace for in-memory caches ("" for the legacy athlete)."""
+    return _current.get() or ""
+
+
+def athlete_dir(athlete_id):
+    return os.path.join(ATHLETES_DIR, _normalize(athlete_id))
+
+
+def path(name):
+    """Where the current athlete's `name` (file or directory) lives."""
+    athlete = _current.get()
+    if athlete is None:
+        return name
+    directory = os.path.join(ATHLETES_DIR, athlete)
+    if directory not in _made:
+        os.makedirs(directory, exist_ok=True)
+        _made.add(directory)
+    return os.path.join(directory, name)
+
+
+def athletes(token_file):
+    """
+    Ids of every athlete with stored tokens, in id order — preceded by None
+    if the legacy single-athlete install (tokens in the working directory) is
+    still connected.
+    """
+    found = [None] if os.path.exists(token_file) else []
+    if os.path.isdir(ATHLETES_DIR):
+        found += sorted(
+            (d for d in os.listdir(ATHLETES_DIR)
+             if d.isdigit() and os.path.exists(os.path.join(ATHLETES_DIR, d, token_file))),
+            key=int,
+        )
+    return found
+
+
+def adopt_legacy(athlete_id, names):
+    """
+    Move single-athlete files from the working directory into `athlete_id`'s
+    directory — once, the first time that athlete logs in. Returns the names moved.
+    """
+    directory = athlete_dir(athlete_id)
+    if os.path.isdir(directory):
+        return []
+    os.makedirs(directory, exist_ok=True)
+    moved = []
+    for name in names:
+        if os.path.exists(name):
+            shutil.move(name, os.path.join(directory, name))
+            moved.append(name)
+    return moved
@@ -0,0 +1,21 @@
+"""Coaching context built from typed activity records."""
+
+from datetime import datetime, timedelta
+
+import assistant_client
+from models import Activity
+
+
+def _run(day, meters, seconds, name="Run"):
+    return Activity(name=name, start_date_local=day.strftime("%Y-%m-%dT06:00:00"),
+                    distance=meters, moving_time=seconds, average_speed=meters / seconds)
+
+
+def test_context_uses_raw_distance_and_time():
+    today = datetime.now(assistant_client._TZ)
+    runs = [_run(today, 8046.7, 2400, "Easy"), _run(today - timedelta(days=today.weekday() + 2), 21404, 6145)]
+    context = assistant_client.build_context(runs, {"totalMi": 5}, None, None, None, goal_mi=40)
+    assert "RAN TODAY: Yes — 5.0 mi" in context
+    assert "Easy (5.0 mi, 8:00 /mi)" in context
+    assert "13.3 mi in 1h 42m at 7:42 /mi pace" in context
+    assert assistant_client.detect_mode(runs) == "post_run"
@@ -0,0 +1,67 @@
+"""Circuit breaker state changes (run from the repo root: python -m pytest)."""
+
+import time
+
+import breakers
+
+
+def _tripped():
+    breaker = breakers.Breaker("test", slow_after=5)
+    for _ in range(breakers.FAILURE_THRESHOLD):
+        breaker.failure()
+    breaker.open_until = time.time()  # cooldown over
+    return breaker
+
+
+def test_trips_after_threshold():
+    breaker = breakers.Breaker("test", slow_after=5)
+    for _ in range(breakers.FAILURE_THRESHOLD - 1):
+        breaker.failure()
+    assert breaker.state == breakers.CLOSED
+    breaker.failure()
+    assert breaker.state == breakers.OPEN
+    assert not breaker.allow()
+
+
+def test_single_half_open_probe():
+    breaker = _tripped()
+    assert breaker.allow()
+    assert breaker.state == breakers.HALF_OPEN
+    assert not breaker.allow()  # one probe at a time
+
+
+def test_aborted_probe_lets_the_next_call_probe():
+    breaker = _tripped()
+    assert breaker.allow()
+    breaker.release()  # probe ran out of the caller's deadline
+    assert breaker.state == breakers.OPEN
+    assert breaker.allow()
+    assert breaker.state == breakers.HALF_OPEN
+
+
+def test_aborted_probe_keeps_cooldown():
+    breaker = _tripped()
+    cooldown = breaker.cooldown
+    breaker.allow()
+    breaker.release()
+    assert breaker.cooldown == cooldown
+
+
+def test_probe_outcome():
+    breaker = _tripped()
+    breaker.allow()
+    breaker.failure()
+    assert breaker.state == breakers.OPEN
+    assert breaker.cooldown == breakers.OPEN_SECONDS * 2
+    breaker.open_until = time.time()
+    breaker.allow()
+    breaker.success(0.1)
+    assert breaker.state == breakers.CLOSED
+    assert breaker.cooldown == breakers.OPEN_SECONDS
+
+
+def test_release_while_closed_is_a_no_op():
+    breaker = breakers.Breaker("test", slow_after=5)
+    breaker.release()
+    assert breaker.state == breakers.CLOSED
+    assert breaker.allow()
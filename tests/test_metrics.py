@@ -0,0 +1,36 @@
+"""Metrics flush and cross-worker aggregation."""
+
+import json
+import os
+import threading
+
+import metrics
+
+
+def test_concurrent_flushes():
+    metrics.inc("http_requests_total", route="/x")
+    errors = []
+
+    def flush():
+        try:
+            for _ in range(50):
+                metrics.flush()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=flush) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+    assert os.listdir(metrics.METRICS_DIR) == [f"{os.getpid()}.json"]
+
+
+def test_dead_workers_are_not_summed():
+    metrics.flush()
+    dead = os.path.join(metrics.METRICS_DIR, "999999999.json")
+    with open(dead, "w") as f:
+        json.dump({"counters": [["http_requests_total", [["route", "/dead"]], 5]], "histograms": []}, f)
+    assert "/dead" not in metrics.render()
+    assert not os.path.exists(dead)
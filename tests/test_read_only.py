@@ -0,0 +1,35 @@
+"""The read-only web (BACKGROUND_WORKER=1) never writes the worker's files on a read."""
+
+import os
+
+import pytest
+
+import activity_store
+import mileage
+import rollups
+import routes
+import shared_cache
+
+
+@pytest.fixture(autouse=True)
+def _fresh_stores(monkeypatch):
+    for module, name in ((activity_store, "_stores"), (activity_store, "_run_index"),
+                         (rollups, "_tables"), (routes, "_data"), (mileage, "_indexes")):
+        monkeypatch.setattr(module, name, {})
+
+
+def test_first_use_reads_leave_indexes_to_the_worker(monkeypatch):
+    activity_store.upsert([{"id": 1, "type": "Run", "start_date": "2026-03-02T14:00:00Z",
+                            "start_date_local": "2026-03-02T07:00:00", "distance": 5000,
+                            "moving_time": 1500}])
+    monkeypatch.setattr(shared_cache, "read_only", True)
+    rollups.get_rollups("year")
+    routes.list_routes()
+    mileage.current_week()
+    assert not os.path.exists(rollups.ROLLUPS_FILE)
+    assert not os.path.exists(routes.ROUTES_FILE)
+    assert not os.path.exists(mileage.MILEAGE_FILE)
+
+    monkeypatch.setattr(shared_cache, "read_only", False)
+    assert rollups.get_rollups("year")
+    assert os.path.exists(rollups.ROLLUPS_FILE)
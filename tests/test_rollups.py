@@ -0,0 +1,38 @@
+"""Rollup tables: ISO weeks in the year in review, and first-use builds."""
+
+import pytest
+
+import activity_store
+import rollups
+import routes
+
+
+@pytest.fixture(autouse=True)
+def _fresh_stores(monkeypatch):
+    for module, name in ((activity_store, "_stores"), (activity_store, "_run_index"),
+                         (rollups, "_tables"), (routes, "_data")):
+        monkeypatch.setattr(module, name, {})
+
+
+def _activity(i, day, sport="Run", meters=10000):
+    return {"id": i, "type": sport, "start_date": f"{day}T14:00:00Z", "start_date_local": f"{day}T07:00:00",
+            "distance": meters, "moving_time": 3000}
+
+
+def test_week_holding_new_year_counts_in_its_iso_year():
+    activity_store.upsert([_activity(1, "2026-01-02", meters=30000), _activity(2, "2026-03-03")])
+    review = rollups.year_in_review(2026)
+    assert review["biggestWeek"]["period"] == "2025-12-29"  # Monday before; its Thursday is Jan 1
+    assert review["activeWeeks"] == 2
+
+
+def test_store_without_runs_is_built_once(monkeypatch):
+    activity_store.upsert([_activity(1, "2026-03-03", sport="Ride")])
+    assert rollups.get_rollups("year") == []
+    assert routes.list_routes() == []
+    calls = []
+    monkeypatch.setattr(rollups, "update", lambda *a: calls.append(a))
+    monkeypatch.setattr(routes, "update", lambda *a: calls.append(a))
+    rollups.get_rollups("year")
+    routes.list_routes()
+    assert calls == []
@@ -0,0 +1,48 @@
+"""Binary stream files: Strava's gaps, and activities without streams."""
+
+import math
+
+import requests
+
+import stream_store
+
+
+def test_missed_samples():
+    raw = {
+        "time": {"data": [0, 1, 2, 3]},
+        "distance": {"data": [None, 2.5, None, 7.5]},
+        "altitude": {"data": [10.0, None, 12.0, 13.0]},
+        "heartrate": {"data": [140, None, 150, None]},
+        "latlng": {"data": [[37.9, -122.0], None, [37.9001, -122.0001], [37.9002, -122.0002]]},
+    }
+    assert stream_store.write_streams(1, raw) == 4
+    with stream_store.open_streams(1) as streams:
+        assert list(streams["distance"]) == [2.5, 2.5, 2.5, 7.5]
+        assert list(streams["altitude"]) == [10.0, 10.0, 12.0, 13.0]
+        assert list(streams["heartrate"]) == [140, 0, 150, 0]
+        assert streams["lat"][1] == streams["lat"][0]
+        assert not any(math.isnan(v) for v in streams["distance"])
+
+
+def test_unavailable_streams_are_not_refetched(monkeypatch):
+    calls = []
+
+    def fetch(activity_id):
+        calls.append(activity_id)
+        if activity_id == 1:  # manual entry
+            resp = requests.Response()
+            resp.status_code = 404
+            raise requests.HTTPError(response=resp)
+        if activity_id == 2:
+            raise ValueError("bad stream data")
+        if activity_id == 3:
+            raise requests.ConnectionError("offline")
+        return {"time": {"data": [0, 1]}}
+
+    monkeypatch.setattr(stream_store, "fetch_streams", fetch)
+    for _ in range(stream_store.MAX_ATTEMPTS + 2):
+        stream_store.ingest_many([1, 2, 3, 4])
+    assert calls.count(1) == 1
+    assert calls.count(2) == stream_store.MAX_ATTEMPTS
+    assert calls.count(3) == stream_store.MAX_ATTEMPTS + 2  # network errors are retried
+    assert calls.count(4) == 1
@@ -0,0 +1,74 @@
+"""Activity listing: newest first inline, gaps filled behind it."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+import activity_store
+import strava_client
+import sync
+
+
+@pytest.fixture(autouse=True)
+def _empty_store(monkeypatch):
+    """Each test starts from its own (empty) data directory — drop what earlier tests loaded."""
+    monkeypatch.setattr(activity_store, "_stores", {})
+    monkeypatch.setattr(activity_store, "_run_index", {})
+
+
+def _activity(i):
+    start = datetime.fromtimestamp(1_600_000_000 + i * 86400, timezone.utc)
+    return {"id": i, "type": "Run", "start_date": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "distance": 5000, "moving_time": 1500}
+
+
+def _fake_strava(monkeypatch, activities):
+    def api_get(path, params=None):
+        if params is None:  # /activities/{id}
+            return next(a for a in activities if path.endswith(f"/{a['id']}"))
+        rows = sorted(activities, key=lambda a: -a["id"])  # newest first
+        if "before" in params:
+            rows = [a for a in rows if activity_store.start_ts(a) < params["before"]]
+        if "after" in params:
+            rows = [a for a in rows if activity_store.start_ts(a) > params["after"]][::-1]
+        per_page, page = params["per_page"], params.get("page", 1)
+        return rows[(page - 1) * per_page:page * per_page]
+    monkeypatch.setattr(strava_client, "_api_get", api_get)
+    monkeypatch.setattr(sync, "_update_summaries", lambda changed: None)
+
+
+def test_inline_refresh_lists_newest_first(monkeypatch):
+    activities = [_activity(i) for i in range(1, 601)]
+    _fake_strava(monkeypatch, activities)
+    _, complete = sync.refresh_store()
+    assert not complete
+    assert activity_store.get(600) is not None  # latest run shows up on the first pass
+    assert sync._gaps()
+    while not complete:
+        _, complete = sync.refresh_store()
+    assert activity_store.count() == 600
+    assert sync._gaps() == []
+
+
+def test_caught_up_store_leaves_no_gap(monkeypatch):
+    activities = [_activity(i) for i in range(1, 11)]
+    _fake_strava(monkeypatch, activities)
+    assert sync.refresh_store()[1]
+    activities.append(_activity(11))
+    changed, complete = sync.refresh_store()
+    assert complete
+    assert sync._gaps() == []
+    assert activity_store.count() == 11
+
+
+def test_sync_skips_while_the_stores_are_locked(monkeypatch):
+    _fake_strava(monkeypatch, [_activity(1)])
+    with sync.store_lock():
+        assert sync.sync_if_stale() is None
+        assert sync.refresh_store_if_stale() is None
+        with pytest.raises(sync.StoreBusy):
+            sync.apply_event(1)
+    assert activity_store.count() == 0
+    assert not strava_client.cached("last_sync")[0]  # still due once the lock is free
+    assert sync.refresh_store()[1]
+    assert activity_store.count() == 1
@@ -0,0 +1,34 @@
+"""Forecast hours in the forecast cell's own time zone."""
+
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import weather_client
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache(monkeypatch):
+    monkeypatch.setattr(weather_client, "_cache", weather_client.OrderedDict())
+
+
+def _cache_cell(lat, lon, **zone):
+    start = int(time.time()) // 3600 * 3600
+    hourly = [{"dt": start + h * 3600, "temp": 50} for h in range(1, 49)]
+    weather_client._cache_set(weather_client.cell(lat, lon), {**zone, "hourly": hourly})
+    return hourly
+
+
+def test_hours_are_in_the_cells_zone():
+    hourly = _cache_cell(35.68, 139.76, timezone="Asia/Tokyo", timezone_offset=32400)
+    first = datetime.fromtimestamp(hourly[0]["dt"], ZoneInfo("Asia/Tokyo"))
+    hours = weather_client.get_hourly_forecast(lat=35.68, lon=139.76)["hours"]
+    assert hours[0]["time"] == weather_client._format_hour(first.hour)
+
+
+def test_offset_when_the_zone_name_is_unknown():
+    _cache_cell(0.01, 0.01, timezone="Nowhere/Unknown", timezone_offset=-3 * 3600)
+    entry = weather_client._cache[weather_client.cell(0.01, 0.01)]
+    assert entry["tz"].utcoffset(None).total_seconds() == -3 * 3600
@@ -0,0 +1,36 @@
+"""Time in zone, and the zone settings that drive it."""
+
+import pytest
+
+import zones
+
+
+def test_hr_dropouts_are_not_time_in_zone():
+    dts = [10, 10, 10, 10]
+    hr = [0, 150, 0, -1, 175]  # first sample only anchors the time diffs
+    assert zones.hr_distribution(dts, hr, [120, 140, 160, 170]) == [0, 0, 10, 0, 10]
+
+
+@pytest.fixture
+def client():
+    import app
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize("settings", [
+    {"hrZones": [150, 140, 160, 170]},
+    {"hrZones": [120, 140, 160]},
+    {"hrZones": [120, 140, "160", 170]},
+    {"paceZones": [420, 480, 540, 600]},
+    {"paceZones": [600, 540, 540, 420]},
+])
+def test_bad_zone_settings_are_rejected(client, settings):
+    resp = client.post("/api/settings", json=settings)
+    assert resp.status_code == 400
+    assert "hrZones" not in client.get("/api/settings").get_json()
+
+
+def test_zone_settings_saved(client):
+    resp = client.post("/api/settings", json={"hrZones": [120, 140, 160, 170], "paceZones": [600, 540, 480, 420]})
+    assert resp.status_code == 200
+    assert resp.get_json()["paceZones"] == [600, 540, 480, 420]
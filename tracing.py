@@ -0,0 +1,164 @@
+"""
+Lightweight per-request tracing.
+Each request gets a trace id; every upstream call is a span and every cache
+lookup an instant event, timed relative to the request start. Spans are
+appended to a rotating JSONL file when the request finishes, so the waterfall
+of a slow request can be looked up afterwards by id (X-Trace-Id header).
+"""
+
+import contextvars
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+TRACE_DIR = "traces"
+TRACE_FILE = os.path.join(TRACE_DIR, "traces.jsonl")
+TRACE_MAX_BYTES = 5 * 1024 * 1024
+TRACE_BACKUPS = 3
+
+_current = contextvars.ContextVar("trace", default=None)
+_logger = None
+
+
+class Trace:
+    __slots__ = ("trace_id", "start", "wall", "spans")
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.start = time.perf_counter()
+        self.wall = time.time()
+        self.spans = []
+
+
+def _get_logger():
+    global _logger
+    if _logger is None:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        handler = RotatingFileHandler(TRACE_FILE, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        _logger = logging.getLogger("running_dashboard.traces")
+        _logger.propagate = False
+        _logger.setLevel(logging.INFO)
+        _logger.addHandler(handler)
+    return _logger
+
+
+def begin(trace_id=None):
+    """Start a trace for the current request. Returns the trace id."""
+    trace = Trace(trace_id or uuid.uuid4().hex[:16])
+    _current.set(trace)
+    return trace.trace_id
+
+
+def current_id():
+    trace = _current.get()
+    return trace.trace_id if trace else None
+
+
+def _offset_ms(trace, t):
+    return round((t - trace.start) * 1000, 2)
+
+
+@contextmanager
+def span(name, **attrs):
+    """
+    Time the with-block as a span. Yields the attrs dict so the block can add
+    fields (e.g. status). No-op outside a traced request.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    start = time.perf_counter()
+    try:
+        yield attrs
+    except Exception as e:
+        attrs.setdefault("error", str(e)[:200])
+        raise
+    finally:
+        trace.spans.append({
+            "name": name,
+            "start_ms": _offset_ms(trace, start),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 2),
+            **attrs,
+        })
+
+
+def event(name, **attrs):
+    """Zero-duration span (cache lookups)."""
+    trace = _current.get()
+    if trace is None:
+        return
+    trace.spans.append({"name": name, "start_ms": _offset_ms(trace, time.perf_counter()), "duration_ms": 0, **attrs})
+
+
+def end(**attrs):
+    """Finish the request's trace and append its spans to the JSONL file."""
+    trace = _current.get()
+    if trace is None:
+        return
+    _current.set(None)
+    root = {
+        "name": "request",
+        "start_ms": 0,
+        "duration_ms": _offset_ms(trace, time.perf_counter()),
+        **attrs,
+    }
+    logger = _get_logger()
+    for i, s in enumerate([root] + trace.spans):
+        logger.info(json.dumps({"trace_id": trace.trace_id, "ts": trace.wall, "seq": i, **s}))
+
+
+# ---------------------------------------------------------------------------
+# Lookup (development viewer)
+# ---------------------------------------------------------------------------
+def _trace_files():
+    files = [f"{TRACE_FILE}.{i}" for i in range(TRACE_BACKUPS, 0, -1)] + [TRACE_FILE]
+    return [f for f in files if os.path.exists(f)]
+
+
+def _read_spans():
+    for path in _trace_files():
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def get_trace(trace_id):
+    """All spans for `trace_id`, in start order. None if not found."""
+    spans = [s for s in _read_spans() if s.get("trace_id") == trace_id]
+    if not spans:
+        return None
+    spans.sort(key=lambda s: (s["start_ms"], s["seq"]))
+    return {"trace_id": trace_id, "ts": spans[0]["ts"], "spans": spans}
+
+
+def recent(limit=50):
+    """Root spans of the most recent traces, newest first."""
+    roots = [s for s in _read_spans() if s.get("name") == "request"]
+    return roots[::-1][:limit]
+
+
+def waterfall(trace, width=60):
+    """Plain-text waterfall of a trace (one bar per span)."""
+    total = max((s["start_ms"] + s["duration_ms"] for s in trace["spans"]), default=0) or 1
+    lines = []
+    for s in trace["spans"]:
+        offset = int(s["start_ms"] / total * width)
+        bar = max(1, int(s["duration_ms"] / total * width))
+        label = s.get("route") or s.get("upstream") or s.get("cache") or ""
+        detail = s.get("path") or s.get("key") or ""
+        status = s.get("status") or s.get("outcome") or ""
+        lines.append(
+            f"{s['start_ms']:>9.1f}ms {s['duration_ms']:>8.1f}ms "
+            f"{' ' * offset}{'█' * bar}{' ' * (width - offset - bar)} "
+            f"{s['name']} {label} {detail} {status}".rstrip()
+        )
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,213 @@
+"""
+Training load model — daily load plus acute/chronic load and form.
+ATL (fatigue) and CTL (fitness) are exponentially weighted averages of daily
+load over 7 and 42 days; TSB (form) is yesterday's CTL minus yesterday's ATL.
+Updated incrementally: only days from the earliest changed one forward are
+recomputed.
+"""
+
+import json
+import math
+import os
+from datetime import date, timedelta
+
+import activity_store
+import shared_cache
+import tenancy
+from config import DEFAULT_MAX_HR, DEFAULT_REST_HR
+
+LOAD_FILE = "training_load.json"
+
+ATL_DAYS = 7
+CTL_DAYS = 42
+_ATL_K = 1 - math.exp(-1 / ATL_DAYS)
+_CTL_K = 1 - math.exp(-1 / CTL_DAYS)
+
+# Load per minute when there's no suffer score or heart rate — roughly an
+# easy aerobic run on the same TRIMP scale.
+DURATION_LOAD_PER_MIN = 1.0
+
+# contrib: str(activity_id) -> [date, load]   (what each activity added)
+# daily:   date -> load                         (sum of contributions)
+# series:  date -> [atl, ctl]                   (every day from first to last computed)
+_states = {}  # tenancy key -> (file mtime, state)
+
+
+def _load():
+    """The current athlete's state — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(LOAD_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _states.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        state = {"contrib": {}, "daily": {}, "series": {}}
+        if mtime is not None:
+            with open(path, "r") as f:
+                state.update(json.load(f))
+        _states[key] = cached = (mtime, state)
+    return cached[1]
+
+
+def _save():
+    path = tenancy.path(LOAD_FILE)
+    state = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+    _states[tenancy.key()] = (os.stat(path).st_mtime, state)
+
+
+# ---------------------------------------------------------------------------
+# Per-activity load
+# ---------------------------------------------------------------------------
+def activity_load(a, max_hr=DEFAULT_MAX_HR, rest_hr=DEFAULT_REST_HR):
+    """
+    Training load for one activity, best source first:
+    Strava suffer score → heart-rate TRIMP (Banister) → duration.
+    """
+    if a.get("suffer_score"):
+        return float(a["suffer_score"])
+
+    minutes = (a.get("moving_time") or 0) / 60
+    avg_hr = a.get("average_heartrate")
+    if avg_hr and max_hr > rest_hr:
+        hrr = min(max((avg_hr - rest_hr) / (max_hr - rest_hr), 0), 1)
+        return minutes * hrr * 0.64 * math.exp(1.92 * hrr)
+
+    return minutes * DURATION_LOAD_PER_MIN
+
+
+def _activity_day(a):
+    return (a.get("start_date_local") or "")[:10] or None
+
+
+# ---------------------------------------------------------------------------
+# Incremental update
+# ---------------------------------------------------------------------------
+def _recompute_from(start_day, end_day):
+    """Recompute ATL/CTL for every day in [start_day, end_day] from the day before."""
+    state = _load()
+    series = state["series"]
+    daily = state["daily"]
+
+    prev = series.get((start_day - timedelta(days=1)).isoformat(), [0.0, 0.0])
+    atl, ctl = prev
+    day = start_day
+    while day <= end_day:
+        key = day.isoformat()
+        load = daily.get(key, 0.0)
+        atl += (load - atl) * _ATL_K
+        ctl += (load - ctl) * _CTL_K
+        series[key] = [round(atl, 3), round(ctl, 3)]
+        day += timedelta(days=1)
+
+
+def _last_day():
+    series = _load()["series"]
+    return date.fromisoformat(max(series)) if series else None
+
+
+def update(activity_ids=None):
+    """
+    Apply new/changed/deleted activities to the daily load series.
+    With no ids (or nothing applied yet), reconciles the whole store —
+    cheap, summaries only.
+    Returns the earliest affected date (or None if nothing changed).
+    """
+    state = _load()
+    contrib = state["contrib"]
+    daily = state["daily"]
+
+    if activity_ids is None or not contrib:
+        stored = {str(a["id"]) for a in activity_store.all_activities()}
+        keys = stored | set(contrib)
+    else:
+        keys = {str(i) for i in activity_ids}
+
+    earliest = None
+    for key in keys:
+        a = activity_store.get(key)
+        new = None
+        if a and _activity_day(a):
+            new = [_activity_day(a), round(activity_load(a), 2)]
+        old = contrib.get(key)
+        if old == new:
+            continue
+        for entry, sign in ((old, -1), (new, 1)):
+            if not entry:
+                continue
+            day, load = entry
+            daily[day] = round(daily.get(day, 0.0) + sign * load, 2)
+            if abs(daily[day]) < 0.01:
+                daily.pop(day)
+            if earliest is None or day < earliest:
+                earliest = day
+        if new:
+            contrib[key] = new
+        else:
+            contrib.pop(key, None)
+
+    if earliest is None:
+        return None
+
+    # Series starts at the first day with load; drop anything before it
+    first = min(daily) if daily else earliest
+    start = max(earliest, first)
+    for key in [k for k in state["series"] if k < first or k >= start]:
+        state["series"].pop(key)
+    end = max(_last_day() or date.today(), date.today())
+    _recompute_from(date.fromisoformat(start), end)
+    _save()
+    return earliest
+
+
+def _extend_to_today():
+    """Carry the series forward through rest days up to today (saved unless read-only)."""
+    last = _last_day()
+    today = date.today()
+    if last and last < today:
+        _recompute_from(last + timedelta(days=1), today)
+        if not shared_cache.read_only:
+            _save()
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def _point(key):
+    state = _load()
+    atl, ctl = state["series"][key]
+    prev = state["series"].get(
+        (date.fromisoformat(key) - timedelta(days=1)).isoformat(), [0.0, 0.0]
+    )
+    return {
+        "date": key,
+        "load": round(state["daily"].get(key, 0.0), 1),
+        "atl": round(atl, 1),
+        "ctl": round(ctl, 1),
+        "tsb": round(prev[1] - prev[0], 1),
+    }
+
+
+def current():
+    """Today's point: { date, load, atl, ctl, tsb } or None with no history."""
+    if not _load()["series"]:
+        return None
+    _extend_to_today()
+    return _point(date.today().isoformat())
+
+
+def get_load(days=42):
+    """Last `days` of the series plus today's point."""
+    state = _load()
+    if not state["series"]:
+        return {"today": None, "series": []}
+    _extend_to_today()
+    today = date.today()
+    keys = [
+        (today - timedelta(days=i)).isoformat()
+        for i in range(days - 1, -1, -1)
+    ]
+    series = [_point(k) for k in keys if k in state["series"]]
+    return {"today": _point(today.isoformat()), "series": series}
@@ -0,0 +1,72 @@
+"""
+Unit conversions and display formatting.
+Imperial helpers produce the wireframe's strings ("1h 42m", "7:24 AM · Feb 8");
+the unit-aware ones switch on Strava's measurement_preference ("feet" / "meters").
+"""
+
+from datetime import datetime
+
+# ---------------------------------------------------------------------------
+# Unit conversions
+# ---------------------------------------------------------------------------
+def meters_to_miles(m):
+    return round(m * 0.000621371, 1)
+
+
+def meters_to_feet(m):
+    return round(m * 3.28084)
+
+
+def format_duration(seconds):
+    """Format seconds to '1h 42m' or '35m'."""
+    if not seconds:
+        return "—"
+    hours = int(seconds // 3600)
+    mins = int((seconds % 3600) // 60)
+    if hours > 0:
+        return f"{hours}h {mins:02d}m"
+    return f"{mins}m"
+
+
+def format_date(iso_string):
+    """'2026-02-08T07:24:00Z' → '7:24 AM · Feb 8'."""
+    dt = datetime.fromisoformat(iso_string.replace("Z", "+00:00"))
+    return dt.strftime("%-I:%M %p · %b %-d")
+
+
+# ---------------------------------------------------------------------------
+# Unit-aware formatting (measurement_preference: "feet" or "meters")
+# ---------------------------------------------------------------------------
+METRIC = "meters"
+
+
+def meters_to_km(m):
+    return round(m / 1000, 1)
+
+
+def format_distance(meters, units="feet"):
+    """'13.3 mi' or '21.4 km'."""
+    if units == METRIC:
+        return f"{meters_to_km(meters or 0)} km"
+    return f"{meters_to_miles(meters or 0)} mi"
+
+
+def format_pace(meters_per_sec, units="feet", suffix=True):
+    """'7:42 /mi' or '4:47 /km' (suffix=False → '7:42')."""
+    if not meters_per_sec:
+        return "—"
+    unit_m, label = (1000, "/km") if units == METRIC else (1609.34, "/mi")
+    secs = unit_m / meters_per_sec
+    text = f"{int(secs // 60)}:{int(secs % 60):02d}"
+    return f"{text} {label}" if suffix else text
+
+
+def format_elevation(meters, units="feet", signed=False):
+    """'512 ft' / '156 m', or signed split style '+12ft' / '-4m'."""
+    if units == METRIC:
+        value, label = round(meters or 0), "m"
+    else:
+        value, label = meters_to_feet(meters or 0), "ft"
+    if signed:
+        return f"{'+' if value >= 0 else ''}{value}{label}"
+    return f"{value} {label}"
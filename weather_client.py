@@ -2,16 +2,25 @@
 OpenWeatherMap client for running-hour forecasts.
 Uses One Call API 3.0 (/data/3.0/onecall) for true hourly data.
 Returns data shaped to match the wireframe WEATHER constant.
+
+Forecasts are for any lat/lon, snapped to a CELL_DEG grid: one One Call
+response per cell serves every request in it (both the 18-hour card and the
+assistant's 48 hours), and at most FORECAST_CELLS cells are kept, least
+recently used dropped first — so more places never means more calls per
+place. LOCATIONS are named presets. Hours are in the cell's own time zone,
+as One Call reports it.
 """
 
+import math
 import time
-import requests
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from zoneinfo import ZoneInfo
-from config import OPENWEATHER_API_KEY
-
-# Both locations are in California
-LOCAL_TZ = ZoneInfo("America/Los_Angeles")
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import deadlines
+import http_client
+import metrics
+import tracing
+from config import OPENWEATHER_API_KEY, OPENWEATHER_API_BASE
 
 # ---------------------------------------------------------------------------
 # Locations
@@ -21,23 +30,105 @@ LOCATIONS = {
     "danville": {"lat": 37.822, "lon": -121.999, "name": "Danville"},
 }
 
+CELL_DEG = 0.05       # ~5 km — a forecast is the same across a cell
+FORECAST_CELLS = 32   # cells cached (and kept warm by the worker)
+
+
+def cell(lat, lon):
+    """Grid cell of a point, as the 'lat,lon' of its centre."""
+    lat, lon = float(lat), float(lon)
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180) or math.isnan(lat + lon):
+        raise ValueError(f"Invalid coordinates: {lat}, {lon}")
+    centre_lat, centre_lon = ((math.floor(v / CELL_DEG) + 0.5) * CELL_DEG for v in (lat, lon))
+    return f"{centre_lat:.3f},{centre_lon:.3f}"
+
+
+def resolve(location=None, lat=None, lon=None):
+    """Cell for explicit coordinates, else for a LOCATIONS preset (raises ValueError if unknown)."""
+    if lat is not None and lon is not None:
+        return cell(lat, lon)
+    loc = LOCATIONS.get((location or "concord").lower())
+    if not loc:
+        raise ValueError(f"Unknown location: {location}")
+    return cell(loc["lat"], loc["lon"])
+
+
 # ---------------------------------------------------------------------------
-# Simple in-memory cache (30 min TTL for weather)
+# Per-cell cache (30 min TTL, LRU-bounded)
 # ---------------------------------------------------------------------------
 WEATHER_CACHE_TTL = 1800  # 30 minutes
 
-_cache = {}
+_cache = OrderedDict()  # cell -> {"data": raw One Call response, "tz": the cell's time zone, "ts"}
 
 
 def _cached(key):
     entry = _cache.get(key)
-    if entry and time.time() - entry["ts"] < WEATHER_CACHE_TTL:
-        return True, entry["data"]
+    hit = bool(entry) and time.time() - entry["ts"] < WEATHER_CACHE_TTL
+    metrics.cache_lookup("weather", hit)
+    tracing.event("cache", cache="weather", key=key, outcome="hit" if hit else "miss")
+    if entry:
+        _cache.move_to_end(key)
+    if hit:
+        return True, entry
     return False, None
 
 
+def _zone(raw):
+    """The cell's local time zone: One Call's `timezone` name, else its fixed `timezone_offset`."""
+    try:
+        return ZoneInfo(raw["timezone"])
+    except (KeyError, ValueError, ZoneInfoNotFoundError):
+        return timezone(timedelta(seconds=raw.get("timezone_offset", 0)))
+
+
 def _cache_set(key, data):
-    _cache[key] = {"data": data, "ts": time.time()}
+    _cache[key] = {"data": data, "tz": _zone(data), "ts": time.time()}
+    _cache.move_to_end(key)
+    while len(_cache) > FORECAST_CELLS:
+        _cache.popitem(last=False)
+
+
+def _stale(key, exc):
+    """Out-of-budget fallback: last cached value regardless of age (section marked partial)."""
+    entry = _cache.get(key)
+    if entry is None:
+        raise exc
+    deadlines.mark_partial()
+    return entry["data"], entry["tz"]
+
+
+def _onecall(key):
+    """
+    Raw One Call hourly forecast for a cell and the cell's time zone — one
+    upstream call per cell per TTL.
+    """
+    hit, entry = _cached(key)
+    if hit:
+        return entry["data"], entry["tz"]
+
+    if not OPENWEATHER_API_KEY:
+        raise Exception("OPENWEATHER_API_KEY not configured")
+
+    lat, lon = key.split(",")
+    try:
+        resp = http_client.get(
+            http_client.OPENWEATHER,
+            f"{OPENWEATHER_API_BASE}/data/3.0/onecall",
+            params={
+                "lat": lat,
+                "lon": lon,
+                "exclude": "minutely,daily,alerts",
+                "appid": OPENWEATHER_API_KEY,
+                "units": "imperial",
+            },
+            timeout=10,
+        )
+    except deadlines.DeadlineExceeded as e:
+        return _stale(key, e)
+    resp.raise_for_status()
+    raw = resp.json()
+    _cache_set(key, raw)
+    return raw, _cache[key]["tz"]
 
 
 # ---------------------------------------------------------------------------
@@ -58,54 +149,28 @@ def _format_hour(hour):
 # ---------------------------------------------------------------------------
 # Fetch + transform
 # ---------------------------------------------------------------------------
-def get_hourly_forecast(location="concord"):
+def get_hourly_forecast(location="concord", lat=None, lon=None):
     """
-    Fetch forecast from OpenWeatherMap One Call API 3.0.
+    Forecast for a LOCATIONS preset, or for lat/lon (its grid cell).
 
     Returns the next 18 hours from the current time, with dayOffset
-    calculated relative to today (0 = today, 1 = tomorrow).
+    calculated relative to today (0 = today, 1 = tomorrow) in the cell's time zone.
 
     Returns dict:
       {
         "hours": [{ time, temp, rain, wind, type, dayOffset }, ...]
       }
     """
-    loc_key = location.lower()
-    cache_key = f"weather_{loc_key}"
-
-    hit, data = _cached(cache_key)
-    if hit:
-        return data
-
-    loc = LOCATIONS.get(loc_key)
-    if not loc:
-        raise ValueError(f"Unknown location: {location}")
-
-    if not OPENWEATHER_API_KEY:
-        raise Exception("OPENWEATHER_API_KEY not configured")
+    raw, tz = _onecall(resolve(location, lat, lon))
 
-    resp = requests.get(
-        "https://api.openweathermap.org/data/3.0/onecall",
-        params={
-            "lat": loc["lat"],
-            "lon": loc["lon"],
-            "exclude": "minutely,daily,alerts",
-            "appid": OPENWEATHER_API_KEY,
-            "units": "imperial",
-        },
-        timeout=10,
-    )
-    resp.raise_for_status()
-    raw = resp.json()
-
-    now = datetime.now(LOCAL_TZ)
+    now = datetime.now(tz)
     today = now.date()
     cutoff = now + timedelta(hours=18)
     hourly = raw.get("hourly", [])
     hours = []
 
     for item in hourly:
-        dt = datetime.fromtimestamp(item["dt"], tz=LOCAL_TZ)
+        dt = datetime.fromtimestamp(item["dt"], tz=tz)
         if dt < now:
             continue
         if dt > cutoff:
@@ -113,55 +178,32 @@ def get_hourly_forecast(location="concord"):
         day_offset = (dt.date() - today).days
         hours.append(_format_item(item, dt, day_offset=day_offset))
 
-    result = {"hours": hours}
-    _cache_set(cache_key, result)
-    return result
+    return {"hours": hours}
 
 
-def get_48h_forecast(location="concord"):
+def get_48h_forecast(location="concord", lat=None, lon=None):
     """
     Fetch today + tomorrow weather for AI assistant context.
     Returns list of hour dicts with dayOffset (0=today, 1=tomorrow).
+    Shares the cell's cached response with get_hourly_forecast.
     """
-    cache_key = f"weather_48h_{location.lower()}"
-    hit, data = _cached(cache_key)
-    if hit:
-        return data
-
-    loc = LOCATIONS.get(location.lower())
-    if not loc or not OPENWEATHER_API_KEY:
-        return []
-
     try:
-        resp = requests.get(
-            "https://api.openweathermap.org/data/3.0/onecall",
-            params={
-                "lat": loc["lat"],
-                "lon": loc["lon"],
-                "exclude": "minutely,daily,alerts",
-                "appid": OPENWEATHER_API_KEY,
-                "units": "imperial",
-            },
-            timeout=10,
-        )
-        resp.raise_for_status()
-        raw = resp.json()
+        raw, tz = _onecall(resolve(location, lat, lon))
     except Exception:
         return []
 
-    now = datetime.now(LOCAL_TZ)
+    now = datetime.now(tz)
     today = now.date()
     tomorrow = today + timedelta(days=1)
     hours = []
 
     for item in raw.get("hourly", []):
-        dt = datetime.fromtimestamp(item["dt"], tz=LOCAL_TZ)
+        dt = datetime.fromtimestamp(item["dt"], tz=tz)
         if dt.date() == today and dt >= now:
             hours.append(_format_item(item, dt, day_offset=0))
         elif dt.date() == tomorrow and 6 <= dt.hour <= 18:
             hours.append(_format_item(item, dt, day_offset=1))
 
-    _cache_set(cache_key, hours)
     return hours
 
 
@@ -0,0 +1,206 @@
+"""
+Weather at the start of each activity — observed conditions from OpenWeather's
+One Call 3.0 historical endpoint (/onecall/timemachine), so pace can be read
+against heat and wind.
+
+Lookups are keyed by cell-hour: the start point snapped to a CELL_DEG grid and
+the start time floored to the hour. Observations go in one cache shared by
+every athlete (weather isn't personal) and a cached cell-hour is never fetched
+again, so runs from the same neighbourhood in the same hour — and re-enriching
+the whole history — cost nothing. New cell-hours are fetched newest first,
+at most CALLS_PER_PASS per sync pass and WEATHER_HISTORY_DAILY_CALLS per UTC
+day (OpenWeather's quota day); the rest wait for later passes. Each athlete's
+file only maps activity → cell-hour.
+
+Backfill or re-attach from the cache by hand:
+
+    python weather_history.py [--athlete 12345] [--limit 200] [--reattach]
+
+Offline, point OPENWEATHER_API_BASE at the benchmarks stand-in (benchmarks/stubs.py).
+"""
+
+import argparse
+import json
+import math
+import os
+from datetime import datetime, timezone
+
+import requests
+
+import activity_store
+import deadlines
+import http_client
+import tenancy
+from config import OPENWEATHER_API_KEY, OPENWEATHER_API_BASE, WEATHER_HISTORY_DAILY_CALLS
+
+WEATHER_HISTORY_FILE = "weather_history.json"   # shared: {cells: {cell-hour: obs}, budget}
+ACTIVITY_WEATHER_FILE = "activity_weather.json"  # per athlete: {activity id: cell-hour}
+CELL_DEG = 0.1          # ~11 km — conditions barely differ within a cell
+CALLS_PER_PASS = 50     # new cell-hours fetched per sync pass
+
+# Fields kept from each observation (metric: °C, m/s)
+FIELDS = ("temp", "feels_like", "humidity", "dew_point", "clouds", "wind_speed", "wind_deg", "wind_gust")
+
+_files = {}  # path -> (mtime, data)
+
+
+def _read(path, empty):
+    """JSON file contents, re-read when another process (the worker) rewrote it."""
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _files.get(path)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        data = empty()
+        if mtime is not None:
+            with open(path, "r") as f:
+                data.update(json.load(f))
+        _files[path] = cached = (mtime, data)
+    return cached[1]
+
+
+def _write(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    _files[path] = (os.stat(path).st_mtime, data)
+
+
+def _cache():
+    return _read(WEATHER_HISTORY_FILE, lambda: {"cells": {}, "budget": {"day": None, "calls": 0}})
+
+
+def _attached():
+    return _read(tenancy.path(ACTIVITY_WEATHER_FILE), dict)
+
+
+# ---------------------------------------------------------------------------
+# Cell-hours + budget
+# ---------------------------------------------------------------------------
+def cell_hour(a):
+    """'lat,lng@epoch hour' for an activity's start (cell centre), or None without GPS."""
+    latlng = a.get("start_latlng")
+    if not latlng or len(latlng) < 2 or not a.get("start_date"):
+        return None
+    lat, lng = ((math.floor(v / CELL_DEG) + 0.5) * CELL_DEG for v in latlng[:2])
+    hour = int(activity_store.start_ts(a)) // 3600
+    return f"{lat:.2f},{lng:.2f}@{hour}"
+
+
+def budget_left():
+    """Historical lookups still allowed today (UTC)."""
+    budget = _cache()["budget"]
+    today = datetime.now(timezone.utc).date().isoformat()
+    return WEATHER_HISTORY_DAILY_CALLS - (budget["calls"] if budget["day"] == today else 0)
+
+
+def _spend(cache):
+    budget = cache["budget"]
+    today = datetime.now(timezone.utc).date().isoformat()
+    if budget["day"] != today:
+        budget.update(day=today, calls=0)
+    budget["calls"] += 1
+
+
+def _fetch(key):
+    """
+    Observed conditions for one cell-hour; None if OpenWeather has nothing
+    for it (e.g. before its archive starts), which is cached like any answer.
+    """
+    where, hour = key.split("@")
+    lat, lng = where.split(",")
+    resp = http_client.get(
+        http_client.OPENWEATHER,
+        f"{OPENWEATHER_API_BASE}/data/3.0/onecall/timemachine",
+        params={"lat": lat, "lon": lng, "dt": int(hour) * 3600,
+                "appid": OPENWEATHER_API_KEY, "units": "metric"},
+        timeout=10,
+    )
+    if resp.status_code in (400, 404):
+        return None
+    resp.raise_for_status()
+    data = (resp.json().get("data") or [None])[0]
+    if not data:
+        return None
+    obs = {k: data[k] for k in FIELDS if data.get(k) is not None}
+    conditions = data.get("weather") or []
+    obs["desc"] = conditions[0].get("main") if conditions else None
+    return obs
+
+
+# ---------------------------------------------------------------------------
+# Enrichment
+# ---------------------------------------------------------------------------
+def enrich(limit=CALLS_PER_PASS, reattach=False):
+    """
+    Attach cached conditions to the current athlete's activities and fetch up
+    to `limit` missing cell-hours (within today's budget), newest activities
+    first. `reattach` rebuilds the athlete's map from the cache (no refetches).
+    Returns {"attached", "fetched", "pending"} — pending = cell-hours still to fetch.
+    """
+    cache = _cache()
+    cells = cache["cells"]
+    attached = _attached()
+    if reattach:
+        attached.clear()
+    counts = {"attached": 0, "fetched": 0, "pending": 0}
+    spent = 0
+    missing = {}  # cell-hour -> [activity ids], newest first
+    for a in activity_store.all_activities():
+        key = cell_hour(a)
+        if key is None or attached.get(str(a["id"])) == key:
+            continue
+        if key in cells:
+            attached[str(a["id"])] = key
+            counts["attached"] += 1
+        else:
+            missing.setdefault(key, []).append(str(a["id"]))
+
+    if missing and not OPENWEATHER_API_KEY:
+        print("Weather history: OPENWEATHER_API_KEY not configured")
+    elif missing:
+        for key in list(missing)[:max(0, min(limit, budget_left()))]:
+            try:
+                cells[key] = _fetch(key)
+            except (requests.RequestException, deadlines.DeadlineExceeded) as e:
+                print(f"Weather history: lookup for {key} failed: {e}")
+                break  # try the rest next pass
+            finally:
+                _spend(cache)
+                spent += 1
+            counts["fetched"] += 1
+            for activity_id in missing.pop(key):
+                attached[activity_id] = key
+                counts["attached"] += 1
+    counts["pending"] = len(missing)
+
+    if spent:
+        _write(WEATHER_HISTORY_FILE, cache)  # also keeps today's spend
+    if counts["attached"] or reattach:
+        _write(tenancy.path(ACTIVITY_WEATHER_FILE), attached)
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# Read
+# ---------------------------------------------------------------------------
+def at_start(activity_id):
+    """Observed conditions at the activity's start (metric), or None if not enriched yet."""
+    key = _attached().get(str(activity_id))
+    return _cache()["cells"].get(key) if key else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Attach observed weather to stored activities.")
+    parser.add_argument("--athlete", help="Strava athlete id (default: single-athlete install)")
+    parser.add_argument("--limit", type=int, default=CALLS_PER_PASS, help="max new lookups (default %(default)s)")
+    parser.add_argument("--reattach", action="store_true", help="rebuild the activity map from the cache first")
+    args = parser.parse_args()
+
+    with tenancy.use(args.athlete):
+        counts = enrich(limit=args.limit, reattach=args.reattach)
+    print(f"Attached weather to {counts['attached']} activities ({counts['fetched']} lookups, "
+          f"{counts['pending']} cell-hours left, {budget_left()} lookups left today)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Background worker — owns every upstream call when the web runs with
+BACKGROUND_WORKER=1 (`python worker.py`, on the same disk as the web: the
+two only share files — see README "Background worker").
+
+Each pass syncs the athletes that are due (sharing Strava's app-wide limit,
+see sync.py), refreshes the forecast for every warm cell (presets, active
+athletes' home cells, places the web was asked for), then rebuilds the
+dashboard payloads of athletes active in the last ACTIVE_WINDOW — activity
+feed (with geocoding), week summaries, profile and coaching message — and
+publishes them to shared_cache. Between passes it polls for refresh requests
+from the web, so a new sign-in, a manual refresh or a Strava webhook event
+doesn't wait a full pass.
+"""
+
+import time
+
+import assistant_client
+import payloads
+import rollups
+import routes
+import shared_cache
+import strava_client
+import sync
+import tenancy
+import weather_client
+import zones
+from config import BACKGROUND_WORKER, DEFAULT_WEEKLY_GOAL, WORKER_INTERVAL
+
+POLL_INTERVAL = 1.0       # seconds between checks for refresh requests
+ACTIVE_WINDOW = 6 * 3600  # keep payloads fresh for athletes seen this recently
+
+_weather_tried = {}  # forecast cell -> when publish_wanted_weather last tried it
+
+
+def _publish(name, build, label, **kwargs):
+    """Build and publish one payload; a failure leaves the previous one in place."""
+    try:
+        shared_cache.publish(name, build(), **kwargs)
+    except Exception as e:
+        print(f"Worker: {name} for {label} failed: {e}")
+
+
+def _guarded(step, label):
+    """Run one step of the loop; a failure is logged and the worker carries on."""
+    try:
+        step()
+    except Exception as e:
+        print(f"Worker: {label} failed: {e}")
+
+
+def weather_cells(athletes=()):
+    """
+    Forecast cells to keep warm, at most weather_client.FORECAST_CELLS: the
+    presets, the home cell of each of `athletes`, then cells the web was asked
+    for recently (newest first).
+    """
+    cells = [weather_client.resolve(location) for location in weather_client.LOCATIONS]
+    for athlete_id in athletes:
+        with tenancy.use(athlete_id):
+            try:
+                cells += payloads.home_cells()
+            except Exception as e:
+                print(f"Worker: home cell for athlete {athlete_id or 'legacy'} failed: {e}")
+    cells += shared_cache.wanted_weather(ACTIVE_WINDOW)
+    return list(dict.fromkeys(cells))[:weather_client.FORECAST_CELLS]
+
+
+def publish_weather(cells):
+    for cell in cells:
+        lat, lon = cell.split(",")
+        _publish(f"weather_{cell}", lambda: weather_client.get_hourly_forecast(lat=lat, lon=lon),
+                 "app", shared=True)
+
+
+def publish_wanted_weather():
+    """Publish cells the web has just asked for and nobody has published yet (one try per pass interval)."""
+    now = time.time()
+    cells = [cell for cell in shared_cache.wanted_weather(ACTIVE_WINDOW)[:weather_client.FORECAST_CELLS]
+             if now - _weather_tried.get(cell, 0) >= WORKER_INTERVAL
+             and shared_cache.read(f"weather_{cell}", shared=True) is None]
+    for cell in cells:
+        _weather_tried[cell] = now
+    publish_weather(cells)
+
+
+def publish_athlete(athlete_id, cursors=()):
+    """Rebuild one athlete's payloads: feed (plus pages before `cursors`), weeks, profile, coaching."""
+    label = f"athlete {athlete_id or 'legacy'}"
+    with tenancy.use(athlete_id):
+        try:
+            settings = payloads.load_settings()
+        except Exception as e:
+            print(f"Worker: settings for {label} unreadable, payloads not refreshed: {e}")
+            return
+        goal = settings.get("goalMi", DEFAULT_WEEKLY_GOAL)
+        hr_bounds, pace_bounds = payloads.zone_bounds(settings)
+        # applies changed zone settings
+        _guarded(lambda: zones.update(hr_bounds=hr_bounds, pace_bounds=pace_bounds), f"zones for {label}")
+        # builds the indexes of an existing store on first use (the read-only web only reads them)
+        _guarded(lambda: (rollups.get_rollups("year"), routes.list_routes()), f"indexes for {label}")
+        for before in [None, *cursors]:
+            _publish(payloads.feed_payload_name(before), lambda: payloads.build_feed(before=before), label)
+        _publish("week", lambda: payloads.build_week(goal), label)
+        _publish("weeks", payloads.build_weeks, label)
+        _publish("profile", lambda: payloads.build_profile(settings), label)
+        _publish("assistant", lambda: assistant_client.get_coaching_message(**payloads.coaching_context(settings)),
+                 label)
+
+
+def run_pass():
+    """Sync whoever is due, then refresh weather and every active athlete's payloads."""
+    _guarded(sync.sync_all, "sync")
+    connected = set(tenancy.athletes(strava_client.TOKEN_FILE))
+    active = [a for a in shared_cache.active_athletes(ACTIVE_WINDOW) if a in connected]
+    _guarded(lambda: publish_weather(weather_cells(active)), "weather")
+    for athlete_id in active:
+        _guarded(lambda: publish_athlete(athlete_id), f"athlete {athlete_id or 'legacy'}")
+
+
+def handle_requests():
+    """Serve refresh requests from the web: apply webhook events, sync the athlete if due, then republish."""
+    for athlete_id, force, cursors, activities, retyped in shared_cache.take_refresh_requests():
+        with tenancy.use(athlete_id):
+            try:
+                if force:
+                    strava_client.cache_clear()  # also forgets last_sync, so the sync below runs
+                for activity_id in activities:
+                    sync.apply_event(activity_id)
+                if retyped:
+                    rollups.update(retyped)
+                sync.sync_if_stale()
+            except sync.StoreBusy:
+                # An import holds the stores — keep the events for the next poll
+                shared_cache.request_refresh(activities=activities, retyped=retyped)
+            except Exception as e:
+                print(f"Worker: sync for athlete {athlete_id or 'legacy'} failed: {e}")
+        _guarded(lambda: publish_athlete(athlete_id, cursors=cursors), f"athlete {athlete_id or 'legacy'}")
+
+
+def main():
+    if not BACKGROUND_WORKER:
+        # The web calls upstreams itself — two writers on the same stores
+        raise SystemExit("Worker: BACKGROUND_WORKER=1 isn't set, so the web runs all-in-one — not starting")
+    print(f"Worker started — full pass every {WORKER_INTERVAL}s")
+    next_pass = 0
+    while True:
+        if time.time() >= next_pass:
+            _guarded(run_pass, "pass")
+            next_pass = time.time() + WORKER_INTERVAL
+        _guarded(handle_requests, "refresh requests")
+        _guarded(publish_wanted_weather, "requested weather")
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Heart-rate and pace time-in-zone, per activity and per week.
+Per-activity distributions come from streams; weekly rollups come from a
+cumulative per-day index, so a year of weekly histograms is two lookups per
+week instead of a rescan of every stream.
+"""
+
+import json
+import os
+from bisect import bisect_left, bisect_right
+from itertools import compress, repeat
+from operator import ge, gt, mul, sub
+
+import activity_store
+import stream_store
+import tenancy
+from config import DEFAULT_MAX_HR
+
+ZONES_FILE = "zones_index.json"
+
+METERS_PER_MILE = 1609.34
+
+# Zone boundaries — upper bpm of zones 1-4 (zone 5 is everything above)
+DEFAULT_HR_ZONES = [round(DEFAULT_MAX_HR * p) for p in (0.6, 0.7, 0.8, 0.9)]
+# Pace boundaries in seconds per mile, slowest first: Z1 slower than 10:00 … Z5 faster than 7:00
+DEFAULT_PACE_ZONES = [600, 540, 480, 420]
+
+# Gaps longer than this (auto-pause, GPS dropout) count as this many seconds
+MAX_SAMPLE_GAP = 30
+
+# bounds:     [hr_bounds, pace_bounds] the index was built with
+# activities: str(activity_id) -> {"day", "hr": [secs per zone], "pace": [...]}
+# unindexed:  runs whose streams give no distribution (no time stream / no date), not reopened
+# days:       sorted days with at least one indexed activity
+# cum_hr / cum_pace: running totals per zone through each entry in `days`
+_indexes = {}  # tenancy key -> (file mtime, index)
+
+
+def _empty(bounds):
+    return {"bounds": bounds, "activities": {}, "unindexed": [], "days": [], "cum_hr": [], "cum_pace": []}
+
+
+def _load():
+    """The current athlete's index — from disk on first use, again if the file changed."""
+    key = tenancy.key()
+    path = tenancy.path(ZONES_FILE)
+    mtime = os.stat(path).st_mtime if os.path.exists(path) else None
+    cached = _indexes.get(key)
+    if cached is None or (mtime is not None and cached[0] != mtime):
+        index = _empty([DEFAULT_HR_ZONES, DEFAULT_PACE_ZONES])
+        if mtime is not None:
+            with open(path, "r") as f:
+                index = json.load(f)
+        _indexes[key] = cached = (mtime, index)
+    return cached[1]
+
+
+def _save():
+    path = tenancy.path(ZONES_FILE)
+    index = _load()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, path)
+    _indexes[tenancy.key()] = (os.stat(path).st_mtime, index)
+
+
+# ---------------------------------------------------------------------------
+# Per-activity distribution
+# ---------------------------------------------------------------------------
+def _diffs(values):
+    return list(map(sub, values[1:], values[:-1]))
+
+
+def _above(dts, mask_iter):
+    return sum(compress(dts, mask_iter))
+
+
+def hr_distribution(dts, hr, bounds):
+    """
+    Seconds per HR zone (len(bounds) + 1 zones, lowest first). Samples with no
+    reading (hr <= 0: strap dropouts) are excluded.
+    """
+    hr = hr[1:]
+    total = _above(dts, map(gt, hr, repeat(0)))
+    # seconds at or above each boundary, one C-level pass per boundary
+    above = [_above(dts, map(ge, hr, repeat(b))) for b in sorted(bounds)]
+    edges = [total] + above + [0]
+    return [round(edges[k] - edges[k + 1]) for k in range(len(edges) - 1)]
+
+
+def pace_distribution(dts, dds, bounds):
+    """
+    Seconds per pace zone (slowest first). Compares speed instead of pace so
+    stationary samples need no division: pace <= b  ⇔  dd·b >= mile·dt.
+    Samples with no forward movement are excluded.
+    """
+    moving = _above(dts, map(gt, dds, repeat(0)))
+    scaled_dt = list(map(mul, dts, repeat(METERS_PER_MILE)))
+    faster = [
+        _above(dts, map(ge, map(mul, dds, repeat(b)), scaled_dt))
+        for b in sorted(bounds, reverse=True)  # slowest boundary first
+    ]
+    edges = [moving] + faster + [0]
+    return [round(edges[k] - edges[k + 1]) for k in range(len(edges) - 1)]
+
+
+def activity_zones(streams, hr_bounds, pace_bounds):
+    """Time in HR and pace zones for one activity's Streams. None if no time stream."""
+    if "time" not in streams or streams.count < 2:
+        return None
+    dts = list(map(min, _diffs(streams["time"]), repeat(MAX_SAMPLE_GAP)))
+
+    hr = streams.get("heartrate")
+    dist = streams.get("distance")
+    return {
+        "hr": hr_distribution(dts, hr, hr_bounds) if hr is not None else None,
+        "pace": pace_distribution(dts, _diffs(dist), pace_bounds) if dist is not None else None,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Cumulative index
+# ---------------------------------------------------------------------------
+def _add(a, b):
+    if a is None:
+        a = [0] * len(b)
+    return [x + y for x, y in zip(a, b)]
+
+
+def _rebuild_prefix(from_day):
+    """Recompute running totals for every indexed day from `from_day` on."""
+    index = _load()
+    per_day = {}
+    for entry in index["activities"].values():
+        if entry["day"] < from_day:
+            continue
+        hr, pace = per_day.setdefault(entry["day"], [None, None])
+        per_day[entry["day"]] = [
+            _add(hr, entry["hr"]) if entry["hr"] else hr,
+            _add(pace, entry["pace"]) if entry["pace"] else pace,
+        ]
+
+    days = index["days"]
+    keep = bisect_left(days, from_day)
+    n_hr = len(index["bounds"][0]) + 1
+    n_pace = len(index["bounds"][1]) + 1
+    cum_hr = index["cum_hr"][:keep]
+    cum_pace = index["cum_pace"][:keep]
+    run_hr = cum_hr[-1] if cum_hr else [0] * n_hr
+    run_pace = cum_pace[-1] if cum_pace else [0] * n_pace
+
+    new_days = days[:keep]
+    for day in sorted(per_day):
+        hr, pace = per_day[day]
+        if hr:
+            run_hr = _add(run_hr, hr)
+        if pace:
+            run_pace = _add(run_pace, pace)
+        new_days.append(day)
+        cum_hr.append(run_hr)
+        cum_pace.append(run_pace)
+
+    index["days"] = new_days
+    index["cum_hr"] = cum_hr
+    index["cum_pace"] = cum_pace
+
+
+def _set_bounds(hr_bounds, pace_bounds):
+    """Reset the index if the zone boundaries changed."""
+    bounds = [list(hr_bounds), list(pace_bounds)]
+    index = _load()
+    if index["bounds"] != bounds:
+        index.clear()
+        index.update(_empty(bounds))
+
+
+def update(activity_ids=None, hr_bounds=None, pace_bounds=None):
+    """
+    Index runs that have streams but aren't indexed yet (plus `activity_ids`,
+    rescanned even if indexed). Omitted bounds keep the index's current ones;
+    different bounds rebuild the index. Returns the number of runs scanned.
+    """
+    index = _load()
+    _set_bounds(hr_bounds or index["bounds"][0], pace_bounds or index["bounds"][1])
+    hr_b, pace_b = index["bounds"]
+    force = {str(i) for i in (activity_ids or [])}
+    indexed = index["activities"]
+    was_unindexed = set(index.get("unindexed", []))
+    unindexed = set(was_unindexed)
+    stored = activity_store.by_id()
+
+    earliest = None
+    scanned = 0
+    for key in force:
+        a = stored.get(key)
+        if a is not None and activity_store.is_run(a):
+            continue
+        unindexed.discard(key)
+        old = indexed.pop(key, None)  # deleted
+        if old and (earliest is None or old["day"] < earliest):
+            earliest = old["day"]
+
+    for key, a in stored.items():  # the store's own dict — no sorting
+        if not activity_store.is_run(a):
+            continue
+        if key not in force and (key in indexed or key in unindexed):
+            continue
+        streams = stream_store.open_streams(a["id"])
+        if streams is None:
+            continue
+        with streams:
+            dist = activity_zones(streams, hr_b, pace_b)
+        day = (a.get("start_date_local") or "")[:10]
+        old = indexed.get(key)
+        if dist is None or not day:
+            unindexed.add(key)
+            indexed.pop(key, None)
+            new_day = None
+        else:
+            unindexed.discard(key)
+            indexed[key] = {"day": day, "hr": dist["hr"], "pace": dist["pace"]}
+            scanned += 1
+            new_day = day
+        for d in (new_day, old and old["day"]):
+            if d and (earliest is None or d < earliest):
+                earliest = d
+
+    if earliest is None and unindexed == was_unindexed:
+        return 0
+    index["unindexed"] = sorted(unindexed)
+    if earliest is not None:
+        _rebuild_prefix(earliest)
+    _save()
+    return scanned
+
+
+def range_zones(start_day, end_day):
+    """Seconds per zone for activities in [start_day, end_day] (ISO dates) — O(log days)."""
+    index = _load()
+    days = index["days"]
+    lo = bisect_left(days, start_day) - 1
+    hi = bisect_right(days, end_day) - 1
+
+    def window(cum, n):
+        end = cum[hi] if hi >= 0 else [0] * n
+        start = cum[lo] if lo >= 0 else [0] * n
+        return [e - s for e, s in zip(end, start)]
+
+    return {
+        "hr": window(index["cum_hr"], len(index["bounds"][0]) + 1),
+        "pace": window(index["cum_pace"], len(index["bounds"][1]) + 1),
+    }
+
+
+def get_activity_zones(activity_id, hr_bounds, pace_bounds):
+    """Zones for one run — from the index when bounds match, else from its streams."""
+    index = _load()
+    if index["bounds"] == [list(hr_bounds), list(pace_bounds)]:
+        entry = index["activities"].get(str(activity_id))
+        if entry:
+            return {"hr": entry["hr"], "pace": entry["pace"]}
+    streams = stream_store.open_streams(activity_id)
+    if streams is None:
+        return None
+    with streams:
+        return activity_zones(streams, hr_bounds, pace_bounds)
+
+
+def bounds():
+    index = _load()
+    return {"hr": index["bounds"][0], "pace": index["bounds"][1]}